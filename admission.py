@@ -0,0 +1,93 @@
+"""Admission control: how many requests may use the database at once.
+
+Every request to a database route takes a slot before its view runs and
+gives it back when its response is done (streamed responses when the last
+chunk has gone). When no slot is free a request waits, at most `timeout`
+seconds and behind at most `max_waiting` others; past either limit it is
+shed, to be answered 503 with Retry-After, instead of piling up on the
+connection pool.
+
+Priority routes (checkout, payment) may take every slot and get the next
+free one first; the others leave `reserved` slots to them. A route may
+also be capped on its own, e.g. exports, which hold a connection for as
+long as the download lasts.
+"""
+import threading
+import time
+
+import metrics
+
+
+class Shed(Exception):
+    """The request was not admitted; `reason` is "queue_full" or "timeout"."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionControl:
+    def __init__(self, slots, reserved, max_waiting, timeout, route_limits=None):
+        self.slots = slots
+        self.reserved = min(reserved, slots - 1)
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.route_limits = route_limits or {}
+
+        self.active = 0
+        self.by_route = {}
+        self.waiting = 0
+        self.priority_waiting = 0
+        self.admitted = 0
+        self._cond = threading.Condition()
+
+    def _can_enter(self, route, priority):
+        if self.by_route.get(route, 0) >= self.route_limits.get(route, self.slots):
+            return False
+        if priority:
+            return self.active < self.slots
+        return self.active < self.slots - self.reserved and not self.priority_waiting
+
+    def acquire(self, route, priority=False):
+        """Take a slot for `route`, or raise Shed."""
+
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            if not self._can_enter(route, priority):
+                if self.waiting >= self.max_waiting:
+                    self._shed(route, "queue_full")
+                self.waiting += 1
+                self.priority_waiting += priority
+                try:
+                    while not self._can_enter(route, priority):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._shed(route, "timeout")
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    self.priority_waiting -= priority
+            self.active += 1
+            self.by_route[route] = self.by_route.get(route, 0) + 1
+            self.admitted += 1
+
+    def release(self, route):
+        with self._cond:
+            self.active -= 1
+            self.by_route[route] -= 1
+            self._cond.notify_all()
+
+    def _shed(self, route, reason):
+        metrics.REQUESTS_SHED.inc(1, (route, reason))
+        raise Shed(reason)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "reserved": self.reserved,
+                "active": self.active,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "shed": sum(metrics.REQUESTS_SHED.totals().values()),
+            }
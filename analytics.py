@@ -0,0 +1,111 @@
+"""OLAP queries over the sales_daily and sales_monthly summary tables.
+
+sales_daily holds one row per product, city and day, kept current by the
+triggers of migrations/0004_sales_daily.sql, so these queries never touch
+the order tables. Queries that involve neither products nor days read
+sales_monthly (migrations/0011), one row per city and month, and cost the
+same whatever the number of orders.
+"""
+from psycopg import sql
+
+
+# {date} is the date column of the table read: a day, or a month's first.
+DIMENSIONS = {
+    "sku": sql.SQL("sku"),
+    "city": sql.SQL("city"),
+    "year": sql.SQL("EXTRACT(YEAR FROM {date})::integer"),
+    "month": sql.SQL("EXTRACT(MONTH FROM {date})::integer"),
+    "day_of_month": sql.SQL("EXTRACT(DAY FROM {date})::integer"),
+    "day_of_week": sql.SQL("EXTRACT(DOW FROM {date})::integer"),
+}
+
+# dimensions sales_monthly can answer, with its date column.
+MONTHLY_DIMENSIONS = {"city", "year", "month"}
+
+# dimensions whose filter value must be an integer.
+INTEGER_DIMENSIONS = {"year", "month", "day_of_month", "day_of_week"}
+
+# GROUP BY ROLLUP(a, b), CUBE(a, b), GROUPING SETS ((a), (b), ()), or a
+# plain GROUP BY a, b.
+GROUPINGS = ("rollup", "cube", "sets", "none")
+
+
+class AnalyticsError(ValueError):
+    """The query was asked for with arguments it does not support."""
+
+
+def build_sales_query(group_by, grouping="rollup", filters=None):
+    """Compose the query and its parameters for /analytics/sales.
+
+    `group_by` lists DIMENSIONS; `filters` maps dimension names to the
+    value they must equal (an integer for INTEGER_DIMENSIONS). A
+    `grouping` column tells rolled-up NULLs apart from real ones: bit i is
+    set when the i-th dimension was aggregated.
+    """
+
+    unknown = [name for name in group_by if name not in DIMENSIONS]
+    unknown += [name for name in (filters or {}) if name not in DIMENSIONS]
+    if unknown:
+        raise AnalyticsError(f"Unknown dimensions: {', '.join(unknown)}.")
+    if grouping not in GROUPINGS:
+        raise AnalyticsError(f"Grouping must be one of {', '.join(GROUPINGS)}.")
+
+    if set(group_by) | set(filters or {}) <= MONTHLY_DIMENSIONS:
+        table, date = sql.Identifier("sales_monthly"), sql.Identifier("month")
+    else:
+        table, date = sql.Identifier("sales_daily"), sql.Identifier("date")
+    expressions = {name: DIMENSIONS[name].format(date=date) for name in DIMENSIONS}
+
+    dimensions = [expressions[name] for name in group_by]
+    columns = [
+        sql.SQL("{} AS {}").format(expression, sql.Identifier(name))
+        for name, expression in zip(group_by, dimensions)
+    ]
+
+    if not dimensions:
+        group = sql.SQL("")
+    elif grouping == "none":
+        group = sql.SQL("GROUP BY ") + sql.SQL(", ").join(dimensions)
+    elif grouping == "sets":
+        group = sql.SQL("GROUP BY GROUPING SETS ({}, ())").format(
+            sql.SQL(", ").join(sql.SQL("({})").format(d) for d in dimensions)
+        )
+    else:
+        group = sql.SQL("GROUP BY {}({})").format(
+            sql.SQL(grouping.upper()), sql.SQL(", ").join(dimensions)
+        )
+
+    if dimensions and grouping != "none":
+        columns.append(
+            sql.SQL("GROUPING({}) AS grouping").format(sql.SQL(", ").join(dimensions))
+        )
+
+    conditions = [sql.SQL("qty <> 0")]
+    params = {}
+    for name, value in (filters or {}).items():
+        if name in INTEGER_DIMENSIONS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise AnalyticsError(f"{name} must be an integer.") from None
+        conditions.append(sql.SQL("{} = {}").format(expressions[name], sql.Placeholder(name)))
+        params[name] = value
+
+    query = sql.SQL(
+        """
+        SELECT {columns}SUM(qty) AS qty, SUM(total_price) AS total_sales
+        FROM {table}
+        WHERE {where}
+        {group}
+        ORDER BY {order}
+        """
+    ).format(
+        columns=sql.SQL("").join(column + sql.SQL(", ") for column in columns),
+        table=table,
+        where=sql.SQL(" AND ").join(conditions),
+        group=group,
+        order=sql.SQL(", ").join(
+            [sql.SQL("{} NULLS LAST").format(d) for d in dimensions] or [sql.SQL("1")]
+        ),
+    )
+    return query, params
@@ -1,10 +1,20 @@
 #!/usr/bin/python3
+import os
 import sys
 
 sys.path.insert(0, "~/.local/lib/python3.9/site-packages/")
 
-from wsgiref.handlers import CGIHandler
+import worker
 
-from app import app
+try:
+    # a persistent worker (worker.py) has the app loaded and connected.
+    worker.forward(os.environ, sys.stdin.buffer, sys.stdout.buffer)
+except (FileNotFoundError, ConnectionRefusedError):
+    # one request per process: a single connection, opened when needed.
+    os.environ.setdefault("APP_POOL", "direct")
 
-CGIHandler().run(app)
+    from wsgiref.handlers import CGIHandler
+
+    from app import app
+
+    CGIHandler().run(app)
@@ -1,23 +1,78 @@
 #!/usr/bin/python3
+import functools
+import os
+import time
 from logging.config import dictConfig
 
 import psycopg
 from flask import flash
 from flask import Flask
+from flask import g
 from flask import jsonify
 from flask import redirect
 from flask import render_template
 from flask import request
+from flask import Response
+from flask import session
+from flask import stream_template
 from flask import url_for
 from psycopg.rows import namedtuple_row
-from psycopg_pool import ConnectionPool
-
-
-# postgres://{user}:{password}@{hostname}:{port}/{database-name}
-DATABASE_URL = "postgres://db:db@postgres/db"
+from werkzeug.http import is_resource_modified
+
+import admission
+import analytics
+import connections
+import exports
+import json_rows
+import metrics
+import product_import
+import statements
+from catalog_cache import body_size
+from catalog_cache import CatalogCache
+from web import cart_lines
+from web import customer_numbers
+from web import DATABASE_URL
+from web import form_lines
+from web import keyset_after
+from web import keyset_args
+from web import like_prefix
+from web import LOOKUP_LIMIT
+from web import MAX_CUST_NO
+from web import MAX_PAGE_SIZE
+from web import PRODUCT_KEY
+from web import REPORT_TOP_CUSTOMERS
+from web import SEARCH_MODES
+from web import SECRET_KEY
+from web import STREAM_CHUNK
+from web import validated
+
+
+# every cursor of a pooled connection times its statements for /metrics.
+# unless APP_POOL says otherwise the pool starts connecting immediately,
+# see connections.py.
+pool = connections.make_pool(
+    DATABASE_URL, kwargs={"cursor_factory": metrics.TimedCursor}
+)
 
-pool = ConnectionPool(conninfo=DATABASE_URL)
-# the pool starts connecting immediately.
+# read-only routes read from this replica when it is set (e.g. two local
+# servers, or the primary's own DSN as a stand-in); everything else stays
+# on the primary.
+REPLICA_URL = os.environ.get("APP_REPLICA_URL")
+# seconds of replication lag tolerated before reads go back to the primary.
+REPLICA_MAX_LAG = float(os.environ.get("APP_REPLICA_MAX_LAG", 5.0))
+# seconds a client keeps reading from the primary after a POST, so it sees
+# its own writes; remembered in its session cookie.
+REPLICA_STICKINESS = float(os.environ.get("APP_REPLICA_STICKINESS", 10.0))
+# seconds between two measurements of the replica's lag.
+REPLICA_LAG_INTERVAL = 1.0
+
+read_pool = pool
+replica_lag = None
+if REPLICA_URL:
+    read_pool = connections.make_pool(
+        REPLICA_URL, kwargs={"cursor_factory": metrics.TimedCursor}
+    )
+    replica_lag = connections.ReplicaLag(read_pool, REPLICA_LAG_INTERVAL)
 
 dictConfig(
     {
@@ -39,50 +94,455 @@ dictConfig(
 )
 
 app = Flask(__name__)
+app.config.from_mapping(SECRET_KEY=SECRET_KEY)
 log = app.logger
 
 
-@app.route("/accounts", methods=("GET",))
-def account_index():
-    """Show all the accounts, most recent first."""
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            accounts = cur.execute(
-                """
-                SELECT account_number, branch_name, balance
-                FROM account
-                ORDER BY account_number ASC;
-                """,
-                {},
-            ).fetchall()
-            log.debug(f"Found {cur.rowcount} rows.")
 
-    # API-like response is returned to clients that request JSON explicitly (e.g., fetch)
-    if (
+# at most this many requests use the database at once, one per pooled
+# connection; see admission.py.
+ADMISSION_SLOTS = int(
+    os.environ.get("APP_ADMISSION_SLOTS", getattr(pool, "max_size", 1))
+)
+# slots only PRIORITY_ROUTES may take.
+ADMISSION_RESERVED = int(os.environ.get("APP_ADMISSION_RESERVED", 1))
+# requests allowed to wait for a slot, and for how many seconds, before
+# the next one is answered 503.
+ADMISSION_QUEUE = int(os.environ.get("APP_ADMISSION_QUEUE", 32))
+ADMISSION_TIMEOUT = float(os.environ.get("APP_ADMISSION_TIMEOUT", 0.5))
+# seconds a shed client is told to wait before trying again.
+ADMISSION_RETRY_AFTER = 1
+
+PRIORITY_ROUTES = {"cart", "checkout", "confirm_payment"}
+# endpoints capped below ADMISSION_SLOTS: each holds a connection for long.
+ROUTE_LIMITS = {"export": 2, "products_import": 1, "analytics_sales": 2}
+# endpoints that do not touch the database.
+ADMISSION_EXEMPT = {
+    "ping", "metrics_endpoint", "cache_stats", "statement_stats", "static"
+}
+
+admission_control = admission.AdmissionControl(
+    ADMISSION_SLOTS,
+    ADMISSION_RESERVED,
+    ADMISSION_QUEUE,
+    ADMISSION_TIMEOUT,
+    ROUTE_LIMITS,
+)
+
+
+@app.before_request
+def admit():
+    """Wait for an admission slot, or answer 503 if none frees up in time."""
+    route = request.endpoint
+    if route is None or route in ADMISSION_EXEMPT:
+        return None
+    try:
+        admission_control.acquire(route, route in PRIORITY_ROUTES)
+    except admission.Shed:
+        message = "The server is busy, please try again shortly."
+        if wants_json():
+            response = jsonify({"error": message})
+        else:
+            response = Response(message, mimetype="text/plain")
+        response.status_code = 503
+        response.headers["Retry-After"] = str(ADMISSION_RETRY_AFTER)
+        return response
+    g.admission = route
+    return None
+
+
+@app.after_request
+def release_streamed(response):
+    """Keep the slot of a streamed response until its body has been sent."""
+    if response.is_streamed and "admission" in g:
+        response.call_on_close(
+            functools.partial(admission_control.release, g.pop("admission"))
+        )
+    return response
+
+
+# registered before release_db, so it runs after it: the slot frees up
+# once the connection is back in the pool.
+@app.teardown_appcontext
+def release_admission(exception):
+    route = g.pop("admission", None)
+    if route is not None:
+        admission_control.release(route)
+
+
+# registered before commit_db, so it runs after it and the commit is timed.
+@app.after_request
+def observe_request(response):
+    record_request(response.status_code)
+    return response
+
+
+@app.teardown_request
+def observe_failed_request(exception):
+    if exception is not None:
+        record_request(500)
+
+
+def record_request(status):
+    """Add the current request to the per-route latency histogram."""
+    started = g.pop("started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - started, (route, request.method, str(status))
+        )
+
+
+def get_db():
+    """The connection of the current request, checked out on first use.
+
+    Routes and helpers share it, so a request never holds more than one
+    pooled connection; commit_db and release_db end its transaction.
+    """
+    if "db" not in g:
+        g.db = source_pool().getconn()
+        g.db.autocommit = g.get("read_only", False)
+    return g.db
+
+
+def source_pool():
+    """The pool the current request reads from, chosen once per request."""
+    if "db_pool" not in g:
+        g.db_pool = reads_from() if g.get("read_only", False) else pool
+    return g.db_pool
+
+
+def from_source(primary, replica):
+    """`replica` when the current request reads from the replica, else
+    `primary`: a cache of the replica's pages, tagged with its versions."""
+    return replica if source_pool() is not pool else primary
+
+
+def reads_from():
+    """The pool the current read-only request reads from.
+
+    The replica, unless it lags more than REPLICA_MAX_LAG or this client
+    made a POST less than REPLICA_STICKINESS seconds ago.
+    """
+    if replica_lag is None:
+        return pool
+    if time.time() - session.get("wrote_at", 0) < REPLICA_STICKINESS:
+        return pool
+    if replica_lag.seconds() > REPLICA_MAX_LAG:
+        return pool
+    return read_pool
+
+
+def read_only(view):
+    """Run `view` outside a transaction, on the replica if there is one.
+
+    Its statements autocommit, which saves the BEGIN and COMMIT round trips
+    of a request that only reads; see reads_from() for the replica.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def pipeline():
+    """Pipeline mode on the request's connection.
+
+    Statements executed inside the block are sent together and cost a
+    single round trip, paid when the block ends; read their results after
+    it, as fetching inside the block forces an extra round trip.
+    """
+    return get_db().pipeline()
+
+
+def on_commit(callback):
+    """Call `callback` once the request's transaction has committed."""
+    g.setdefault("on_commit", []).append(callback)
+
+
+@app.after_request
+def commit_db(response):
+    """Commit the request's transaction, unless it produced an error."""
+    conn = g.get("db")
+    if conn is not None:
+        if response.status_code < 400:
+            conn.commit()
+            for callback in g.pop("on_commit", []):
+                callback()
+            if request.method == "POST":
+                session["wrote_at"] = time.time()
+        else:
+            conn.rollback()
+    return response
+
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Give the request's connection back to its pool."""
+    conn = g.pop("db", None)
+    if conn is not None:
+        # after_request does not run when the view raised.
+        if conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+            conn.rollback()
+        if conn.autocommit and not conn.closed:
+            conn.autocommit = False
+        g.pop("db_pool").putconn(conn)
+
+
+def wants_json():
+    """True when the client explicitly asked for JSON (e.g., fetch)."""
+    return (
         request.accept_mimetypes["application/json"]
         and not request.accept_mimetypes["text/html"]
-    ):
-        return jsonify(accounts)
-    #return jsonify(accounts)
-    return render_template("account/index.html", accounts=accounts)
+    )
+
+
+def page_args(key=None):
+    """Read the keyset pagination arguments from the query string."""
+    return keyset_args(request.args, key)
+
+
+def stream_rows(query, params=None, as_json=False, source=None):
+    """Yield the rows of a query through a server-side cursor.
+
+    Only STREAM_CHUNK rows are held in memory at a time; the connection,
+    from `source` (the primary pool by default), is given back as soon as
+    the generator is exhausted or closed. With `as_json` the rows are
+    fetched for json_rows.
+    """
+    # the response is iterated after the request's connection went back to
+    # the pool, so the stream checks out one of its own.
+    with (source or pool).connection() as conn:
+        with conn.cursor(name="stream_rows", row_factory=namedtuple_row) as cur:
+            if as_json:
+                json_rows.prepare(cur)
+            cur.itersize = STREAM_CHUNK
+            cur.execute(query, params or {})
+            yield from cur
+
+
+def stream_json(rows):
+    """Encode an iterable of rows as a JSON array, one chunk at a time."""
+    yield "["
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(("" if first else ",") + json_rows.dumps(row))
+        first = False
+        if len(chunk) >= STREAM_CHUNK:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("]")
+    yield "".join(chunk)
+
+
+def fetch_page(query, key, after, limit, params=None):
+    """Fetch one page of a listing, returning (rows, next_after).
+
+    `params` are passed to `query` along with `after` and `limit`.
+    """
+
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        # one extra row tells us whether there is a next page.
+        rows = statements.execute(
+            cur, query, {**(params or {}), "after": after, "limit": limit + 1}
+        ).fetchall()
+        log.debug(f"Found {cur.rowcount} rows.")
+
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = keyset_after(key, functools.partial(getattr, rows[-1]))
+    return rows, next_after
+
+
+def fetch_json_page(query, key, after, limit, layout, params=None):
+    """fetch_page() serialized by json_rows, returning (body, next_after)."""
+
+    with get_db().cursor() as cur:
+        json_rows.prepare(cur)
+        rows = statements.execute(
+            cur, query, {**(params or {}), "after": after, "limit": limit + 1}
+        ).fetchall()
+        names = json_rows.column_names(cur)
+
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        row = rows[-1]
+        next_after = keyset_after(key, lambda column: row[names.index(column)])
+    return json_rows.page_json(names, rows, layout), next_after
+
+
+def cached_page(query, key, after, limit, cache=None, params=None):
+    """fetch_page(), looked up in `cache` first when one is given."""
+
+    if cache is None:
+        return fetch_page(query, key, after, limit, params)
+    # the filter is part of the page, so part of its key.
+    cache_key = (after, limit, tuple(sorted((params or {}).items())))
+    page, generation = cache.get(cache_key)
+    if page is None:
+        page = fetch_page(query, key, after, limit, params)
+        cache.put(cache_key, page, generation)
+    return page
+
+
+def table_version(name):
+    """Change counter and time of the last change of a table."""
+
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        return statements.execute(
+            cur, statements.TABLE_VERSION, {"name": name}
+        ).fetchone()
+
+
+# serialized JSON pages of the listings, per table, dropped when the
+# table's version moves (see catalog_cache.py).
+LISTING_TABLES = ("product", "customer", "supplier")
+LISTING_CACHE_BYTES = 16 * 1024 * 1024
+# seconds a worker may answer 304 without checking for writes by others.
+LISTING_CACHE_STALENESS = 1.0
+
+
+def make_listing_bodies():
+    """One CatalogCache of serialized pages per table of LISTING_TABLES."""
+    return {
+        name: CatalogCache(
+            functools.partial(table_version, name),
+            LISTING_CACHE_BYTES,
+            LISTING_CACHE_STALENESS,
+            sizeof=body_size,
+        )
+        for name in LISTING_TABLES
+    }
+
+
+# the replica's listings are kept apart from the primary's: a page read
+# from a lagging replica must not reach a client reading its own writes
+# from the primary, and each cache compares the versions of one server.
+listing_bodies = make_listing_bodies()
+replica_listing_bodies = listing_bodies if read_pool is pool else make_listing_bodies()
+
+
+def changed(name):
+    """Drop the cached listings of a table once the request commits."""
+    on_commit(listing_bodies[name].invalidate)
+    if replica_listing_bodies is not listing_bodies:
+        on_commit(replica_listing_bodies[name].invalidate)
+    if name == "product":
+        on_commit(catalog_cache.invalidate)
+        if replica_catalog_cache is not catalog_cache:
+            on_commit(replica_catalog_cache.invalidate)
+
+
+def next_page_url(after, limit):
+    """The current URL, query string included, moved on to the next page."""
+    args = {**request.args.to_dict(), "after": after, "limit": limit}
+    return url_for(request.endpoint, **args, **request.view_args)
+
+
+def json_listing(query, key, after, limit, table=None, params=None):
+    """A page of a listing as JSON, conditional on the version of `table`.
+
+    A client that sends the current ETag (or a later If-Modified-Since)
+    gets a 304 without a single row being read; otherwise the serialized
+    page comes from listing_bodies when this version was served before.
+    `?layout=columns` returns one array per column, see json_rows.
+    """
+    layout = request.args.get("layout", "rows")
+    if layout not in json_rows.LAYOUTS:
+        return jsonify({"error": f"Unknown layout {layout!r}."}), 400
+
+    bodies = from_source(listing_bodies, replica_listing_bodies).get(table)
+    entry = version = None
+    if bodies is not None:
+        version = bodies.version()
+        etag = f"{table}-{version.version}"
+        if not is_resource_modified(
+            request.environ, etag=etag, last_modified=version.changed_at
+        ):
+            return validated(Response(status=304), etag, version.changed_at)
+        cache_key = (after, limit, layout, tuple(sorted((params or {}).items())))
+        entry, generation = bodies.get(cache_key)
+    if entry is None:
+        entry = fetch_json_page(query, key, after, limit, layout, params)
+        if bodies is not None:
+            bodies.put(cache_key, entry, generation)
+
+    body, next_after = entry
+    response = Response(body, mimetype="application/json")
+    if next_after is not None:
+        next_url = next_page_url(next_after, limit)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    if version is not None:
+        validated(response, etag, version.changed_at)
+    return response
+
+
+def render_listing(
+    query, key, template, name, cache=None, table=None, params=None, **context
+):
+    """Render a keyset-paginated (or fully streamed) listing.
+
+    `query` must accept the `after` and `limit` parameters, plus any given
+    in `params`; a NULL limit means LIMIT ALL, which is what the streamed
+    mode uses. `key` is the column whose value of the last row becomes the
+    next `after`, or a tuple of columns, see web.keyset_args(). Pages are
+    looked up in `cache` first when one is given. JSON pages of a `table`
+    of LISTING_TABLES are conditional requests, see json_listing().
+    """
+    if request.args.get("all"):
+        params = {**(params or {}), "after": None, "limit": None}
+        # chosen now: the stream is read once the request is over.
+        source = source_pool()
+        if wants_json():
+            rows = stream_rows(query, params, as_json=True, source=source)
+            return Response(stream_json(rows), mimetype="application/json")
+        rows = stream_rows(query, params, source=source)
+        return stream_template(template, **{name: rows}, next_url=None, **context)
+
+    after, limit = page_args(key)
+    # API-like response is returned to clients that request JSON explicitly (e.g., fetch)
+    if wants_json():
+        return json_listing(query, key, after, limit, table, params)
+
+    rows, next_after = cached_page(query, key, after, limit, cache, params)
+    next_url = None
+    if next_after is not None:
+        next_url = next_page_url(next_after, limit)
+    return render_template(template, **{name: rows}, next_url=next_url, **context)
+
+
+@app.route("/accounts", methods=("GET",))
+@read_only
+def account_index():
+    """Show all the accounts, most recent first."""
+
+    return render_listing(
+        statements.ACCOUNT_PAGE,
+        "account_number",
+        "account/index.html",
+        "accounts",
+    )
 
 
 @app.route("/accounts/<account_number>/update", methods=("GET", "POST"))
 def account_update(account_number):
     """Update the account balance."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            account = cur.execute(
-                """
-                SELECT account_number, branch_name, balance
-                FROM account
-                WHERE account_number = %(account_number)s;
-                """,
-                {"account_number": account_number},
-            ).fetchone()
-            log.debug(f"Found {cur.rowcount} rows.")
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        account = statements.execute(
+            cur, statements.ACCOUNT_BY_NUMBER, {"account_number": account_number}
+        ).fetchone()
+        log.debug(f"Found {cur.rowcount} rows.")
 
     if request.method == "POST":
         balance = request.form["balance"]
@@ -97,17 +557,12 @@ def account_update(account_number):
         if error is not None:
             flash(error)
         else:
-            with pool.connection() as conn:
-                with conn.cursor(row_factory=namedtuple_row) as cur:
-                    cur.execute(
-                        """
-                        UPDATE account
-                        SET balance = %(balance)s
-                        WHERE account_number = %(account_number)s;
-                        """,
-                        {"account_number": account_number, "balance": balance},
-                    )
-                conn.commit()
+            with get_db().cursor(row_factory=namedtuple_row) as cur:
+                statements.execute(
+                    cur,
+                    statements.ACCOUNT_UPDATE,
+                    {"account_number": account_number, "balance": balance},
+                )
             return redirect(url_for("account_index"))
 
     return render_template("account/update.html", account=account)
@@ -117,47 +572,95 @@ def account_update(account_number):
 def account_delete(account_number):
     """Delete the account."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            cur.execute(
-                """ 
-                DELETE FROM account
-                WHERE account_number = %(account_number)s;
-                """,
-                {"account_number": account_number},
-            )
-        conn.commit()
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        statements.execute(
+            cur, statements.ACCOUNT_DELETE, {"account_number": account_number}
+        )
     return redirect(url_for("account_index"))
 
 
 
 """ PRODUCT ROUTES """
 
+# pages of the catalog are cached per worker, see catalog_cache.py.
+CATALOG_CACHE_BYTES = 32 * 1024 * 1024
+# seconds a worker may serve pages without checking for writes by others.
+CATALOG_CACHE_STALENESS = 1.0
+
+
+def product_version():
+    """Current change counter of the product table."""
+    return table_version("product").version
+
+
+catalog_cache = CatalogCache(
+    product_version, CATALOG_CACHE_BYTES, CATALOG_CACHE_STALENESS
+)
+# the replica's pages, see listing_bodies.
+replica_catalog_cache = catalog_cache
+if read_pool is not pool:
+    replica_catalog_cache = CatalogCache(
+        product_version, CATALOG_CACHE_BYTES, CATALOG_CACHE_STALENESS
+    )
+
 @app.route("/", methods=("GET",))
 @app.route("/products", methods=("GET",))
+@read_only
 def products_index():
     """Show all the accounts, most recent first."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            products = cur.execute(
-                """
-                SELECT name, SKU, description, price
-                FROM product
-                ORDER BY name ASC;
-                """,
-                {},
-            ).fetchall()
-            log.debug(f"Found {cur.rowcount} rows.")
+    return render_listing(
+        statements.PRODUCT_PAGE,
+        PRODUCT_KEY,
+        "products/index.html",
+        "products",
+        cache=from_source(catalog_cache, replica_catalog_cache),
+        table="product",
+    )
+
+
+@app.route("/products/search", methods=("GET",))
+@read_only
+def products_search():
+    """Search the catalog, e.g. /products/search?q=paper+plates&mode=prefix.
+
+    With cust_no and order_no in the query string the results get the
+    shop's Add to Cart buttons.
+    """
+
+    q = request.args.get("q", "").strip()
+    mode = request.args.get("mode", "text")
+    context = {
+        "q": q,
+        "mode": mode,
+        "cust_no": request.args.get("cust_no"),
+        "order_no": request.args.get("order_no"),
+    }
 
-    # API-like response is returned to clients that request JSON explicitly (e.g., fetch)
-    if (
-        request.accept_mimetypes["application/json"]
-        and not request.accept_mimetypes["text/html"]
-    ):
-        return jsonify(products)
-    # return jsonify(products)
-    return render_template("products/index.html", products=products)
+    error = None
+    if mode not in SEARCH_MODES:
+        error = f"Mode must be one of {', '.join(SEARCH_MODES)}."
+    elif not q:
+        error = "A search term is required."
+
+    if error is not None:
+        if wants_json():
+            return jsonify({"error": error}), 400
+        if q:
+            flash(error)
+        return render_template(
+            "products/search.html", products=[], next_url=None, **context
+        )
+
+    query, param, key = SEARCH_MODES[mode]
+    return render_listing(
+        query,
+        key,
+        "products/search.html",
+        "products",
+        params={param: like_prefix(q) if mode == "prefix" else q},
+        **context,
+    )
 
 @app.route("/products/register", methods=("POST", "GET"))
 def product_register():
@@ -186,36 +689,64 @@ def product_register():
         if error is not None:
             flash(error)
         else:
-            with pool.connection() as conn:
-                with conn.cursor(row_factory=namedtuple_row) as cur:
-                    cur.execute(
-                        """
-                        INSERT INTO product (SKU, name, description, price, ean)
-                        VALUES (%(sku)s, %(name)s, %(description)s, %(price)s, %(ean)s);
-                        """,
-                        {"sku":sku, "name": name, "description": description, "price": price, "ean": ean},
-                    )
-                conn.commit()
+            with get_db().cursor(row_factory=namedtuple_row) as cur:
+                statements.execute(
+                    cur,
+                    statements.PRODUCT_INSERT,
+                    {"sku":sku, "name": name, "description": description, "price": price, "ean": ean},
+                )
+            changed("product")
             return redirect(url_for("products_index"))
 
     return render_template("products/register.html")
 
+@app.route("/products/import", methods=("POST", "GET"))
+def products_import():
+    """Import many products at once from a CSV or JSONL upload."""
+
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if upload is not None:
+            stream, filename = upload.stream, upload.filename
+        else:
+            # the file may also be the raw request body (e.g., curl --data-binary).
+            stream, filename = request.stream, None
+
+        default = "jsonl" if "json" in (request.mimetype or "") else "csv"
+        fmt = request.args.get("format") or product_import.guess_format(filename, default)
+
+        result = None
+        error = None
+        if fmt not in product_import.FORMATS:
+            error = "Format must be csv or jsonl."
+        else:
+            result = product_import.import_products(
+                get_db(), product_import.READERS[fmt](stream)
+            )
+            changed("product")
+            log.info(
+                f"Imported {result.imported} of {result.rows} products "
+                f"({result.rows_per_second} rows/s)."
+            )
+
+        if wants_json():
+            if error is not None:
+                return jsonify({"error": error}), 400
+            return jsonify(result._asdict())
+        return render_template("products/import.html", result=result, error=error)
+
+    return render_template("products/import.html", result=None, error=None)
+
 @app.route("/products/<product_sku>/update", methods=("GET", "POST"))
 @app.route("/products/<product_sku>/update", methods=("GET", "POST"))
 def product_update(product_sku):
     """Update product description and price"""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            product = cur.execute(
-                """
-                SELECT SKU, price, description
-                FROM product
-                WHERE SKU = %(product_sku)s;
-                """,
-                {"product_sku": product_sku},
-            ).fetchone()
-            log.debug(f"Found {cur.rowcount} rows.")
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        product = statements.execute(
+            cur, statements.PRODUCT_BY_SKU, {"product_sku": product_sku}
+        ).fetchone()
+        log.debug(f"Found {cur.rowcount} rows.")
 
     if request.method == "POST":
         price = request.form["price"]
@@ -233,88 +764,86 @@ def product_update(product_sku):
         if error is not None:
             flash(error)
         else:
-            with pool.connection() as conn:
-                with conn.cursor(row_factory=namedtuple_row) as cur:
-                    cur.execute(
-                        """
-                        UPDATE product
-                        SET price = %(price)s, description = %(description)s
-                        WHERE SKU = %(product_sku)s;
-                        """,
-                        {"product_sku": product_sku, "price": price, "description": description},
-                    )
-                conn.commit()
+            with get_db().cursor(row_factory=namedtuple_row) as cur:
+                statements.execute(
+                    cur,
+                    statements.PRODUCT_UPDATE,
+                    {"product_sku": product_sku, "price": price, "description": description},
+                )
+            changed("product")
             return redirect(url_for("products_index"))
 
     return render_template("products/update.html", product=product)
 
 
 @app.route("/<cust_no>/<order_no>/shop", methods=("GET",))
+@read_only
 def shopping(cust_no, order_no):
     """Show all the products, most recent first."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            products = cur.execute(
-                """
-                SELECT name, SKU, description, price
-                FROM product
-                ORDER BY name ASC;
-                """,
-                {},
-            ).fetchall()
-            log.debug(f"Found {cur.rowcount} rows.")
-
-    # API-like response is returned to clients that request JSON explicitly (e.g., fetch)
-    if (
-        request.accept_mimetypes["application/json"]
-        and not request.accept_mimetypes["text/html"]
-    ):
-        return jsonify(products)
-    # return jsonify(products)
-    return render_template("products/index_customer.html", products=products, order_no=order_no, cust_no=cust_no)
+    return render_listing(
+        statements.PRODUCT_PAGE,
+        PRODUCT_KEY,
+        "products/index_customer.html",
+        "products",
+        cache=from_source(catalog_cache, replica_catalog_cache),
+        table="product",
+        order_no=order_no,
+        cust_no=cust_no,
+    )
 
 @app.route("/products/<product_sku>/delete", methods=("POST",))
 def product_delete(product_sku):
     """Delete the account."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            cur.execute(
-                """ 
-                DELETE FROM product
-                WHERE SKU = %(product_sku)s;
-                """,
-                {"product_sku": product_sku},
-            )
-        conn.commit()
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        statements.execute(
+            cur, statements.PRODUCT_DELETE, {"product_sku": product_sku}
+        )
+    changed("product")
     return redirect(url_for("products_index"))
 
 """ CUSTOMER ROUTES """
 
 @app.route("/customers", methods=("GET",))
+@read_only
 def customers_index():
     """Show all the accounts, most recent first."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            customers = cur.execute(
-                """
-                SELECT cust_no, name, email, phone, address
-                FROM customer;
-                """,
-                {},
-            ).fetchall()
-            log.debug(f"Found {cur.rowcount} rows.")
-
-    # API-like response is returned to clients that request JSON explicitly (e.g., fetch)
-    if (
-        request.accept_mimetypes["application/json"]
-        and not request.accept_mimetypes["text/html"]
-    ):
-        return jsonify(customers)
-    # return jsonify(customers)
-    return render_template("customer/index.html", customers=customers)
+    return render_listing(
+        statements.CUSTOMER_PAGE,
+        "cust_no",
+        "customer/index.html",
+        "customers",
+        table="customer",
+    )
+
+
+@app.route("/customers/lookup", methods=("GET",))
+@read_only
+def customers_lookup():
+    """Customers whose name, email or phone starts with ?q=, as JSON.
+
+    Feeds the autocomplete of the order form; at most ?limit= (up to
+    LOOKUP_LIMIT) candidates, ordered by name.
+    """
+
+    q = request.args.get("q", "").strip()
+    limit = max(1, min(request.args.get("limit", 10, type=int), LOOKUP_LIMIT))
+    if not q:
+        return jsonify([])
+
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        customers = statements.execute(
+            cur,
+            statements.CUSTOMER_LOOKUP,
+            {
+                "prefix": like_prefix(q),
+                "phone_prefix": like_prefix(q.replace(" ", "")),
+                "limit": limit,
+            },
+        ).fetchall()
+    return jsonify([customer._asdict() for customer in customers])
 
 
 @app.route("/customers/register", methods=("POST", "GET"))
@@ -344,109 +873,83 @@ def customer_register():
         if error is not None:
             flash(error)
         else:
-            with pool.connection() as conn:
-                with conn.cursor(row_factory=namedtuple_row) as cur:
-                    cust_no = cur.execute(
-                        """
-                        SELECT MAX(cust_no) 
-                        FROM customer
-                        """
-                    ).fetchone()
-
-                    cust_no = cust_no[0] + 1
-
-                    cur.execute(
-                        """
-                        INSERT INTO customer (cust_no, name, email, phone, address)
-                        VALUES (%(cust_no)s, %(name)s, %(email)s, %(phone)s, %(address)s);
-                        """,
-                        {"cust_no":cust_no, "name": name, "email": email, "phone": phone, "address": address},
-                    )
-            
-            conn.commit()
+            with get_db().cursor(row_factory=namedtuple_row) as cur:
+                cust_no = statements.execute(
+                    cur,
+                    statements.CUSTOMER_INSERT,
+                    {"name": name, "email": email, "phone": phone, "address": address},
+                ).fetchone().cust_no
+            changed("customer")
+            log.debug(f"Registered customer {cust_no}.")
             return redirect(url_for("customers_index"))
 
     return render_template("customer/register.html")
 
-@app.route("/customers/<cust_no>/delete", methods=("GET", "POST"))
+def delete_customers(cur, cust_nos):
+    """Delete customers with their orders, order lines, payments and processing.
+
+    A single statement whatever the number of customers or orders: the
+    foreign keys are only checked once every CTE has run. Runs outside a
+    request too (see bench/customer_delete.py); the routes call changed().
+    """
+
+    return statements.execute(
+        cur, statements.CUSTOMERS_DELETE, {"cust_nos": list(cust_nos)}
+    ).rowcount
+
+
+@app.route("/customers/<int:cust_no>/delete", methods=("GET", "POST"))
 def customer_delete(cust_no):
     """Delete the customer."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            order_no = cur.execute(
-                """
-                SELECT order_no
-                FROM orders
-                WHERE cust_no = %(cust_no)s;
-                """,
-                {"cust_no": cust_no},
-            ).fetchall()
-            for nums in order_no:
-                cur.execute(
-                    """ 
-                    DELETE FROM contains
-                    WHERE order_no = %(nums)s;
-                    """,
-                    {"nums": nums[0]},
-                )
-                cur.execute(
-                    """
-                    DELETE FROM pay
-                    WHERE order_no = %(nums)s;
-                    """,
-                    {"nums": nums[0]},
-                )
-                cur.execute(
-                    """
-                    DELETE FROM process
-                    WHERE order_no = %(nums)s;
-                    """,
-                    {"nums": nums[0]},
-                )
-            cur.execute(
-                """ 
-                DELETE FROM orders
-                WHERE cust_no = %(cust_no)s;
-                """,
-                {"cust_no": cust_no},
-            )
-            cur.execute(
-                """ 
-                DELETE FROM customer
-                WHERE cust_no = %(cust_no)s;
-                """,
-                {"cust_no": cust_no},
-            )
-        conn.commit()
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        delete_customers(cur, [cust_no])
+    changed("customer")
+    return redirect(url_for("customers_index"))
+
+
+@app.route("/customers/delete", methods=("POST",))
+def customers_delete():
+    """Delete a list of customers in one transaction."""
+
+    if request.is_json:
+        body = request.get_json(silent=True)
+        cust_nos = body.get("cust_nos", []) if isinstance(body, dict) else None
+    else:
+        cust_nos = request.form.getlist("cust_no")
+    try:
+        cust_nos = customer_numbers(cust_nos)
+    except ValueError as error:
+        if wants_json() or request.is_json:
+            return jsonify({"error": str(error)}), 400
+        flash(str(error))
+        return redirect(url_for("customers_index"))
+
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        deleted = delete_customers(cur, cust_nos)
+    changed("customer")
+    log.debug(f"Deleted {deleted} customers.")
+
+    if wants_json():
+        return jsonify({"deleted": deleted})
     return redirect(url_for("customers_index"))
 
 
 """ SUPPLIER ROUTES """
+
 @app.route("/suppliers", methods=("GET",))
+@read_only
 def suppliers_index():
     """Show all the suppliers, most recent first."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            suppliers = cur.execute(
-                """
-                SELECT TIN, name, address, SKU, date
-                FROM supplier;
-                """,
-                {},
-            ).fetchall()
-            log.debug(f"Found {cur.rowcount} rows.")
-        
-    # API-like response is returned to clients that request JSON explicitly (e.g., fetch)
-    if (
-        request.accept_mimetypes["application/json"]
-        and not request.accept_mimetypes["text/html"]
-    ):
-        return jsonify(suppliers)
-    # return jsonify(customers)
-    return render_template("suppliers/index.html", suppliers=suppliers)
-    
+    return render_listing(
+        statements.SUPPLIER_PAGE,
+        "tin",
+        "suppliers/index.html",
+        "suppliers",
+        table="supplier",
+    )
+
 @app.route("/suppliers/register", methods=("POST", "GET"))
 def supplier_register():
     """Register a new supplier."""
@@ -456,7 +959,6 @@ def supplier_register():
         name = request.form["name"]
         address = request.form["address"]
         sku = request.form["sku"]
-        date = date.today()
 
         error = None
 
@@ -472,16 +974,13 @@ def supplier_register():
         if error is not None:
             flash(error)
         else:
-            with pool.connection() as conn:
-                with conn.cursor(row_factory=namedtuple_row) as cur:
-                    cur.execute(
-                        """
-                        INSERT INTO supplier (TIN, name, address, SKU, date)
-                        VALUES (%(tin)s, %(name)s, %(address)s, %(sku)s, %(date)s);
-                        """,
-                        {"tin":tin, "name": name, "address": address, "sku": sku, "date": date},
-                    )
-                conn.commit()
+            with get_db().cursor(row_factory=namedtuple_row) as cur:
+                statements.execute(
+                    cur,
+                    statements.SUPPLIER_INSERT,
+                    {"tin":tin, "name": name, "address": address, "sku": sku},
+                )
+            changed("supplier")
             return redirect(url_for("suppliers_index"))
 
     return render_template("suppliers/register.html")   
@@ -490,178 +989,200 @@ def supplier_register():
 def supplier_delete(tin):
     """Delete the account."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            cur.execute(
-                """ 
-                DELETE FROM supplier
-                WHERE tin = %(tin)s;
-                """,
-                {"tin": tin},
-            )
-            delivery_delete(tin)
-        conn.commit()
+    # deliveries reference the supplier, so they go first; both statements
+    # are sent in one round trip and commit together.
+    with pipeline():
+        delivery_delete(tin)
+        with get_db().cursor(row_factory=namedtuple_row) as cur:
+            statements.execute(cur, statements.SUPPLIER_DELETE, {"tin": tin})
+    changed("supplier")
     return redirect(url_for("suppliers_index"))
 
 """ ORDER ROUTES """
 
 @app.route("/order_customer", methods=("GET", "POST"))
 def set_customer():
+    """Start an order for a customer given by number or by name.
+
+    A name shared by several customers creates no order: they are listed
+    for the user to pick one by number.
+    """
+
+    candidates = []
     if request.method == "POST":
-        cust_name = request.form["name"]
+        # typed in, or picked among the candidates of an ambiguous name.
+        cust_no = next(
+            (n.strip() for n in request.form.getlist("cust_no") if n.strip()), ""
+        )
+        cust_name = request.form.get("name", "").strip()
 
         error = None
 
-        if not cust_name:
+        if not cust_no and not cust_name:
             error = "Customer name is required."
+        elif cust_no and not cust_no.isdigit():
+            error = "Customer number is required to be numeric."
 
         if error is not None:
             flash(error)
         else:
-            with pool.connection() as conn:
-                with conn.cursor(row_factory=namedtuple_row) as cur:
-                    order_no = cur.execute(
-                        """
-                        SELECT MAX(order_no)
-                        FROM orders;
-                        """
-                    ).fetchone()
-
-                    order_no = order_no[0] + 1
-
-                    cust_no = cur.execute(
-                        """
-                        SELECT cust_no
-                        FROM customer
-                        WHERE name = %(cust_name)s;
-                        """,
-                        {"cust_name": cust_name}
+            with get_db().cursor(row_factory=namedtuple_row) as cur:
+                if cust_no:
+                    order = statements.execute(
+                        cur, statements.ORDER_FOR_CUSTOMER, {"cust_no": cust_no}
                     ).fetchone()
+                else:
+                    candidates = statements.execute(
+                        cur,
+                        statements.ORDER_FOR_CUSTOMER_NAME,
+                        {"cust_name": cust_name, "limit": LOOKUP_LIMIT},
+                    ).fetchall()
+                    order = candidates[0] if len(candidates) == 1 else None
+
+            if order is not None:
+                return redirect(
+                    url_for("shopping", order_no=order.order_no, cust_no=order.cust_no)
+                )
+            if candidates:
+                flash(f"Several customers are called {cust_name}; pick one.")
+            else:
+                flash("Customer not found.")
+    return render_template("order/set_customer.html", candidates=candidates)
 
-                    cur.execute(
-                        """
-                        INSERT INTO orders
-                        values (%(order_no)s, %(cust_no)s, CURRENT_DATE);
-                        """,
-                        {"order_no": order_no, "cust_no": cust_no[0]}
-                    )
-                conn.commit()
-            
-            return redirect(url_for('shopping', order_no=order_no, cust_no=cust_no[0]))
-    return render_template("order/set_customer.html")
 
 @app.route("/order", methods=("GET", "POST"))
 def create_order():
+    """Create an order with one or more lines.
+
+    Takes the order form (sku_N/qty_N fields) or JSON such as
+    {"cust_no": 1, "lines": [{"sku": "...", "qty": 2}, ...]}.
+    """
+
     if request.method == "POST":
-        # order_no = request.form["order_no"]
-        cust_no = request.form["cust_no"]
-        date = date.today()
+        if request.is_json:
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                cust_no, items = body.get("cust_no"), body.get("lines")
+            else:
+                cust_no, items = None, None
+        else:
+            cust_no, items = request.form["cust_no"], form_lines(request.form)
 
-        sku_1 = request.form["product_1"]
-        qty_1 = request.form["qty_1"]
-        
         error = None
 
-        # if not order_no:
-        #     error = "Order number is required."
         if not cust_no:
             error = "Customer number is required."
+        elif not str(cust_no).isdigit() or int(cust_no) > MAX_CUST_NO:
+            error = "Customer number must be a number."
+        else:
+            try:
+                skus, qtys = cart_lines(items)
+            except ValueError as invalid:
+                error = str(invalid)
+
+        if error is None:
+            try:
+                with get_db().cursor(row_factory=namedtuple_row) as cur:
+                    order_no = statements.execute(
+                        cur,
+                        statements.ORDER_CREATE,
+                        {"cust_no": cust_no, "skus": skus, "qtys": qtys},
+                    ).fetchone().order_no
+            except psycopg.errors.ForeignKeyViolation:
+                # the form is shown again with a 200: commit_db would not
+                # roll the failed transaction back.
+                get_db().rollback()
+                error = "Unknown customer or product."
 
         if error is not None:
+            if wants_json():
+                return jsonify({"error": error}), 400
             flash(error)
         else:
-            with pool.connection() as conn:
-                with conn.cursor(row_factory=namedtuple_row) as cur:
-                    order_no = cur.execute(
-                        """
-                        SELECT MAX(order_no)
-                        FROM orders;
-                        """
-                    ).fetchone()
-
-                    order_no = order_no[0] + 1
-
-                    cur.execute("BEGIN;")
-                    cur.execute(
-                        """
-                        INSERT INTO orders (order_no, cust_no, date)
-                        VALUES (%(order_no)s, %(cust_no)s, %(date)s);
-                        """,
-                        {"order_no":order_no, "cust_no": cust_no, "date": date},
-                    )
-
-                    cur.execute(
-                        """
-                        INSERT INTO contains (order_no, SKU, quantity)
-                        VALUES (%(order_no)s, %(sku_1)s, 1);
-                        ON CONFLICT (order_no, SKU) DO UPDATE
-                        SET quantity = contains.quantity + 1; 
-                        """,
-                        {"order_no":order_no, "SKU":sku_1, "quantity": qty_1},
-                    )
-                conn.commit()
-
-            return redirect(url_for("order"))
+            if wants_json():
+                return jsonify({"order_no": order_no, "cust_no": cust_no}), 201
+            return redirect(url_for("shopping", order_no=order_no, cust_no=cust_no))
     return render_template("order/create.html")
 
 @app.route("/<cust_no>/<order_no>/<product_sku>", methods=( "POST",))
 def add_to_cart(product_sku, order_no, cust_no):
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            cur.execute(
-                """
-                INSERT INTO contains (order_no, SKU, qty)
-                VALUES (%(order_no)s, %(product_sku)s, 1)
-                ON CONFLICT (order_no, SKU) DO UPDATE
-                SET qty = contains.qty + 1; 
-                """,
-                {"order_no": order_no, "product_sku": product_sku},
-            )
-        conn.commit()
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        statements.execute(
+            cur,
+            statements.CART_ADD,
+            {"order_no": order_no, "product_sku": product_sku},
+        )
     return redirect(url_for("shopping", order_no=order_no, cust_no=cust_no))
 
+@app.route("/<cust_no>/<order_no>/cart", methods=("GET", "POST"))
+def cart(cust_no, order_no):
+    """The lines and totals of an order's cart, as JSON.
+
+    POST a list of {"sku": ..., "qty": ...} (or {"lines": [...]}) to add
+    them all in one statement; the updated cart comes back in the same
+    round trip, with no redirect to the catalog.
+    """
+
+    if request.method == "POST":
+        body = request.get_json(silent=True)
+        try:
+            skus, qtys = cart_lines(body.get("lines") if isinstance(body, dict) else body)
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+
+    conn = get_db()
+    params = {"order_no": order_no}
+    with conn.cursor(row_factory=namedtuple_row) as lines:
+        with conn.cursor(row_factory=namedtuple_row) as summary:
+            try:
+                with pipeline():
+                    if request.method == "POST":
+                        statements.execute(
+                            lines,
+                            statements.CART_ADD_MANY,
+                            {"order_no": order_no, "skus": skus, "qtys": qtys},
+                        )
+                    statements.execute(lines, statements.CHECKOUT_LINES, params)
+                    statements.execute(summary, statements.CART_SUMMARY, params)
+            except psycopg.errors.ForeignKeyViolation:
+                return jsonify({"error": "Unknown order or product."}), 400
+            products = lines.fetchall()
+            total = summary.fetchone()
+
+    return jsonify(
+        {
+            "order_no": order_no,
+            "cust_no": cust_no,
+            "lines": [product._asdict() for product in products],
+            "summary": total._asdict() if total else None,
+        }
+    )
+
 @app.route("/<cust_no>/<order_no>/checkout", methods=("GET", "POST"))
+@read_only
 def checkout(cust_no, order_no):
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-
-            products = cur.execute(
-                """
-                SELECT p.name, p.description, p.price, c.qty, SUM(p.price * c.qty) AS subtotal
-                FROM contains c
-                NATURAL JOIN product p
-                WHERE c.order_no = %(order_no)s
-                GROUP BY p.name, qty, price, p.description;
-                """,
-                {"order_no": order_no}
-            ).fetchall()
-
-            total = cur.execute(
-                """
-                SELECT SUM(p.price * c.qty) AS total
-                FROM contains c
-                NATURAL JOIN product p
-                WHERE c.order_no = %(order_no)s;
-                """,
-                {"order_no": order_no}
-            ).fetchone()
+    conn = get_db()
+    params = {"order_no": order_no}
+    with conn.cursor(row_factory=namedtuple_row) as lines:
+        with conn.cursor(row_factory=namedtuple_row) as summary:
+            # both queries go out in one round trip; the total is read from
+            # cart_summary rather than summed again over the lines.
+            with pipeline():
+                statements.execute(lines, statements.CHECKOUT_LINES, params)
+                statements.execute(summary, statements.CART_SUMMARY, params)
+            products = lines.fetchall()
+            total = summary.fetchone()
 
-            conn.commit()
-    
     return render_template("order/checkout.html", products=products, total=total, cust_no=cust_no, order_no=order_no)
 
 @app.route("/<cust_no>/<order_no>/payed", methods=("GET", "POST"))
 def confirm_payment(cust_no, order_no):
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            cur.execute(
-                """
-                INSERT INTO pay
-                values (%(cust_no)s, %(order_no)s);
-                """,
-                {"cust_no": cust_no, "order_no": order_no}
-            )
-            conn.commit()
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        statements.execute(
+            cur,
+            statements.PAYMENT_INSERT,
+            {"cust_no": cust_no, "order_no": order_no}
+        )
 
     return redirect(url_for("set_customer"))
 
@@ -669,18 +1190,164 @@ def confirm_payment(cust_no, order_no):
 def delivery_delete(tin):
     """Delete the delivery."""
 
-    with pool.connection() as conn:
-        with conn.cursor(row_factory=namedtuple_row) as cur:
-            cur.execute(
-                """ 
-                DELETE FROM delivery
-                WHERE tin = %(tin)s;
-                """,
-                {"tin": tin},
-            )
-        conn.commit()
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        statements.execute(cur, statements.DELIVERY_DELETE, {"tin": tin})
     return 
 
+""" ANALYTICS """
+
+@app.route("/analytics/sales", methods=("GET",))
+@read_only
+def analytics_sales():
+    """Quantity and value sold, grouped by any of analytics.DIMENSIONS.
+
+    e.g. /analytics/sales?by=sku,city&grouping=rollup&year=2022
+    """
+
+    by = request.args.get("by")
+    filters = {
+        name: request.args[name]
+        for name in analytics.DIMENSIONS
+        if name in request.args
+    }
+    try:
+        query, params = analytics.build_sales_query(
+            by.split(",") if by else [],
+            grouping=request.args.get("grouping", "rollup"),
+            filters=filters,
+        )
+    except analytics.AnalyticsError as error:
+        return jsonify({"error": str(error)}), 400
+
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        sales = cur.execute(query, params).fetchall()
+        log.debug(f"Found {cur.rowcount} rows.")
+
+    return jsonify([row._asdict() for row in sales])
+
+
+""" REPORTS """
+
+
+@app.route("/reports/top-customers", methods=("GET",))
+@read_only
+def report_top_customers():
+    """The customers with the highest value of paid orders, e.g. ?limit=10.
+
+    Read from customer_spending, see migrations/0010_report_summaries.sql.
+    """
+
+    limit = request.args.get("limit", REPORT_TOP_CUSTOMERS, type=int)
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        customers = statements.execute(
+            cur,
+            statements.REPORT_TOP_CUSTOMERS,
+            {"limit": max(1, min(limit, MAX_PAGE_SIZE))},
+        ).fetchall()
+    return jsonify([customer._asdict() for customer in customers])
+
+
+@app.route("/reports/unpaid-orders", methods=("GET",))
+@read_only
+def report_unpaid_orders():
+    """Orders made but not paid, per month; ?year=2022 for a single year.
+
+    Read from unpaid_monthly, see migrations/0010_report_summaries.sql.
+    """
+
+    year = request.args.get("year", type=int)
+    with get_db().cursor(row_factory=namedtuple_row) as cur:
+        months = statements.execute(
+            cur, statements.REPORT_UNPAID_ORDERS, {"year": year}
+        ).fetchall()
+    return jsonify([month._asdict() for month in months])
+
+
+""" EXPORTS """
+
+@app.route("/export/<name>.<fmt>", methods=("GET",))
+@read_only
+def export(name, fmt):
+    """Stream a table (or the product_sales view) as CSV or JSONL."""
+
+    columns = request.args.get("columns")
+    try:
+        statement = exports.build_copy(
+            name,
+            fmt,
+            columns=columns.split(",") if columns else None,
+            date_from=request.args.get("from"),
+            date_to=request.args.get("to"),
+        )
+    except exports.ExportError as error:
+        return jsonify({"error": str(error)}), 400
+
+    return Response(
+        exports.copy_chunks(reads_from(), statement),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={name}.{fmt}"},
+    )
+
+
+@app.route("/cache/stats", methods=("GET",))
+def cache_stats():
+    """Hit, miss and invalidation counters of the catalog and listing caches."""
+    stats = {
+        "catalog": catalog_cache.stats(),
+        "listings": {
+            name: cache.stats() for name, cache in listing_bodies.items()
+        },
+    }
+    if replica_catalog_cache is not catalog_cache:
+        stats["replica"] = {
+            "catalog": replica_catalog_cache.stats(),
+            "listings": {
+                name: cache.stats() for name, cache in replica_listing_bodies.items()
+            },
+        }
+    return jsonify(stats)
+
+
+@app.route("/statements/stats", methods=("GET",))
+def statement_stats():
+    """Calls, time and rows of each statement of statements.py."""
+    return jsonify(statements.stats())
+
+
+@app.route("/metrics", methods=("GET",))
+def metrics_endpoint():
+    """Request, statement, pool, admission and cache metrics in the Prometheus
+    text format."""
+    lines = [
+        *metrics.REQUEST_SECONDS.render(),
+        *metrics.QUERY_SECONDS.render(),
+        *metrics.QUERY_ROWS.render(),
+        *metrics.REQUESTS_SHED.render(),
+        *metrics.pool_lines(pool),
+        *(metrics.pool_lines(read_pool, "db_read") if read_pool is not pool else []),
+    ]
+    stats = admission_control.stats()
+    for key, kind in (("active", "gauge"), ("waiting", "gauge"), ("admitted", "counter")):
+        lines += metrics.gauge(
+            f"admission_{key}", f"Requests {key} by admission control.", stats[key], kind
+        )
+    stats = catalog_cache.stats()
+    for key, kind in (
+        ("hits", "counter"),
+        ("misses", "counter"),
+        ("invalidations", "counter"),
+        ("evictions", "counter"),
+        ("entries", "gauge"),
+        ("bytes", "gauge"),
+    ):
+        lines += metrics.gauge(
+            f"catalog_cache_{key}", f"Catalog cache {key}.", stats[key], kind
+        )
+    return Response(
+        "\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4"
+    )
+
+
 @app.route("/ping", methods=("GET",))
 def ping():
     log.debug("ping!")
@@ -0,0 +1,807 @@
+#!/usr/bin/python3
+"""Async (ASGI) entry point serving the routes and templates of app.py.
+
+Each request awaits Postgres through a psycopg_pool.AsyncConnectionPool
+instead of holding a worker thread, so a single process can keep hundreds
+of requests in flight while they wait on the database. Needs Quart and an
+ASGI server, e.g.:
+
+    pip install quart hypercorn
+    hypercorn asgi:app --bind 0.0.0.0:8000
+
+The SQL (statements.py), the settings and input checks (web.py) and the
+import/export helpers are shared with app.py, which is not imported: its
+pools and admission control are the Flask server's. The catalog and
+listing caches are not shared either, every worker reads the catalog
+directly. JSON listings still answer conditional
+requests from table_version, which costs one lookup by key.
+"""
+import functools
+from logging.config import dictConfig
+
+import psycopg
+from psycopg.rows import namedtuple_row
+from psycopg_pool import AsyncConnectionPool
+from quart import flash
+from quart import jsonify
+from quart import Quart
+from quart import redirect
+from quart import render_template
+from quart import request
+from quart import Response
+from quart import stream_template
+from quart import url_for
+from quart.utils import run_sync
+from werkzeug.sansio.http import is_resource_modified
+
+import analytics
+import exports
+import json_rows
+import metrics
+import product_import
+import statements
+from web import cart_lines
+from web import customer_numbers
+from web import DATABASE_URL
+from web import form_lines
+from web import keyset_after
+from web import keyset_args
+from web import like_prefix
+from web import LOOKUP_LIMIT
+from web import MAX_CUST_NO
+from web import MAX_PAGE_SIZE
+from web import PRODUCT_KEY
+from web import REPORT_TOP_CUSTOMERS
+from web import SEARCH_MODES
+from web import SECRET_KEY
+from web import STREAM_CHUNK
+from web import validated
+
+
+# connections are opened by the server's event loop, in before_serving.
+POOL_MIN_SIZE = 4
+POOL_MAX_SIZE = 20
+
+pool = AsyncConnectionPool(
+    conninfo=DATABASE_URL,
+    min_size=POOL_MIN_SIZE,
+    max_size=POOL_MAX_SIZE,
+    kwargs={"cursor_factory": metrics.AsyncTimedCursor},
+    open=False,
+)
+
+dictConfig(
+    {
+        "version": 1,
+        "formatters": {
+            "default": {
+                "format": "[%(asctime)s] %(levelname)s in %(module)s:%(lineno)s - %(funcName)20s(): %(message)s",
+            }
+        },
+        "handlers": {
+            "asgi": {
+                "class": "logging.StreamHandler",
+                "formatter": "default",
+            }
+        },
+        "root": {"level": "INFO", "handlers": ["asgi"]},
+    }
+)
+
+app = Quart(__name__)
+app.config.from_mapping(SECRET_KEY=SECRET_KEY)
+log = app.logger
+
+
+@app.before_serving
+async def open_pool():
+    await pool.open()
+
+
+@app.after_serving
+async def close_pool():
+    await pool.close()
+
+
+def wants_json():
+    """True when the client explicitly asked for JSON (e.g., fetch)."""
+    return (
+        request.accept_mimetypes["application/json"]
+        and not request.accept_mimetypes["text/html"]
+    )
+
+
+def page_args(key=None):
+    """Read the keyset pagination arguments from the query string."""
+    return keyset_args(request.args, key)
+
+
+async def stream_rows(query, params=None, as_json=False):
+    """Yield the rows of a query through a server-side cursor."""
+    async with pool.connection() as conn:
+        async with conn.cursor(name="stream_rows", row_factory=namedtuple_row) as cur:
+            if as_json:
+                json_rows.prepare(cur)
+            cur.itersize = STREAM_CHUNK
+            await cur.execute(query, params or {})
+            async for row in cur:
+                yield row
+
+
+async def stream_json(rows):
+    """Encode an async iterable of rows as a JSON array, one chunk at a time."""
+    yield "["
+    chunk = []
+    first = True
+    async for row in rows:
+        chunk.append(("" if first else ",") + json_rows.dumps(row))
+        first = False
+        if len(chunk) >= STREAM_CHUNK:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("]")
+    yield "".join(chunk)
+
+
+def next_page_url(after, limit):
+    """The current URL, query string included, moved on to the next page."""
+    args = {**request.args.to_dict(), "after": after, "limit": limit}
+    return url_for(request.endpoint, **args, **request.view_args)
+
+
+async def json_listing(query, key, after, limit, table=None, params=None):
+    """A page of a listing as JSON, as app.json_listing() but uncached."""
+
+    layout = request.args.get("layout", "rows")
+    if layout not in json_rows.LAYOUTS:
+        return jsonify({"error": f"Unknown layout {layout!r}."}), 400
+
+    version = None
+    if table is not None:
+        version = await execute(statements.TABLE_VERSION, {"name": table}, fetch="one")
+        etag = f"{table}-{version.version}"
+        if not is_resource_modified(
+            http_if_modified_since=request.headers.get("If-Modified-Since"),
+            http_if_none_match=request.headers.get("If-None-Match"),
+            etag=etag,
+            last_modified=version.changed_at,
+        ):
+            return validated(Response("", status=304), etag, version.changed_at)
+
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            json_rows.prepare(cur)
+            await statements.execute_async(
+                cur, query, {**(params or {}), "after": after, "limit": limit + 1}
+            )
+            rows = await cur.fetchall()
+            names = json_rows.column_names(cur)
+
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        row = rows[-1]
+        after = keyset_after(key, lambda column: row[names.index(column)])
+        next_url = next_page_url(after, limit)
+
+    response = Response(
+        json_rows.page_json(names, rows, layout), mimetype="application/json"
+    )
+    if next_url is not None:
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    if version is not None:
+        validated(response, etag, version.changed_at)
+    return response
+
+
+async def render_listing(
+    query, key, template, name, table=None, params=None, **context
+):
+    """Render a keyset-paginated (or fully streamed) listing, as in app.py."""
+
+    if request.args.get("all"):
+        params = {**(params or {}), "after": None, "limit": None}
+        if wants_json():
+            rows = stream_rows(query, params, as_json=True)
+            return Response(stream_json(rows), mimetype="application/json")
+        rows = stream_rows(query, params)
+        return await stream_template(template, **{name: rows}, next_url=None, **context)
+
+    after, limit = page_args(key)
+    if wants_json():
+        return await json_listing(query, key, after, limit, table, params)
+
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=namedtuple_row) as cur:
+            await statements.execute_async(
+                cur, query, {**(params or {}), "after": after, "limit": limit + 1}
+            )
+            rows = await cur.fetchall()
+            log.debug(f"Found {cur.rowcount} rows.")
+
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        after = keyset_after(key, functools.partial(getattr, rows[-1]))
+        next_url = next_page_url(after, limit)
+    return await render_template(template, **{name: rows}, next_url=next_url, **context)
+
+
+async def execute(query, params=None, fetch=None):
+    """Run a statement of statements.py in its own transaction; fetch "one"
+    or "all" rows."""
+
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=namedtuple_row) as cur:
+            await statements.execute_async(cur, query, params)
+            if fetch == "one":
+                return await cur.fetchone()
+            if fetch == "all":
+                return await cur.fetchall()
+            return cur.rowcount
+
+
+""" ACCOUNT ROUTES """
+
+@app.route("/accounts", methods=("GET",))
+async def account_index():
+    return await render_listing(
+        statements.ACCOUNT_PAGE, "account_number", "account/index.html", "accounts"
+    )
+
+
+@app.route("/accounts/<account_number>/update", methods=("GET", "POST"))
+async def account_update(account_number):
+    if request.method == "POST":
+        balance = (await request.form)["balance"]
+        if not balance or not balance.isnumeric():
+            await flash("Balance is required to be numeric.")
+        else:
+            await execute(
+                statements.ACCOUNT_UPDATE,
+                {"account_number": account_number, "balance": balance},
+            )
+            return redirect(url_for("account_index"))
+
+    account = await execute(
+        statements.ACCOUNT_BY_NUMBER,
+        {"account_number": account_number},
+        fetch="one",
+    )
+    return await render_template("account/update.html", account=account)
+
+
+@app.route("/accounts/<account_number>/delete", methods=("POST",))
+async def account_delete(account_number):
+    await execute(
+        statements.ACCOUNT_DELETE, {"account_number": account_number}
+    )
+    return redirect(url_for("account_index"))
+
+
+""" PRODUCT ROUTES """
+
+@app.route("/", methods=("GET",))
+@app.route("/products", methods=("GET",))
+async def products_index():
+    return await render_listing(
+        statements.PRODUCT_PAGE,
+        PRODUCT_KEY,
+        "products/index.html",
+        "products",
+        "product",
+    )
+
+
+@app.route("/products/search", methods=("GET",))
+async def products_search():
+    q = request.args.get("q", "").strip()
+    mode = request.args.get("mode", "text")
+    context = {
+        "q": q,
+        "mode": mode,
+        "cust_no": request.args.get("cust_no"),
+        "order_no": request.args.get("order_no"),
+    }
+
+    error = None
+    if mode not in SEARCH_MODES:
+        error = f"Mode must be one of {', '.join(SEARCH_MODES)}."
+    elif not q:
+        error = "A search term is required."
+
+    if error is not None:
+        if wants_json():
+            return jsonify({"error": error}), 400
+        if q:
+            await flash(error)
+        return await render_template(
+            "products/search.html", products=[], next_url=None, **context
+        )
+
+    query, param, key = SEARCH_MODES[mode]
+    return await render_listing(
+        query,
+        key,
+        "products/search.html",
+        "products",
+        params={param: like_prefix(q) if mode == "prefix" else q},
+        **context,
+    )
+
+
+@app.route("/products/register", methods=("POST", "GET"))
+async def product_register():
+    if request.method == "POST":
+        form = await request.form
+        error = None
+        if not form["name"]:
+            error = "Name is required."
+        elif not form["sku"]:
+            error = "SKU is required."
+        elif not form["description"]:
+            error = "Description is required."
+        elif not form["price"]:
+            error = "Price is required."
+
+        if error is not None:
+            await flash(error)
+        else:
+            await execute(
+                statements.PRODUCT_INSERT,
+                {
+                    "sku": form["sku"],
+                    "name": form["name"],
+                    "description": form["description"],
+                    "price": form["price"],
+                    "ean": form.get("ean") or None,
+                },
+            )
+            return redirect(url_for("products_index"))
+
+    return await render_template("products/register.html")
+
+
+def import_upload(stream, fmt):
+    # COPY FROM a file is blocking work; it runs in a thread on its own
+    # connection rather than tying up the event loop.
+    with psycopg.connect(DATABASE_URL) as conn:
+        result = product_import.import_products(conn, product_import.READERS[fmt](stream))
+        conn.commit()
+    return result
+
+
+@app.route("/products/import", methods=("POST", "GET"))
+async def products_import():
+    result = error = None
+    if request.method == "POST":
+        upload = (await request.files).get("file")
+        if upload is None:
+            error = "A file is required."
+        else:
+            fmt = request.args.get("format") or product_import.guess_format(upload.filename)
+            if fmt not in product_import.FORMATS:
+                error = "Format must be csv or jsonl."
+            else:
+                result = await run_sync(import_upload)(upload.stream, fmt)
+
+        if wants_json():
+            if error is not None:
+                return jsonify({"error": error}), 400
+            return jsonify(result._asdict())
+    return await render_template("products/import.html", result=result, error=error)
+
+
+@app.route("/products/<product_sku>/update", methods=("GET", "POST"))
+async def product_update(product_sku):
+    if request.method == "POST":
+        form = await request.form
+        if not form["price"]:
+            await flash("Price is required.")
+        elif not form["description"]:
+            await flash("Description is required.")
+        else:
+            await execute(
+                statements.PRODUCT_UPDATE,
+                {
+                    "product_sku": product_sku,
+                    "price": form["price"],
+                    "description": form["description"],
+                },
+            )
+            return redirect(url_for("products_index"))
+
+    product = await execute(
+        statements.PRODUCT_BY_SKU,
+        {"product_sku": product_sku},
+        fetch="one",
+    )
+    return await render_template("products/update.html", product=product)
+
+
+@app.route("/<cust_no>/<order_no>/shop", methods=("GET",))
+async def shopping(cust_no, order_no):
+    return await render_listing(
+        statements.PRODUCT_PAGE,
+        PRODUCT_KEY,
+        "products/index_customer.html",
+        "products",
+        "product",
+        order_no=order_no,
+        cust_no=cust_no,
+    )
+
+
+@app.route("/products/<product_sku>/delete", methods=("POST",))
+async def product_delete(product_sku):
+    await execute(
+        statements.PRODUCT_DELETE, {"product_sku": product_sku}
+    )
+    return redirect(url_for("products_index"))
+
+
+""" CUSTOMER ROUTES """
+
+@app.route("/customers", methods=("GET",))
+async def customers_index():
+    return await render_listing(
+        statements.CUSTOMER_PAGE,
+        "cust_no",
+        "customer/index.html",
+        "customers",
+        "customer",
+    )
+
+
+@app.route("/customers/lookup", methods=("GET",))
+async def customers_lookup():
+    q = request.args.get("q", "").strip()
+    limit = max(1, min(request.args.get("limit", 10, type=int), LOOKUP_LIMIT))
+    if not q:
+        return jsonify([])
+    customers = await execute(
+        statements.CUSTOMER_LOOKUP,
+        {
+            "prefix": like_prefix(q),
+            "phone_prefix": like_prefix(q.replace(" ", "")),
+            "limit": limit,
+        },
+        fetch="all",
+    )
+    return jsonify([customer._asdict() for customer in customers])
+
+
+@app.route("/customers/register", methods=("POST", "GET"))
+async def customer_register():
+    if request.method == "POST":
+        form = await request.form
+        missing = [field for field in ("name", "email", "phone", "address") if not form[field]]
+        if missing:
+            await flash(f"{missing[0].capitalize()} is required.")
+        else:
+            await execute(
+                statements.CUSTOMER_INSERT,
+                {field: form[field] for field in ("name", "email", "phone", "address")},
+            )
+            return redirect(url_for("customers_index"))
+
+    return await render_template("customer/register.html")
+
+
+@app.route("/customers/<int:cust_no>/delete", methods=("GET", "POST"))
+async def customer_delete(cust_no):
+    await execute(statements.CUSTOMERS_DELETE, {"cust_nos": [cust_no]})
+    return redirect(url_for("customers_index"))
+
+
+@app.route("/customers/delete", methods=("POST",))
+async def customers_delete():
+    if request.is_json:
+        body = await request.get_json(silent=True)
+        cust_nos = body.get("cust_nos", []) if isinstance(body, dict) else None
+    else:
+        cust_nos = (await request.form).getlist("cust_no")
+    try:
+        cust_nos = customer_numbers(cust_nos)
+    except ValueError as error:
+        if wants_json() or request.is_json:
+            return jsonify({"error": str(error)}), 400
+        await flash(str(error))
+        return redirect(url_for("customers_index"))
+
+    deleted = await execute(statements.CUSTOMERS_DELETE, {"cust_nos": cust_nos})
+    if wants_json():
+        return jsonify({"deleted": deleted})
+    return redirect(url_for("customers_index"))
+
+
+""" SUPPLIER ROUTES """
+
+@app.route("/suppliers", methods=("GET",))
+async def suppliers_index():
+    return await render_listing(
+        statements.SUPPLIER_PAGE,
+        "tin",
+        "suppliers/index.html",
+        "suppliers",
+        "supplier",
+    )
+
+
+SUPPLIER_FIELDS = {"tin": "TIN", "name": "Name", "address": "Address", "sku": "SKU"}
+
+
+@app.route("/suppliers/register", methods=("POST", "GET"))
+async def supplier_register():
+    if request.method == "POST":
+        form = await request.form
+        missing = [field for field in ("tin", "name", "address", "sku") if not form[field]]
+        if missing:
+            await flash(f"{SUPPLIER_FIELDS[missing[0]]} is required.")
+        else:
+            await execute(
+                statements.SUPPLIER_INSERT,
+                {field: form[field] for field in ("tin", "name", "address", "sku")},
+            )
+            return redirect(url_for("suppliers_index"))
+
+    return await render_template("suppliers/register.html")
+
+
+@app.route("/suppliers/<tin>/delete", methods=("GET", "POST"))
+async def supplier_delete(tin):
+    async with pool.connection() as conn:
+        # one round trip for both deletes, see app.pipeline().
+        async with conn.pipeline(), conn.cursor() as cur:
+            await statements.execute_async(cur, statements.DELIVERY_DELETE, {"tin": tin})
+            await statements.execute_async(cur, statements.SUPPLIER_DELETE, {"tin": tin})
+    return redirect(url_for("suppliers_index"))
+
+
+""" ORDER ROUTES """
+
+@app.route("/order_customer", methods=("GET", "POST"))
+async def set_customer():
+    candidates = []
+    if request.method == "POST":
+        form = await request.form
+        cust_no = next((n.strip() for n in form.getlist("cust_no") if n.strip()), "")
+        cust_name = form.get("name", "").strip()
+        if not cust_no and not cust_name:
+            await flash("Customer name is required.")
+        elif cust_no and not cust_no.isdigit():
+            await flash("Customer number is required to be numeric.")
+        else:
+            if cust_no:
+                order = await execute(
+                    statements.ORDER_FOR_CUSTOMER, {"cust_no": cust_no}, fetch="one"
+                )
+            else:
+                candidates = await execute(
+                    statements.ORDER_FOR_CUSTOMER_NAME,
+                    {"cust_name": cust_name, "limit": LOOKUP_LIMIT},
+                    fetch="all",
+                )
+                order = candidates[0] if len(candidates) == 1 else None
+            if order is not None:
+                return redirect(
+                    url_for("shopping", order_no=order.order_no, cust_no=order.cust_no)
+                )
+            if candidates:
+                await flash(f"Several customers are called {cust_name}; pick one.")
+            else:
+                await flash("Customer not found.")
+    return await render_template("order/set_customer.html", candidates=candidates)
+
+
+@app.route("/order", methods=("GET", "POST"))
+async def create_order():
+    if request.method == "POST":
+        if request.is_json:
+            body = await request.get_json(silent=True)
+            if isinstance(body, dict):
+                cust_no, items = body.get("cust_no"), body.get("lines")
+            else:
+                cust_no, items = None, None
+        else:
+            form = await request.form
+            cust_no, items = form["cust_no"], form_lines(form)
+
+        error = None
+        if not cust_no:
+            error = "Customer number is required."
+        elif not str(cust_no).isdigit() or int(cust_no) > MAX_CUST_NO:
+            error = "Customer number must be a number."
+        else:
+            try:
+                skus, qtys = cart_lines(items)
+            except ValueError as invalid:
+                error = str(invalid)
+
+        if error is None:
+            try:
+                order = await execute(
+                    statements.ORDER_CREATE,
+                    {"cust_no": cust_no, "skus": skus, "qtys": qtys},
+                    fetch="one",
+                )
+            except psycopg.errors.ForeignKeyViolation:
+                error = "Unknown customer or product."
+
+        if error is not None:
+            if wants_json():
+                return jsonify({"error": error}), 400
+            await flash(error)
+        else:
+            if wants_json():
+                return jsonify({"order_no": order.order_no, "cust_no": cust_no}), 201
+            return redirect(url_for("shopping", order_no=order.order_no, cust_no=cust_no))
+    return await render_template("order/create.html")
+
+
+@app.route("/<cust_no>/<order_no>/cart", methods=("GET", "POST"))
+async def cart(cust_no, order_no):
+    if request.method == "POST":
+        body = await request.get_json(silent=True)
+        try:
+            skus, qtys = cart_lines(body.get("lines") if isinstance(body, dict) else body)
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+
+    params = {"order_no": order_no}
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=namedtuple_row) as lines:
+            async with conn.cursor(row_factory=namedtuple_row) as summary:
+                try:
+                    async with conn.pipeline():
+                        if request.method == "POST":
+                            await statements.execute_async(
+                                lines,
+                                statements.CART_ADD_MANY,
+                                {"order_no": order_no, "skus": skus, "qtys": qtys},
+                            )
+                        await statements.execute_async(lines, statements.CHECKOUT_LINES, params)
+                        await statements.execute_async(summary, statements.CART_SUMMARY, params)
+                except psycopg.errors.ForeignKeyViolation:
+                    return jsonify({"error": "Unknown order or product."}), 400
+                products = await lines.fetchall()
+                total = await summary.fetchone()
+
+    return jsonify(
+        {
+            "order_no": order_no,
+            "cust_no": cust_no,
+            "lines": [product._asdict() for product in products],
+            "summary": total._asdict() if total else None,
+        }
+    )
+
+
+@app.route("/<cust_no>/<order_no>/<product_sku>", methods=("POST",))
+async def add_to_cart(product_sku, order_no, cust_no):
+    await execute(
+        statements.CART_ADD,
+        {"order_no": order_no, "product_sku": product_sku},
+    )
+    return redirect(url_for("shopping", order_no=order_no, cust_no=cust_no))
+
+
+@app.route("/<cust_no>/<order_no>/checkout", methods=("GET", "POST"))
+async def checkout(cust_no, order_no):
+    params = {"order_no": order_no}
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=namedtuple_row) as lines:
+            async with conn.cursor(row_factory=namedtuple_row) as summary:
+                async with conn.pipeline():
+                    await statements.execute_async(lines, statements.CHECKOUT_LINES, params)
+                    await statements.execute_async(summary, statements.CART_SUMMARY, params)
+                products = await lines.fetchall()
+                total = await summary.fetchone()
+
+    return await render_template(
+        "order/checkout.html", products=products, total=total, cust_no=cust_no, order_no=order_no
+    )
+
+
+@app.route("/<cust_no>/<order_no>/payed", methods=("GET", "POST"))
+async def confirm_payment(cust_no, order_no):
+    await execute(
+        statements.PAYMENT_INSERT,
+        {"cust_no": cust_no, "order_no": order_no},
+    )
+    return redirect(url_for("set_customer"))
+
+
+""" ANALYTICS """
+
+@app.route("/analytics/sales", methods=("GET",))
+async def analytics_sales():
+    by = request.args.get("by")
+    filters = {
+        name: request.args[name] for name in analytics.DIMENSIONS if name in request.args
+    }
+    try:
+        query, params = analytics.build_sales_query(
+            by.split(",") if by else [],
+            grouping=request.args.get("grouping", "rollup"),
+            filters=filters,
+        )
+    except analytics.AnalyticsError as error:
+        return jsonify({"error": str(error)}), 400
+
+    # built per request, so not one of statements.py.
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=namedtuple_row) as cur:
+            await cur.execute(query, params)
+            sales = await cur.fetchall()
+    return jsonify([row._asdict() for row in sales])
+
+
+""" REPORTS """
+
+@app.route("/reports/top-customers", methods=("GET",))
+async def report_top_customers():
+    limit = request.args.get("limit", REPORT_TOP_CUSTOMERS, type=int)
+    customers = await execute(
+        statements.REPORT_TOP_CUSTOMERS,
+        {"limit": max(1, min(limit, MAX_PAGE_SIZE))},
+        fetch="all",
+    )
+    return jsonify([customer._asdict() for customer in customers])
+
+
+@app.route("/reports/unpaid-orders", methods=("GET",))
+async def report_unpaid_orders():
+    months = await execute(
+        statements.REPORT_UNPAID_ORDERS,
+        {"year": request.args.get("year", type=int)},
+        fetch="all",
+    )
+    return jsonify([month._asdict() for month in months])
+
+
+""" EXPORTS """
+
+async def copy_chunks(statement):
+    """Async twin of exports.copy_chunks."""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            async with cur.copy(statement) as copy:
+                buffer = bytearray()
+                async for data in copy:
+                    buffer += data
+                    if len(buffer) >= exports.CHUNK_SIZE:
+                        yield bytes(buffer)
+                        buffer.clear()
+                if buffer:
+                    yield bytes(buffer)
+
+
+@app.route("/export/<name>.<fmt>", methods=("GET",))
+async def export(name, fmt):
+    columns = request.args.get("columns")
+    try:
+        statement = exports.build_copy(
+            name,
+            fmt,
+            columns=columns.split(",") if columns else None,
+            date_from=request.args.get("from"),
+            date_to=request.args.get("to"),
+        )
+    except exports.ExportError as error:
+        return jsonify({"error": str(error)}), 400
+
+    return Response(
+        copy_chunks(statement),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={name}.{fmt}"},
+    )
+
+
+@app.route("/ping", methods=("GET",))
+async def ping():
+    return jsonify({"message": "pong!", "status": "success"})
+
+
+if __name__ == "__main__":
+    app.run()
@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+"""Load the shopping -> add_to_cart -> checkout flow on two servers.
+
+usage: bench/asgi_vs_wsgi.py CUSTOMER_NAME CLIENTS URL [URL...]
+
+Start the servers to compare against the same local Postgres first, e.g.
+
+    python3 -m flask --app app run --port 5000 --with-threads
+    hypercorn asgi:app --bind 127.0.0.1:8000
+
+then run bench/asgi_vs_wsgi.py 'John Smith' 64 http://127.0.0.1:5000 http://127.0.0.1:8000
+
+Each client opens an order for the customer, adds CART_LINES products to
+it (each POST is redirected to the shop page, as a browser would follow)
+and loads the checkout, FLOWS_PER_CLIENT times over.
+"""
+import statistics
+import sys
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+CART_LINES = 5
+FLOWS_PER_CLIENT = 5
+SKUS = ("PLT-PAP-PNK-09", "CUP-PAP-BLU-25", "HAT-PAP-USA-10", "PIN-PAP-CSC-50", "FOG-MCH-LED-2K")
+
+
+def request(url, data=None):
+    start = time.perf_counter()
+    body = urllib.parse.urlencode(data).encode() if data is not None else None
+    with urllib.request.urlopen(url, data=body, timeout=60) as response:
+        response.read()
+        final_url = response.geturl()
+    return final_url, time.perf_counter() - start
+
+
+def flow(base, cust_name):
+    """Run the flows of one client, returning the latency of each request."""
+    latencies = []
+    for _ in range(FLOWS_PER_CLIENT):
+        shop_url, elapsed = request(f"{base}/order_customer", {"name": cust_name})
+        latencies.append(elapsed)
+        order_path = urllib.parse.urlparse(shop_url).path.rsplit("/", 1)[0]
+        for sku in SKUS[:CART_LINES]:
+            _, elapsed = request(f"{base}{order_path}/{sku}", {})
+            latencies.append(elapsed)
+        _, elapsed = request(f"{base}{order_path}/checkout")
+        latencies.append(elapsed)
+    return latencies
+
+
+def run(base, cust_name, clients):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(flow, [base] * clients, [cust_name] * clients))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def main(cust_name, clients, *urls):
+    print(f"{'server':<28} {'requests':>8} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for base in urls:
+        result = run(base.rstrip("/"), cust_name, int(clients))
+        print(
+            f"{base:<28} {result['requests']:>8} {result['throughput']:>8.0f} "
+            f"{result['p50'] * 1000:>9.1f} {result['p99'] * 1000:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.exit(__doc__.split("\n\n")[1])
+    main(*sys.argv[1:])
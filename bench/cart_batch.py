@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""Fill a cart one product per POST, then with a single batch request.
+
+usage: bench/cart_batch.py [products]
+
+Drives the Flask app through its test client. The per-product path
+follows each add_to_cart redirect to the shop page, like a browser does;
+the batch path posts every line to /<cust_no>/<order_no>/cart and gets the
+cart back. Both carts are compared, then the two throwaway orders are
+deleted.
+"""
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import app  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+
+
+def new_order(client, cust_no, sku):
+    response = client.post(
+        "/order",
+        json={"cust_no": cust_no, "lines": [{"sku": sku, "qty": 1}]},
+        headers={"Accept": "application/json"},
+    )
+    return response.get_json()["order_no"]
+
+
+def main(products=40):
+    with psycopg.connect(DATABASE_URL) as conn:
+        cust_no = conn.execute("SELECT MIN(cust_no) FROM customer;").fetchone()[0]
+        skus = [sku for sku, in conn.execute("SELECT SKU FROM product LIMIT %s;", (products,))]
+
+    client = app.test_client()
+    one_by_one = new_order(client, cust_no, skus[0])
+    batch = new_order(client, cust_no, skus[0])
+    try:
+        start = time.perf_counter()
+        for sku in skus:
+            client.post(f"/{cust_no}/{one_by_one}/{sku}", follow_redirects=True)
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post(
+            f"/{cust_no}/{batch}/cart", json=[{"sku": sku, "qty": 1} for sku in skus]
+        )
+        batched = time.perf_counter() - start
+
+        same = (
+            client.get(f"/{cust_no}/{one_by_one}/cart").get_json()["lines"]
+            == response.get_json()["lines"]
+        )
+        print(f"{len(skus)} products: {single * 1000:.1f}ms one per POST, "
+              f"{batched * 1000:.1f}ms in one batch ({single / batched:.0f}x); "
+              f"carts {'match' if same else 'DIFFER'}")
+    finally:
+        with psycopg.connect(DATABASE_URL) as conn:
+            conn.execute(
+                "DELETE FROM contains WHERE order_no = ANY(%s);", ([one_by_one, batch],)
+            )
+            conn.execute("DELETE FROM orders WHERE order_no = ANY(%s);", ([one_by_one, batch],))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+"""Time app.cgi from process start to the end of its response.
+
+usage: bench/cgi_startup.py [iterations] [path]
+
+Runs app.cgi as the web server would, once per request, for `path`
+(/products by default) in three setups: the app imported with a pool that
+connects at import (what every request used to cost), the app imported
+with a single direct connection (APP_POOL=direct, the CGI default now),
+and the request forwarded to a worker.py that was started beforehand.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+CGI = [sys.executable, str(ROOT / "app.cgi")]
+
+
+def cgi_environ(path, **extra):
+    return {
+        **os.environ,
+        "GATEWAY_INTERFACE": "CGI/1.1",
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "/app.cgi",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_ACCEPT": "application/json",
+        **extra,
+    }
+
+
+def timed(environ, iterations):
+    """Milliseconds per request, and the status line of the last one."""
+
+    total = 0.0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        output = subprocess.run(
+            CGI, env=environ, stdin=subprocess.DEVNULL, capture_output=True, check=True
+        ).stdout
+        total += time.perf_counter() - start
+    return total / iterations * 1e3, output.split(b"\r\n", 1)[0].decode()
+
+
+def wait_for(path, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"worker did not listen on {path}")
+        time.sleep(0.01)
+
+
+def main(iterations=20, path="/products"):
+    iterations = int(iterations)
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "app.sock")
+        setups = {
+            "pool": cgi_environ(path, APP_POOL="pool", APP_WORKER_SOCKET=socket_path),
+            "direct": cgi_environ(path, APP_WORKER_SOCKET=socket_path),
+        }
+        results = {name: timed(env, iterations) for name, env in setups.items()}
+
+        worker = subprocess.Popen(
+            [sys.executable, str(ROOT / "worker.py"), socket_path], env=os.environ
+        )
+        try:
+            wait_for(socket_path)
+            env = cgi_environ(path, APP_WORKER_SOCKET=socket_path)
+            timed(env, 1)  # the worker opens its pool on the first request
+            results["worker"] = timed(env, iterations)
+        finally:
+            worker.terminate()
+            worker.wait()
+
+    for name, (ms, status) in results.items():
+        print(f"{name:<8} {ms:>8.1f}ms  {status}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
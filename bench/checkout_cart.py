@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+"""Compare the old two-query checkout with the cart_summary one on big carts.
+
+usage: bench/checkout_cart.py [line counts...]
+
+For each line count a throwaway order gets that many lines (one per
+product, so there must be at least as many products), checkout is timed
+both ways, cart_summary is checked against a full recomputation, and the
+order is deleted again.
+"""
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import statements  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+
+OLD_LINES = """
+    SELECT p.name, p.description, p.price, c.qty, SUM(p.price * c.qty) AS subtotal
+    FROM contains c
+    NATURAL JOIN product p
+    WHERE c.order_no = %(order_no)s
+    GROUP BY p.name, qty, price, p.description;
+    """
+OLD_TOTAL = """
+    SELECT SUM(p.price * c.qty) AS total
+    FROM contains c
+    NATURAL JOIN product p
+    WHERE c.order_no = %(order_no)s;
+    """
+ITERATIONS = 20
+
+
+def seed(conn, lines):
+    """An order of `lines` lines, built through add_to_cart's statement."""
+
+    cust_no = conn.execute("SELECT MIN(cust_no) FROM customer;").fetchone()[0]
+    order_no = conn.execute(
+        "INSERT INTO orders (cust_no, date) VALUES (%s, CURRENT_DATE) RETURNING order_no;",
+        (cust_no,),
+    ).fetchone()[0]
+    skus = conn.execute("SELECT SKU FROM product LIMIT %s;", (lines,)).fetchall()
+    with conn.cursor() as cur:
+        cur.executemany(
+            statements.CART_ADD,
+            [{"order_no": order_no, "product_sku": sku} for sku, in skus * 2],
+        )
+    return order_no
+
+
+def timed(conn, queries, params):
+    """Milliseconds per checkout."""
+
+    with conn.cursor() as cur:
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            for query in queries:
+                cur.execute(query, params, prepare=True).fetchall()
+        return (time.perf_counter() - start) / ITERATIONS * 1000
+
+
+def main(*line_counts):
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        print(f"{'lines':>6} {'old':>10} {'new':>10} {'total only':>11}  summary")
+        for lines in line_counts or (10, 1000, 5000):
+            order_no = seed(conn, lines)
+            params = {"order_no": order_no}
+            try:
+                old = timed(conn, (OLD_LINES, OLD_TOTAL), params)
+                new = timed(conn, (statements.CHECKOUT_LINES, statements.CART_SUMMARY), params)
+                total = timed(conn, (statements.CART_SUMMARY,), params)
+                expected = conn.execute(OLD_TOTAL, params).fetchone()[0]
+                summary = conn.execute(statements.CART_SUMMARY, params).fetchone()
+                ok = summary is not None and summary[2] == expected
+                print(
+                    f"{lines:>6} {old:>8.2f}ms {new:>8.2f}ms {total:>9.3f}ms  "
+                    f"{'ok' if ok else f'MISMATCH {summary} != {expected}'}"
+                )
+            finally:
+                conn.execute("DELETE FROM contains WHERE order_no = %s;", (order_no,))
+                conn.execute("DELETE FROM orders WHERE order_no = %s;", (order_no,))
+            gone = conn.execute(statements.CART_SUMMARY, params).fetchone()
+            if gone is not None:
+                print(f"cart_summary row left behind for {order_no}: {gone}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+"""Poll the JSON listings the way a client that keeps its copy does.
+
+usage: bench/conditional_listing.py [iterations] [limit]
+
+Drives the Flask app through its test client. For each listing it times
+a full download with the page and body caches emptied before every
+request (what every poll used to cost), a full download served from
+listing_bodies, and a poll that sends the ETag back and gets a 304.
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import app  # noqa: E402
+from app import catalog_cache  # noqa: E402
+from app import listing_bodies  # noqa: E402
+
+
+LISTINGS = {"product": "/products", "customer": "/customers", "supplier": "/suppliers"}
+JSON = {"Accept": "application/json"}
+
+
+def timed(client, url, iterations, headers, before=None):
+    """Microseconds per request, and the status of the last one."""
+
+    total = 0.0
+    for _ in range(iterations):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        total += time.perf_counter() - start
+    return total / iterations * 1e6, response.status_code
+
+
+def uncached(table):
+    listing_bodies[table].invalidate()
+    catalog_cache.invalidate()
+
+
+def main(iterations=500, limit=500):
+    client = app.test_client()
+    print(f"{'listing':<10} {'uncached':>16} {'cached body':>16} {'If-None-Match':>16}")
+    for table, path in LISTINGS.items():
+        url = f"{path}?limit={limit}"
+        etag = client.get(url, headers=JSON).headers["ETag"]
+        results = [
+            timed(client, url, iterations, JSON, lambda: uncached(table)),
+            timed(client, url, iterations, JSON),
+            timed(client, url, iterations, {**JSON, "If-None-Match": etag}),
+        ]
+        print(
+            f"{table:<10}"
+            + "".join(f" {us:>9.0f}us ({status})" for us, status in results)
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
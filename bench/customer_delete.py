@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+"""Compare the old per-order customer delete with the set-based one.
+
+usage: bench/customer_delete.py [order counts...]
+
+For each order count a throwaway customer is created with that many
+orders, each with one line, a payment and a processing row, then deleted
+once per path. Needs at least one product and one employee in the database.
+"""
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import delete_customers  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+
+
+def seed(conn, orders):
+    """Create a customer with `orders` orders and return its number."""
+
+    cust_no = conn.execute(
+        """
+        INSERT INTO customer (name, email)
+        VALUES ('bench', 'bench-' || nextval('customer_cust_no_seq') || '@bench')
+        RETURNING cust_no;
+        """
+    ).fetchone()[0]
+    conn.execute(
+        """
+        WITH new_orders AS (
+            INSERT INTO orders (cust_no, date)
+            SELECT %(cust_no)s, CURRENT_DATE
+            FROM generate_series(1, %(orders)s)
+            RETURNING order_no
+        ), new_contains AS (
+            INSERT INTO contains (order_no, SKU, qty)
+            SELECT order_no, (SELECT MIN(SKU) FROM product), 1
+            FROM new_orders
+        ), new_process AS (
+            INSERT INTO process (ssn, order_no)
+            SELECT (SELECT MIN(ssn) FROM employee), order_no
+            FROM new_orders
+        )
+        INSERT INTO pay (order_no, cust_no)
+        SELECT order_no, %(cust_no)s
+        FROM new_orders;
+        """,
+        {"cust_no": cust_no, "orders": orders},
+    )
+    conn.commit()
+    return cust_no
+
+
+def old_delete(cur, cust_no):
+    """The loop customer_delete used to run: 3N + 3 statements."""
+
+    order_no = cur.execute(
+        "SELECT order_no FROM orders WHERE cust_no = %(cust_no)s;",
+        {"cust_no": cust_no},
+    ).fetchall()
+    for nums in order_no:
+        for table in ("contains", "pay", "process"):
+            cur.execute(
+                f"DELETE FROM {table} WHERE order_no = %(nums)s;",
+                {"nums": nums[0]},
+            )
+    cur.execute("DELETE FROM orders WHERE cust_no = %(cust_no)s;", {"cust_no": cust_no})
+    cur.execute("DELETE FROM customer WHERE cust_no = %(cust_no)s;", {"cust_no": cust_no})
+
+
+def new_delete(cur, cust_no):
+    delete_customers(cur, [cust_no])
+
+
+def timed(conn, path, orders):
+    cust_no = seed(conn, orders)
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        path(cur, cust_no)
+    conn.commit()
+    return time.perf_counter() - start
+
+
+def main(counts=(1, 10, 100, 1000, 10000)):
+    print(f"{'orders':>8} {'old (ms)':>10} {'new (ms)':>10} {'speedup':>8}")
+    with psycopg.connect(DATABASE_URL) as conn:
+        for orders in counts:
+            old = timed(conn, old_delete, orders)
+            new = timed(conn, new_delete, orders)
+            print(f"{orders:>8} {old * 1000:>10.1f} {new * 1000:>10.1f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(*([[int(arg) for arg in sys.argv[1:]]] if sys.argv[1:] else []))
@@ -0,0 +1,249 @@
+#!/usr/bin/python3
+"""Fill the schema with synthetic data at a given number of orders.
+
+usage: bench/generate.py [orders] [seed]
+
+EMPTIES customer, orders, contains, pay, process, employee, product,
+supplier, workplace, warehouse and delivery, then loads `orders` orders
+(10^3 to 10^7) and everything they need, in proportion:
+
+    customers  orders / 10      products   orders / 100
+    employees  orders / 1000    suppliers  products / 2
+    warehouses orders / 100000, between 3 and 100
+    1 to 5 lines per order, 4 orders in 5 paid, 9 in 10 processed
+
+Rows are generated by Postgres itself (generate_series), so nothing goes
+through Python. The per-row triggers of the summary tables are disabled
+while the rows are loaded, and sales_daily, sales_monthly, cart_summary,
+customer_spending and unpaid_monthly are rebuilt in one pass afterwards,
+as the migrations do. Needs the migrations applied.
+"""
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from web import DATABASE_URL  # noqa: E402
+
+
+MIN_ORDERS = 10**3
+MAX_ORDERS = 10**7
+
+TABLES = (
+    "delivery", "supplier", "process", "pay", "contains", "orders",
+    "customer", "product", "employee", "warehouse", "office", "works",
+    "workplace", "sales_daily", "sales_monthly", "cart_summary",
+    "customer_spending", "unpaid_monthly",
+)  # fmt: skip
+
+CITIES = (
+    "Lisboa", "Porto", "Braga", "Coimbra", "Faro",
+    "Aveiro", "Beja", "Evora", "Leiria", "Viseu",
+)  # fmt: skip
+
+# each statement takes the scale of generate() as parameters.
+STEPS = {
+    "product": """
+        INSERT INTO product (SKU, name, description, price, ean)
+        SELECT
+            'SKU-' || lpad(n::text, 8, '0'),
+            'Product ' || n,
+            'Synthetic product ' || n || ', pack of ' || (1 + n %% 50),
+            round((0.5 + random() * 500)::numeric, 2),
+            5600000000000 + n
+        FROM generate_series(1, %(products)s) AS n;
+        """,
+    "customer": """
+        INSERT INTO customer (cust_no, name, email, phone, address)
+        SELECT
+            n,
+            'Customer ' || n,
+            'customer' || n || '@example.com',
+            (910000000 + n %% 90000000)::text,
+            'Rua ' || (1 + n %% 200) || ' ' || (n %% 100) || ', '
+                || (1000 + n %% 9000) || '-' || lpad((n %% 1000)::text, 3, '0') || ' '
+                || (%(cities)s::text[])[1 + n %% cardinality(%(cities)s::text[])]
+        FROM generate_series(1, %(customers)s) AS n;
+        """,
+    "orders": """
+        INSERT INTO orders (order_no, cust_no, date)
+        SELECT
+            n,
+            1 + floor(random() * %(customers)s)::integer,
+            DATE '2021-01-01' + floor(random() * 730)::integer
+        FROM generate_series(1, %(orders)s) AS n;
+        """,
+    # the stride is prime, so the (at most 5) lines of an order are distinct
+    # products as long as there are more products than that.
+    "contains": """
+        INSERT INTO contains (order_no, SKU, qty)
+        SELECT
+            o.n,
+            'SKU-' || lpad((1 + (o.n::bigint * 7919 + line * 104729) %% %(products)s)::text, 8, '0'),
+            1 + floor(random() * 10)::integer
+        FROM generate_series(1, %(orders)s) AS o(n),
+            generate_series(0, (o.n * 31) %% 5) AS line
+        ON CONFLICT DO NOTHING;
+        """,
+    "pay": """
+        INSERT INTO pay (order_no, cust_no)
+        SELECT order_no, cust_no
+        FROM orders
+        WHERE order_no %% 5 <> 0;
+        """,
+    "employee": """
+        INSERT INTO employee (ssn, TIN, bdate, name)
+        SELECT
+            lpad(n::text, 9, '0'),
+            lpad((500000000 + n)::text, 9, '0'),
+            DATE '1960-01-01' + floor(random() * 14000)::integer,
+            'Employee ' || n
+        FROM generate_series(1, %(employees)s) AS n;
+        """,
+    "process": """
+        INSERT INTO process (ssn, order_no)
+        SELECT lpad((1 + order_no %% %(employees)s)::text, 9, '0'), order_no
+        FROM orders
+        WHERE order_no %% 10 <> 0;
+        """,
+    "workplace": """
+        INSERT INTO workplace (address, lat, long)
+        SELECT
+            'Warehouse ' || n || ', ' || (%(cities)s::text[])[1 + n %% cardinality(%(cities)s::text[])],
+            37 + n * 0.01,
+            -9 + n * 0.01
+        FROM generate_series(1, %(warehouses)s) AS n;
+        """,
+    "warehouse": """
+        INSERT INTO warehouse (address)
+        SELECT address FROM workplace;
+        """,
+    "supplier": """
+        INSERT INTO supplier (TIN, name, address, SKU, date)
+        SELECT
+            'TIN' || lpad(n::text, 9, '0'),
+            'Supplier ' || n,
+            'Zona Industrial ' || n || ', ' || (%(cities)s::text[])[1 + n %% cardinality(%(cities)s::text[])],
+            'SKU-' || lpad((1 + (n * 2 - 1) %% %(products)s)::text, 8, '0'),
+            DATE '2020-01-01' + floor(random() * 1000)::integer
+        FROM generate_series(1, %(suppliers)s) AS n;
+        """,
+    "delivery": """
+        INSERT INTO delivery (address, TIN)
+        SELECT
+            'Warehouse ' || w || ', ' || (%(cities)s::text[])[1 + w %% cardinality(%(cities)s::text[])],
+            TIN
+        FROM (
+            SELECT TIN, 1 + row_number() OVER (ORDER BY TIN) %% %(warehouses)s AS w
+            FROM supplier
+        ) AS s;
+        """,
+    # as in migrations/0004, 0005, 0010 and 0011.
+    "sales_daily": """
+        INSERT INTO sales_daily (sku, city, date, qty, total_price)
+        SELECT c.sku, address_city(cust.address), o.date, SUM(c.qty), SUM(p.price * c.qty)
+        FROM contains c
+            JOIN orders o ON c.order_no = o.order_no
+            JOIN product p ON c.sku = p.sku
+            JOIN customer cust ON o.cust_no = cust.cust_no
+        WHERE c.qty IS NOT NULL
+        GROUP BY c.sku, address_city(cust.address), o.date;
+        """,
+    "sales_monthly": """
+        INSERT INTO sales_monthly (city, month, qty, total_price)
+        SELECT city, date_trunc('month', date)::date, SUM(qty), SUM(total_price)
+        FROM sales_daily
+        GROUP BY city, date_trunc('month', date)::date;
+        """,
+    "cart_summary": """
+        INSERT INTO cart_summary (order_no, lines, items, total)
+        SELECT c.order_no, COUNT(*), COALESCE(SUM(c.qty), 0), COALESCE(SUM(p.price * c.qty), 0)
+        FROM contains c
+            JOIN product p ON c.sku = p.sku
+        GROUP BY c.order_no;
+        """,
+    "customer_spending": """
+        INSERT INTO customer_spending (cust_no, paid_orders, paid_total)
+        SELECT pay.cust_no, COUNT(*), COALESCE(SUM(s.total), 0)
+        FROM pay
+            LEFT JOIN cart_summary s ON s.order_no = pay.order_no
+        GROUP BY pay.cust_no;
+        """,
+    "unpaid_monthly": """
+        INSERT INTO unpaid_monthly (month, orders)
+        SELECT date_trunc('month', o.date)::date, COUNT(*)
+        FROM orders o
+        WHERE NOT EXISTS (SELECT 1 FROM pay WHERE pay.order_no = o.order_no)
+        GROUP BY date_trunc('month', o.date)::date;
+        """,
+    "sequences": """
+        SELECT
+            setval('customer_cust_no_seq', %(customers)s + 1, false),
+            setval('orders_order_no_seq', %(orders)s + 1, false);
+        """,
+}
+
+# table -> its per-row triggers that maintain summaries.
+ROW_TRIGGERS = {
+    "contains": ("sales_daily_contains", "cart_summary_contains"),
+    "orders": ("unpaid_monthly_orders", "unpaid_monthly_order_date"),
+    "pay": ("report_summaries_pay",),
+    "cart_summary": ("customer_spending_cart",),
+    "sales_daily": ("sales_monthly_daily",),
+}
+
+
+def scale(orders):
+    """Row counts of every generated table for `orders` orders."""
+
+    if not MIN_ORDERS <= orders <= MAX_ORDERS:
+        raise ValueError(f"orders must be between {MIN_ORDERS} and {MAX_ORDERS}.")
+    products = orders // 100
+    return {
+        "orders": orders,
+        "customers": orders // 10,
+        "products": products,
+        "employees": max(10, orders // 1000),
+        "suppliers": max(1, products // 2),
+        "warehouses": min(100, max(3, orders // 100_000)),
+        "cities": list(CITIES),
+    }
+
+
+def generate(conn, orders, seed=0.5):
+    """Replace the data behind `conn` with a synthetic set, in one transaction.
+
+    Yields the name and seconds of every step as it completes.
+    """
+
+    params = scale(orders)
+    with conn.transaction():
+        conn.execute("SELECT setseed(%s);", (seed,))
+        conn.execute(f"TRUNCATE {', '.join(TABLES)} CASCADE;")
+        for table, triggers in ROW_TRIGGERS.items():
+            for trigger in triggers:
+                conn.execute(f"ALTER TABLE {table} DISABLE TRIGGER {trigger};")
+        for name, statement in STEPS.items():
+            start = time.perf_counter()
+            conn.execute(statement, params)
+            yield name, time.perf_counter() - start
+        for table, triggers in ROW_TRIGGERS.items():
+            for trigger in triggers:
+                conn.execute(f"ALTER TABLE {table} ENABLE TRIGGER {trigger};")
+    conn.execute("ANALYZE;")
+
+
+def main(orders=MIN_ORDERS, seed=0.5):
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        total = 0.0
+        for name, seconds in generate(conn, int(orders), float(seed)):
+            total += seconds
+            print(f"{name:<14} {seconds:>8.2f}s")
+        print(f"{'total':<14} {total:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""Serialize large product and customer listings through both JSON paths.
+
+usage: bench/json_listing.py [rows] [iterations]
+
+Reads up to `rows` rows (100k by default) of the product and customer
+listings and reports, per path, the CPU time of fetching and serializing
+them and the size of the body: namedtuple rows through Flask's encoder
+(what the JSON listings used to do), tuples through json_rows, and the
+"columns" layout of json_rows. Fill the tables first when they hold fewer
+rows than that.
+"""
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+from psycopg.rows import namedtuple_row
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import json_rows  # noqa: E402
+import statements  # noqa: E402
+from app import app  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+
+
+LISTINGS = {"product": statements.PRODUCT_PAGE, "customer": statements.CUSTOMER_PAGE}
+
+
+def flask_body(conn, query, params, layout):
+    with conn.cursor(row_factory=namedtuple_row) as cur:
+        rows = statements.execute(cur, query, params).fetchall()
+    return app.json.dumps(rows), len(rows)
+
+
+def json_rows_body(conn, query, params, layout):
+    with conn.cursor() as cur:
+        json_rows.prepare(cur)
+        rows = statements.execute(cur, query, params).fetchall()
+        names = json_rows.column_names(cur)
+    return json_rows.page_json(names, rows, layout), len(rows)
+
+
+PATHS = {
+    "flask": (flask_body, "rows"),
+    "json_rows": (json_rows_body, "rows"),
+    "columns": (json_rows_body, "columns"),
+}
+
+
+def run(conn, body, query, params, layout, iterations):
+    """CPU seconds per call, bytes of the body and rows read."""
+
+    body(conn, query, params, layout)  # warm up, prepares the statement
+    start = time.process_time()
+    for _ in range(iterations):
+        text, count = body(conn, query, params, layout)
+    seconds = (time.process_time() - start) / iterations
+    return seconds, len(text.encode()), count
+
+
+def main(rows=100_000, iterations=5):
+    params = {"after": None, "limit": rows}
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        print(f"{'listing':<10} {'path':<10} {'rows':>8} {'cpu':>10} {'bytes':>12}")
+        for table, query in LISTINGS.items():
+            for path, (body, layout) in PATHS.items():
+                seconds, size, count = run(
+                    conn, body, query, params, layout, iterations
+                )
+                print(
+                    f"{table:<10} {path:<10} {count:>8}"
+                    f" {seconds * 1e3:>8.1f}ms {size:>12}"
+                )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+"""Overload the app and show what admission control lets through.
+
+usage: bench/overload.py [threads] [seconds]
+
+`threads` clients (64 by default) loop for `seconds` (5) through the Flask
+test client, each on one kind of request: full product listings and
+exports, the cart of an order (a priority route) and /ping. Prints, per
+kind, how many requests were served and shed (503) and their p50 and p99
+latency, then the shed counter of /metrics. With more clients than
+APP_ADMISSION_SLOTS plus APP_ADMISSION_QUEUE the listings get shed while
+the cart and /ping stay fast.
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app  # noqa: E402
+
+
+JSON = {"Accept": "application/json"}
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main(threads=64, seconds=5):
+    threads, seconds = int(threads), float(seconds)
+    with app.pool.connection() as conn:
+        cust_no, order_no = conn.execute(
+            "SELECT cust_no, order_no FROM orders LIMIT 1;"
+        ).fetchone()
+
+    kinds = {
+        "listing": "/products?all=1",
+        "export": "/export/products.csv",
+        "cart": f"/{cust_no}/{order_no}/cart",
+        "ping": "/ping",
+    }
+    results = {kind: {"served": [], "shed": []} for kind in kinds}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client_loop(kind):
+        client = app.app.test_client()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            response = client.get(kinds[kind], headers=JSON)
+            response.get_data()
+            response.close()
+            elapsed = time.perf_counter() - start
+            outcome = "shed" if response.status_code == 503 else "served"
+            with lock:
+                results[kind][outcome].append(elapsed)
+
+    workers = [
+        threading.Thread(target=client_loop, args=(list(kinds)[i % len(kinds)],))
+        for i in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    print(f"{'kind':<8} {'served':>7} {'shed':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for kind, outcome in results.items():
+        timings = sorted(outcome["served"] + outcome["shed"])
+        print(
+            f"{kind:<8} {len(outcome['served']):>7} {len(outcome['shed']):>6}"
+            f" {percentile(timings, 0.50) * 1e3:>8.1f}"
+            f" {percentile(timings, 0.99) * 1e3:>8.1f}"
+        )
+    print()
+    for line in app.metrics.REQUESTS_SHED.render()[2:]:
+        print(line)
+    print(app.admission_control.stats())
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
@@ -0,0 +1,286 @@
+#!/usr/bin/python3
+"""Show the round trips saved on the write paths over a slow network link.
+
+usage: bench/pipeline_latency.py [latency_ms] [iterations]
+
+A local TCP proxy in front of Postgres delays every packet by latency_ms
+in each direction, so one round trip costs about 2 * latency_ms. Each
+path runs as it used to (one statement per round trip) and as the routes
+now run it (a single statement, or statements queued in a pipeline), then
+commits, like a request does. The rows it works on are created beforehand on a direct
+connection and deleted at the end. Needs a product.
+
+Transactions are committed rather than rolled back on purpose: psycopg
+drops its prepared statements on rollback, which would add a re-prepare
+to every iteration.
+"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import statements  # noqa: E402
+from bench.customer_delete import old_delete  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+from web import LOOKUP_LIMIT  # noqa: E402
+
+
+async def pump(reader, writer, latency):
+    """Forward bytes from reader to writer, each chunk `latency` seconds late."""
+
+    queue = asyncio.Queue()
+
+    async def deliver():
+        while True:
+            due, data = await queue.get()
+            if data is None:
+                writer.close()
+                return
+            await asyncio.sleep(max(0.0, due - time.monotonic()))
+            writer.write(data)
+            await writer.drain()
+
+    delivery = asyncio.create_task(deliver())
+    while data := await reader.read(65536):
+        queue.put_nowait((time.monotonic() + latency, data))
+    queue.put_nowait((0, None))
+    await delivery
+
+
+def start_proxy(host, port, latency):
+    """Run the delaying proxy in a daemon thread and return its port."""
+
+    started = threading.Event()
+    bound = {}
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(host, port)
+        await asyncio.gather(
+            pump(client_reader, server_writer, latency),
+            pump(server_reader, client_writer, latency),
+            return_exceptions=True,
+        )
+
+    async def serve():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        bound["port"] = server.sockets[0].getsockname()[1]
+        started.set()
+        await server.serve_forever()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+    started.wait()
+    return bound["port"]
+
+
+def old_set_customer(conn, sample):
+    """set_customer before the orders sequence: MAX(order_no), the
+    customer lookup, then the INSERT."""
+
+    conn.execute("SELECT MAX(order_no) + 1 FROM orders;").fetchone()
+    cust_no = conn.execute(
+        "SELECT cust_no FROM customer WHERE name = %(name)s;", sample
+    ).fetchone()[0]
+    conn.execute(
+        "INSERT INTO orders (cust_no, date) VALUES (%s, CURRENT_DATE);", (cust_no,)
+    )
+
+
+def new_set_customer(conn, sample):
+    with conn.cursor() as cur:
+        statements.execute(
+            cur,
+            statements.ORDER_FOR_CUSTOMER_NAME,
+            {"cust_name": sample["name"], "limit": LOOKUP_LIMIT},
+        ).fetchall()
+
+
+def old_create_order(conn, sample):
+    """create_order as two statements: the order, then its first line."""
+
+    order_no = conn.execute(
+        "INSERT INTO orders (cust_no, date) VALUES (%s, CURRENT_DATE) RETURNING order_no;",
+        (sample["cust_no"],),
+    ).fetchone()[0]
+    conn.execute(
+        "INSERT INTO contains (order_no, SKU, qty) VALUES (%s, %s, 1);",
+        (order_no, sample["sku"]),
+    )
+
+
+def new_create_order(conn, sample):
+    with conn.cursor() as cur:
+        statements.execute(
+            cur,
+            statements.ORDER_CREATE,
+            {"cust_no": sample["cust_no"], "skus": [sample["sku"]], "qtys": [1]},
+        ).fetchone()
+
+
+def old_checkout(conn, sample):
+    """checkout as two queries: the grouped lines, then their sum."""
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT p.name, p.description, p.price, c.qty, SUM(p.price * c.qty) AS subtotal
+            FROM contains c
+            NATURAL JOIN product p
+            WHERE c.order_no = %(order_no)s
+            GROUP BY p.name, qty, price, p.description;
+            """,
+            sample,
+            prepare=True,
+        ).fetchall()
+        cur.execute(
+            """
+            SELECT SUM(p.price * c.qty) AS total
+            FROM contains c
+            NATURAL JOIN product p
+            WHERE c.order_no = %(order_no)s;
+            """,
+            sample,
+            prepare=True,
+        ).fetchone()
+
+
+def new_checkout(conn, sample):
+    with conn.cursor() as lines, conn.cursor() as summary:
+        with conn.pipeline():
+            statements.execute(lines, statements.CHECKOUT_LINES, sample)
+            statements.execute(summary, statements.CART_SUMMARY, sample)
+        lines.fetchall()
+        summary.fetchone()
+
+
+def old_supplier_delete(conn, sample):
+    with conn.cursor() as cur:
+        statements.execute(cur, statements.DELIVERY_DELETE, sample)
+        statements.execute(cur, statements.SUPPLIER_DELETE, sample)
+
+
+def new_supplier_delete(conn, sample):
+    with conn.pipeline(), conn.cursor() as cur:
+        statements.execute(cur, statements.DELIVERY_DELETE, sample)
+        statements.execute(cur, statements.SUPPLIER_DELETE, sample)
+
+
+def old_customer_delete(conn, sample):
+    with conn.cursor() as cur:
+        old_delete(cur, sample["cust_nos"][0])
+
+
+def new_customer_delete(conn, sample):
+    with conn.cursor() as cur:
+        statements.execute(cur, statements.CUSTOMERS_DELETE, sample)
+
+
+class Fixtures:
+    """Throwaway rows for the paths, created on a direct connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.sku = conn.execute("SELECT MIN(SKU) FROM product;").fetchone()[0]
+        self.cust_nos = []
+        self.tins = []
+        self.customer = self.new_customer()
+
+    def new_customer(self):
+        """A customer with one order of one line."""
+
+        name, cust_no = self.conn.execute(
+            """
+            INSERT INTO customer (name, email)
+            SELECT 'bench-' || n, 'bench-' || n || '@pipeline'
+            FROM nextval('customer_cust_no_seq') n
+            RETURNING name, cust_no;
+            """
+        ).fetchone()
+        order_no = self.conn.execute(
+            statements.ORDER_CREATE,
+            {"cust_no": cust_no, "skus": [self.sku], "qtys": [1]},
+        ).fetchone()[0]
+        self.cust_nos.append(cust_no)
+        return {"name": name, "cust_no": cust_no, "order_no": order_no}
+
+    def new_supplier(self):
+        tin = f"bench-{len(self.tins)}-{time.monotonic_ns() % 10**9}"
+        self.conn.execute(
+            "INSERT INTO supplier (TIN, name, SKU) VALUES (%s, 'bench', %s);",
+            (tin, self.sku),
+        )
+        self.tins.append(tin)
+        return tin
+
+    def sample(self, name):
+        if name == "set_customer":
+            return {"name": self.customer["name"]}
+        if name == "create_order":
+            return {"cust_no": self.customer["cust_no"], "sku": self.sku}
+        if name == "checkout":
+            return {"order_no": self.customer["order_no"]}
+        if name == "supplier_delete":
+            return {"tin": self.new_supplier()}
+        return {"cust_nos": [self.new_customer()["cust_no"]]}
+
+    def cleanup(self):
+        self.conn.execute(statements.CUSTOMERS_DELETE, {"cust_nos": self.cust_nos})
+        self.conn.execute("DELETE FROM supplier WHERE TIN = ANY(%s);", (self.tins,))
+
+
+PATHS = {
+    "set_customer": (old_set_customer, new_set_customer),
+    "create_order": (old_create_order, new_create_order),
+    "checkout": (old_checkout, new_checkout),
+    "supplier_delete": (old_supplier_delete, new_supplier_delete),
+    "customer_delete": (old_customer_delete, new_customer_delete),
+}
+
+
+def timed(conn, path, fixtures, name, iterations):
+    """Milliseconds per committed transaction."""
+
+    path(conn, fixtures.sample(name))  # prepares the statements
+    conn.commit()
+    total = 0.0
+    for _ in range(iterations):
+        sample = fixtures.sample(name)
+        start = time.perf_counter()
+        path(conn, sample)
+        conn.commit()
+        total += time.perf_counter() - start
+    return total / iterations * 1000
+
+
+def main(latency_ms=5.0, iterations=20):
+    params = conninfo_to_dict(DATABASE_URL)
+    port = start_proxy(params["host"], int(params.get("port", 5432)), latency_ms / 1000)
+    round_trip = 2 * latency_ms
+
+    with psycopg.connect(DATABASE_URL, autocommit=True) as direct:
+        fixtures = Fixtures(direct)
+        try:
+            with psycopg.connect(DATABASE_URL, host="127.0.0.1", port=port) as conn:
+                print(f"one round trip = {round_trip:g}ms; (round trips) in brackets")
+                print(f"{'path':<16} {'before':>16} {'after':>16}")
+                for name, paths in PATHS.items():
+                    results = [
+                        timed(conn, path, fixtures, name, iterations) for path in paths
+                    ]
+                    print(
+                        f"{name:<16}"
+                        + "".join(
+                            f" {ms:>8.1f}ms ({ms / round_trip:>3.1f})" for ms in results
+                        )
+                    )
+        finally:
+            fixtures.cleanup()
+
+
+if __name__ == "__main__":
+    main(*(float(arg) for arg in sys.argv[1:2]), *(int(arg) for arg in sys.argv[2:3]))
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+"""Check that no request holds more than one pooled connection at a time.
+
+usage: bench/pool_checkouts.py
+
+Drives the routes through the Flask test client against the configured
+database while counting, per thread, how many connections are checked out
+of the pool at once. Exits with 1 if any request needed more than one.
+It writes to the database: it opens an order for the first customer and
+adds two lines to it.
+"""
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app  # noqa: E402
+
+
+held = threading.local()
+
+
+def counting(getconn, putconn):
+    def counted_getconn(*args, **kwargs):
+        conn = getconn(*args, **kwargs)
+        held.now = getattr(held, "now", 0) + 1
+        held.peak = max(getattr(held, "peak", 0), held.now)
+        return conn
+
+    def counted_putconn(conn):
+        held.now -= 1
+        return putconn(conn)
+
+    return counted_getconn, counted_putconn
+
+
+def main():
+    # pool.connection() goes through getconn/putconn too.
+    app.pool.getconn, app.pool.putconn = counting(app.pool.getconn, app.pool.putconn)
+    client = app.app.test_client()
+
+    with app.pool.connection() as conn:
+        customer = conn.execute("SELECT cust_no, name FROM customer LIMIT 1;").fetchone()
+        sku = conn.execute("SELECT SKU FROM product LIMIT 1;").fetchone()[0]
+        held.peak = 0
+
+    order_path = client.post("/order_customer", data={"name": customer[1]}).headers["Location"]
+    order_path = order_path.rsplit("/", 1)[0]
+
+    checks = [
+        ("GET", "/products", None),
+        ("GET", "/products?all=1", None),
+        ("GET", "/customers", None),
+        ("GET", "/suppliers", None),
+        ("GET", f"/products/{sku}/update", None),
+        ("POST", f"{order_path}/{sku}", {}),
+        ("GET", f"{order_path}/shop", None),
+        ("GET", f"{order_path}/checkout", None),
+        ("POST", "/order", {"cust_no": customer[0], "sku_1": sku, "qty_1": "2"}),
+        ("GET", "/analytics/sales?by=sku", None),
+        ("GET", "/export/orders.csv", None),
+        ("POST", "/suppliers/does-not-exist/delete", {}),
+    ]
+
+    worst = 0
+    for method, path, data in checks:
+        held.peak = 0
+        response = client.open(path, method=method, data=data)
+        response.get_data()  # drain streamed bodies
+        print(f"{held.peak} connection(s)  {response.status_code}  {method} {path}")
+        worst = max(worst, held.peak)
+    return worst <= 1
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""Time the hottest lookups of statements.py unprepared and prepared.
+
+usage: bench/prepared_statements.py [iterations]
+
+Each statement runs `iterations` times on one connection, first with
+prepare=False (parse and plan on every call), then with prepare=True (plan
+once, then only bind and execute). Reads an existing product, account and
+order; needs at least one of each with an order line. The account lookup
+is skipped when the database has no account table.
+"""
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import statements  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+
+
+def sample_params(conn):
+    """Parameters of one existing row for each benchmarked statement."""
+
+    sku, order_no = conn.execute(
+        "SELECT SKU, order_no FROM contains ORDER BY order_no LIMIT 1;"
+    ).fetchone()
+    samples = {
+        "product_by_sku": (statements.PRODUCT_BY_SKU, {"product_sku": sku}),
+        "checkout_lines": (statements.CHECKOUT_LINES, {"order_no": order_no}),
+        "cart_summary": (statements.CART_SUMMARY, {"order_no": order_no}),
+    }
+    if conn.execute("SELECT to_regclass('account');").fetchone()[0] is not None:
+        account_number = conn.execute(
+            "SELECT account_number FROM account LIMIT 1;"
+        ).fetchone()[0]
+        samples["account_by_number"] = (
+            statements.ACCOUNT_BY_NUMBER,
+            {"account_number": account_number},
+        )
+    return samples
+
+
+def run(conn, query, params, iterations, prepare):
+    """Seconds per call, over `iterations` calls."""
+
+    with conn.cursor() as cur:
+        cur.execute(query, params, prepare=prepare).fetchall()  # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            cur.execute(query, params, prepare=prepare).fetchall()
+        return (time.perf_counter() - start) / iterations
+
+
+def main(iterations=2000):
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        print(f"{'statement':<20} {'unprepared':>12} {'prepared':>12} {'speedup':>8}")
+        for name, (query, params) in sample_params(conn).items():
+            unprepared = run(conn, query, params, iterations, prepare=False)
+            prepared = run(conn, query, params, iterations, prepare=True)
+            print(
+                f"{name:<20} {unprepared * 1e6:>10.1f}us {prepared * 1e6:>10.1f}us "
+                f"{unprepared / prepared:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
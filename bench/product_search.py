@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+"""Time the product search statements on the catalog as it is.
+
+usage: bench/product_search.py [iterations] [term ...]
+
+Runs the first page of each term (a few taken from the catalog's own
+names by default) in both modes of /products/search, prepared, on one
+connection, and prints the milliseconds per lookup and the rows found.
+bench/generate.py makes at most 10^5 products (at 10^7 orders); import a
+bigger catalog through /products/import to check a million SKUs.
+"""
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import statements  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+from web import like_prefix  # noqa: E402
+from web import PAGE_SIZE  # noqa: E402
+
+
+def sample_terms(conn):
+    """A short prefix, a word and a SKU from the catalog."""
+
+    name, sku = conn.execute(
+        "SELECT name, SKU FROM product ORDER BY SKU LIMIT 1 OFFSET "
+        "(SELECT count(*) / 2 FROM product);"
+    ).fetchone()
+    return [name[:2], name.split()[0], sku]
+
+
+def run(conn, query, params, iterations):
+    """Milliseconds per call and rows returned."""
+
+    params = {**params, "after": None, "limit": PAGE_SIZE + 1}
+    with conn.cursor() as cur:
+        statements.execute(cur, query, params).fetchall()  # warm up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            rows = statements.execute(cur, query, params).fetchall()
+        return (time.perf_counter() - start) / iterations * 1e3, len(rows)
+
+
+def main(iterations=200, *terms):
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        count = conn.execute("SELECT count(*) FROM product;").fetchone()[0]
+        print(f"{count} products")
+        print(f"{'term':<24} {'prefix':>16} {'text':>16}")
+        for term in terms or sample_terms(conn):
+            prefix = run(
+                conn,
+                statements.PRODUCT_PREFIX_PAGE,
+                {"prefix": like_prefix(term)},
+                int(iterations),
+            )
+            text = run(conn, statements.PRODUCT_SEARCH_PAGE, {"q": term}, int(iterations))
+            print(
+                f"{term:<24}"
+                + "".join(f" {ms:>7.2f}ms ({rows:>3})" for ms, rows in (prefix, text))
+            )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+"""Fail when a statement of statements.py plans a sequential scan of a
+large table.
+
+usage: bench/query_plans.py [dsn]
+
+EXPLAINs every registered statement, and those analytics.py and
+exports.py build at run time, with sample keys taken from the database.
+Each gets two plans: a custom plan for those values, and the generic plan
+a prepared statement switches to after a few executions. Nothing is
+executed. Any Seq Scan of LARGE_TABLES is reported and makes the exit
+status 1, except for the hash joins of HASHED_TABLES. Statements on
+tables the database lacks (account) are skipped.
+
+Small tables are scanned whatever the indexes, so run it on a scaled
+dataset: bench/generate.py 1000000 or more.
+"""
+import re
+import sys
+from pathlib import Path
+
+import psycopg
+from psycopg import ClientCursor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import analytics  # noqa: E402
+import exports  # noqa: E402
+import statements  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+
+
+LARGE_TABLES = {
+    "customer", "orders", "contains", "pay", "process", "product",
+    "supplier", "delivery", "sales_daily", "cart_summary", "customer_spending",
+}  # fmt: skip
+# below this many orders (and their 10 000 products) the planner rightly
+# prefers scans.
+MIN_ORDERS = 1_000_000
+
+# tables a statement reads whole to hash them, on purpose: one read of
+# product and of customer costs less than a lookup per line sold, even for
+# a day of sales.
+HASHED_TABLES = {"export sales day": {"product", "customer"}}
+
+PLACEHOLDER = re.compile(r"%\((\w+)\)s")
+
+
+def sample_params(conn):
+    """A value for every parameter name used by statements.py."""
+
+    cust_no, order_no, sku, product_name, cust_name = conn.execute(
+        "SELECT o.cust_no, o.order_no, c.SKU, p.name, cust.name "
+        "FROM contains c JOIN orders o USING (order_no) "
+        "JOIN product p ON p.SKU = c.SKU "
+        "JOIN customer cust ON cust.cust_no = o.cust_no LIMIT 1;"
+    ).fetchone()
+    tin = conn.execute("SELECT TIN FROM supplier LIMIT 1;").fetchone()[0]
+    return {
+        "after": None,
+        "limit": 51,
+        "name": "product",
+        "cust_no": cust_no,
+        "cust_nos": [cust_no],
+        "cust_name": cust_name,
+        "order_no": order_no,
+        "product_sku": sku,
+        "sku": sku,
+        "skus": [sku],
+        "qtys": [1],
+        "tin": tin,
+        # what a user would type: a search for one product and the start
+        # of a name. A word every row has makes any plan a scan.
+        "q": product_name,
+        "year": 2022,
+        "prefix": cust_name.lower() + "%",
+        "phone_prefix": "91%",
+        "email": "plan@example.com",
+        "phone": "910000000",
+        "address": "Rua 1, 1000-001 Lisboa",
+        "description": "plan",
+        "price": 1,
+        "ean": None,
+        "balance": 1,
+        "account_number": "A-1",
+    }
+
+
+def built_statements(conn, params):
+    """(label, query, params) for the statements built at run time.
+
+    A whole export, or a breakdown of every sale, reads its tables whole
+    by design; these are the ones a client narrows to a product or a day.
+    """
+
+    day = {"date_from": "2022-03-01", "date_to": "2022-03-01"}
+    built = [
+        ("analytics by=city,year", *analytics.build_sales_query(["city", "year"])),
+        (
+            "analytics by=city,month sku",
+            *analytics.build_sales_query(
+                ["city", "month"], filters={"sku": params["sku"], "year": 2022}
+            ),
+        ),
+        (
+            "analytics by=day_of_week sku",
+            *analytics.build_sales_query(
+                ["day_of_week"], "cube", filters={"sku": params["sku"]}
+            ),
+        ),
+        ("export orders day", exports.build_select("orders", **day), {}),
+        ("export sales day", exports.build_select("sales", **day), {}),
+    ]
+    return [(label, query.as_string(conn), values) for label, query, values in built]
+
+
+def seq_scans(plan):
+    """Large tables read by a Seq Scan anywhere in an EXPLAIN (FORMAT JSON) plan."""
+
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in LARGE_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found += seq_scans(child)
+    return found
+
+
+def custom_plan(cur, query, params):
+    cur.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+    return cur.fetchone()[0][0]["Plan"]
+
+
+def generic_plan(cur, query, params):
+    """The plan of `query` prepared with $n parameters, forced generic."""
+
+    names = list(dict.fromkeys(PLACEHOLDER.findall(query)))
+    prepared = PLACEHOLDER.sub(
+        lambda match: f"${names.index(match.group(1)) + 1}", query
+    ).replace("%%", "%")
+    # without parameters the query is sent as it is, % included.
+    cur.execute(f"PREPARE plan_check AS {prepared}")
+    cur.execute("SET LOCAL plan_cache_mode = force_generic_plan;")
+    arguments = ", ".join(["%s"] * len(names))
+    execute = f"EXECUTE plan_check({arguments})" if names else "EXECUTE plan_check"
+    cur.execute(f"EXPLAIN (FORMAT JSON) {execute}", [params[name] for name in names])
+    return cur.fetchone()[0][0]["Plan"]
+
+
+def check(conn, params):
+    """(statement name, plan kind, tables) for every failing plan.
+
+    `conn` must be in autocommit mode: each EXPLAIN runs in a transaction
+    that is rolled back, but prepared statements outlive it.
+    """
+
+    checked = [(name, query, params) for query, name in statements.NAMES.items()]
+    checked += built_statements(conn, params)
+
+    failures = []
+    with ClientCursor(conn) as cur:
+        for name, query, values in checked:
+            for kind, explain in (("custom", custom_plan), ("generic", generic_plan)):
+                with conn.transaction(force_rollback=True):
+                    try:
+                        tables = seq_scans(explain(cur, query, values))
+                    except psycopg.errors.UndefinedTable as error:
+                        tables = None
+                        skipped = error.diag.message_primary
+                cur.execute("DEALLOCATE ALL;")
+                if tables is None:
+                    print(f"{name:<30} {kind:<8} skipped: {skipped}")
+                    break
+                hashed = [table for table in tables if table in HASHED_TABLES.get(name, ())]
+                tables = [table for table in tables if table not in hashed]
+                note = f" (hashes {', '.join(hashed)})" if hashed else ""
+                if tables:
+                    failures.append((name, kind, tables))
+                    print(f"{name:<30} {kind:<8} SEQ SCAN {', '.join(tables)}{note}")
+                else:
+                    print(f"{name:<30} {kind:<8} ok{note}")
+    return failures
+
+
+def main(dsn=DATABASE_URL):
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        orders = conn.execute("SELECT count(*) FROM orders;").fetchone()[0]
+        if orders < MIN_ORDERS:
+            print(f"warning: {orders} orders; plans are only meaningful from {MIN_ORDERS}.")
+        failures = check(conn, sample_params(conn))
+
+    if failures:
+        print(f"\n{len(failures)} plans scan a large table sequentially.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""Show which server each kind of request reads from.
+
+usage: bench/replica_routing.py replica_dsn
+
+Starts the app with APP_REPLICA_URL=replica_dsn (the primary's own DSN
+works as a stand-in: the two pools are still told apart) and drives it
+through the Flask test client: listings from a fresh client, a POST, the
+same listing right after it, and the listing from a client without the
+session of that POST. For each, prints the pool that served it.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def requests_num(source):
+    return source.get_stats().get("requests_num", 0)
+
+
+def served_by(app_module, call):
+    """Name of the pool `call` took its connection from."""
+
+    before = requests_num(app_module.pool), requests_num(app_module.read_pool)
+    call()
+    after = requests_num(app_module.pool), requests_num(app_module.read_pool)
+    if after[1] > before[1]:
+        return "replica"
+    if after[0] > before[0]:
+        return "primary"
+    return "none"
+
+
+def main(replica_dsn):
+    os.environ["APP_REPLICA_URL"] = replica_dsn
+    import app as app_module
+
+    client = app_module.app.test_client()
+    stamp = time.time_ns()
+
+    def register():
+        client.post(
+            "/customers/register",
+            data={
+                "name": f"Replica {stamp}",
+                "email": f"replica-{stamp}@example.com",
+                "phone": "910000000",
+                "address": "Rua da Replica 1, 1000-001 Lisboa",
+            },
+        )
+
+    steps = {
+        "GET /products": lambda: client.get("/products"),
+        "GET /analytics/sales": lambda: client.get("/analytics/sales?by=city"),
+        "POST /customers/register": register,
+        "GET /customers after POST": lambda: client.get("/customers"),
+        # a client without the session cookie of the POST.
+        "GET /customers, new client": (
+            lambda: app_module.app.test_client().get("/customers")
+        ),
+    }
+    print(f"replica lag {app_module.replica_lag.seconds():.3f}s")
+    for name, call in steps.items():
+        print(f"{name:<28} {served_by(app_module, call):>8}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
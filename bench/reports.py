@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+"""Time the /reports queries against the ones they replace, and check the
+summary tables behind them.
+
+usage: bench/reports.py [verify]
+
+Runs the queries of E3-report.ipynb (2.1, top customers by paid order
+value, with >= ALL; 2.3, unpaid orders per month of 2022) and the
+statements of /reports over customer_spending and unpaid_monthly, and
+prints the time of each. Then compares both summary tables with a full
+recomputation from pay, orders, contains and product, printing the rows
+that differ; the exit status is 1 if any does.
+
+With `verify` only the check runs, e.g. from cron after a bulk load.
+"""
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import statements  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+
+
+TOP_CUSTOMERS_ORIGINAL = """
+    SELECT cust_no, customer.name
+    FROM customer
+        JOIN pay USING (cust_no)
+        JOIN contains USING (order_no)
+        JOIN product USING (SKU)
+    GROUP BY cust_no
+    HAVING SUM(qty * price) >= ALL (
+        SELECT SUM(qty * price)
+        FROM customer
+            JOIN pay USING (cust_no)
+            JOIN contains USING (order_no)
+            JOIN product USING (SKU)
+        GROUP BY cust_no);
+    """
+UNPAID_ORDERS_ORIGINAL = """
+    SELECT EXTRACT(MONTH FROM date) AS month, COUNT(*) AS orders_not_payed
+    FROM orders
+    WHERE EXTRACT(YEAR FROM date) = 2022
+        AND order_no NOT IN (SELECT order_no FROM pay)
+    GROUP BY EXTRACT(MONTH FROM date);
+    """
+ITERATIONS = 5
+
+# (summary, recomputation): rows present in one and not in the other are
+# reported. Rows a customer deletion left at zero do not count.
+CHECKS = {
+    "customer_spending": (
+        """
+        SELECT cust_no, paid_orders, paid_total
+        FROM customer_spending
+        WHERE paid_orders > 0
+        """,
+        """
+        SELECT pay.cust_no, COUNT(DISTINCT pay.order_no), COALESCE(SUM(p.price * c.qty), 0)
+        FROM pay
+            LEFT JOIN contains c ON c.order_no = pay.order_no
+            LEFT JOIN product p ON p.sku = c.sku
+        GROUP BY pay.cust_no
+        """,
+    ),
+    "unpaid_monthly": (
+        """
+        SELECT month, orders
+        FROM unpaid_monthly
+        WHERE orders > 0
+        """,
+        """
+        SELECT date_trunc('month', o.date)::date, COUNT(*)
+        FROM orders o
+        WHERE NOT EXISTS (SELECT 1 FROM pay WHERE pay.order_no = o.order_no)
+        GROUP BY date_trunc('month', o.date)::date
+        """,
+    ),
+}
+MAX_SHOWN = 10
+
+
+def timed(conn, query, params=None):
+    """Best time of ITERATIONS runs of `query`, in milliseconds."""
+
+    best = float("inf")
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def compare(conn):
+    """Print the differences of every summary table; True when there are none."""
+
+    ok = True
+    for table, (summary, full) in CHECKS.items():
+        rows = conn.execute(
+            f"""
+            (SELECT 'summary only' AS side, * FROM ({summary} EXCEPT {full}) AS d)
+            UNION ALL
+            (SELECT 'recomputed only', * FROM ({full} EXCEPT {summary}) AS d)
+            ORDER BY 2, 1;
+            """
+        ).fetchall()
+        print(f"{table:<18} {'ok' if not rows else f'{len(rows)} rows differ'}")
+        for row in rows[:MAX_SHOWN]:
+            print(f"    {row[0]:<16} {row[1:]}")
+        ok = ok and not rows
+    return ok
+
+
+def main(mode=None):
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        if mode != "verify":
+            for name, query, params in (
+                ("top customers, >= ALL", TOP_CUSTOMERS_ORIGINAL, None),
+                ("top customers, summary", statements.REPORT_TOP_CUSTOMERS, {"limit": 10}),
+                ("unpaid 2022, NOT IN", UNPAID_ORDERS_ORIGINAL, None),
+                ("unpaid 2022, summary", statements.REPORT_UNPAID_ORDERS, {"year": 2022}),
+            ):
+                print(f"{name:<24} {timed(conn, query, params):>10.2f} ms")
+            print()
+        if not compare(conn):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
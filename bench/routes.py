@@ -0,0 +1,352 @@
+#!/usr/bin/python3
+"""Drive every route of app.py and report its latency and throughput.
+
+usage: bench/routes.py [iterations] [output.json] [baseline.json]
+
+Requests go through the Flask test client, one after the other, against
+whatever the database holds (see bench/generate.py). Each route gets a
+warm-up request and then `iterations` timed ones; p50 and p99 latency and
+requests per second are printed and saved to `output.json`
+(bench_output.json by default) with the scale of the data they ran on.
+Given the output of an earlier run as `baseline.json`, the p50 of each
+route is compared with it.
+
+Write routes work on rows of their own, so a run can be repeated on the
+same database. Products and suppliers are registered, updated and deleted
+again by the routes themselves, in that order; the customers deleted, with
+an order and its payment each, are made before each request, outside the
+timing; whatever is left of the run's products and suppliers (e.g. those
+of the CSV import) is deleted at the end. The new orders, payments and
+registered customers stay. The /accounts routes run only where the
+database has an account table.
+"""
+import json
+import sys
+import time
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+
+import psycopg
+from psycopg.rows import namedtuple_row
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import statements  # noqa: E402
+from app import app  # noqa: E402
+from web import DATABASE_URL  # noqa: E402
+
+
+JSON = {"Accept": "application/json"}
+COUNTED_TABLES = ("customer", "orders", "contains", "product", "supplier")
+# rows of the uploaded CSV, and customers of a bulk deletion.
+IMPORT_ROWS = 100
+BULK_DELETE = 10
+
+
+def sample(conn):
+    """Keys of existing rows the routes are called with."""
+
+    with conn.cursor(row_factory=namedtuple_row) as cur:
+        order = cur.execute(
+            "SELECT order_no, cust_no FROM contains JOIN orders USING (order_no) "
+            "ORDER BY order_no LIMIT 1;"
+        ).fetchone()
+        customer = cur.execute(
+            "SELECT name FROM customer WHERE cust_no = %s;", (order.cust_no,)
+        ).fetchone()
+        skus = [
+            row.sku
+            for row in cur.execute("SELECT SKU FROM product ORDER BY SKU LIMIT 5;")
+        ]
+        counts = {
+            table: cur.execute(f"SELECT count(*) AS n FROM {table};").fetchone().n
+            for table in COUNTED_TABLES
+        }
+        account = None
+        if cur.execute("SELECT to_regclass('account') AS t;").fetchone().t:
+            account = cur.execute(
+                "SELECT account_number, balance FROM account "
+                "ORDER BY account_number LIMIT 1;"
+            ).fetchone()
+    return {
+        "order_no": order.order_no,
+        "cust_no": order.cust_no,
+        "cust_name": customer.name,
+        "skus": skus,
+        "counts": counts,
+        "account": account,
+        # keys of the rows this run makes: product SKUs and supplier TINs
+        # are "BENCH-<run>-...".
+        "run": time.time_ns() // 10**6 % 10**8,
+    }
+
+
+def new_customers(conn, s, count, i):
+    """Customers with a paid order each, to be deleted; their numbers."""
+
+    cust_nos = []
+    with conn.transaction(), conn.cursor() as cur:
+        for n in range(count):
+            stamp = f"{s['run']}-{i}-{n}"
+            cust_no = statements.execute(
+                cur,
+                statements.CUSTOMER_INSERT,
+                {
+                    "name": f"Bench {stamp}",
+                    "email": f"bench-delete-{stamp}@example.com",
+                    "phone": "910000000",
+                    "address": "Rua do Bench 1, 1000-001 Lisboa",
+                },
+            ).fetchone()[0]
+            order_no = statements.execute(
+                cur,
+                statements.ORDER_CREATE,
+                {"cust_no": cust_no, "skus": s["skus"], "qtys": [1] * len(s["skus"])},
+            ).fetchone()[0]
+            statements.execute(
+                cur, statements.PAYMENT_INSERT, {"order_no": order_no, "cust_no": cust_no}
+            )
+            cust_nos.append(cust_no)
+    return cust_nos
+
+
+def cleanup(conn, s):
+    """Delete the products and suppliers this run left behind."""
+
+    prefix = f"BENCH-{s['run']}-%"
+    with conn.transaction():
+        conn.execute("DELETE FROM delivery WHERE tin LIKE %s;", (prefix,))
+        conn.execute("DELETE FROM supplier WHERE tin LIKE %s;", (prefix,))
+        conn.execute("DELETE FROM product WHERE SKU LIKE %s;", (prefix,))
+
+
+def routes(s, conn):
+    """Route name -> function of (client, i) making the i-th request, or a
+    pair (setup, function) where setup(i) prepares that request untimed."""
+
+    shop = f"/{s['cust_no']}/{s['order_no']}"
+    lines = [{"sku": sku, "qty": 1} for sku in s["skus"]]
+    # the i-th product and supplier of the run.
+    key = f"BENCH-{s['run']}-{{}}".format
+    # to be deleted by the i-th request.
+    doomed = {}
+
+    def get(url, headers=None):
+        return lambda client, i: client.get(url, headers=headers)
+
+    def new_order(client, i):
+        return client.post(
+            "/order", json={"cust_no": s["cust_no"], "lines": lines}, headers=JSON
+        )
+
+    def pay_new_order(client, i):
+        order_no = new_order(client, i).get_json()["order_no"]
+        return client.post(f"/{s['cust_no']}/{order_no}/payed")
+
+    def register_customer(client, i):
+        stamp = f"{time.time_ns()}-{i}"
+        return client.post(
+            "/customers/register",
+            data={
+                "name": f"Bench {stamp}",
+                "email": f"bench-{stamp}@example.com",
+                "phone": "910000000",
+                "address": "Rua do Bench 1, 1000-001 Lisboa",
+            },
+        )
+
+    def register_product(client, i):
+        return client.post(
+            "/products/register",
+            data={
+                "name": f"Bench product {i}",
+                "sku": key(i),
+                # unique, and 13 digits for up to 10^7 iterations.
+                "ean": str(9 * 10**12 + s["run"] % 10**5 * 10**7 + i + 1),
+                "description": "Registered by bench/routes.py",
+                "price": "10",
+            },
+        )
+
+    def update_product(client, i):
+        return client.post(
+            f"/products/{key(i)}/update",
+            data={"price": "11", "description": "Updated by bench/routes.py"},
+        )
+
+    def register_supplier(client, i):
+        return client.post(
+            "/suppliers/register",
+            data={
+                "tin": key(i),
+                "name": f"Bench supplier {i}",
+                "address": "Rua do Bench 2, 1000-002 Lisboa",
+                "sku": key(i),
+            },
+        )
+
+    # upserts the same products every time.
+    upload = "sku,name,description,price\n" + "".join(
+        f"{key(f'import-{n}')},Bench import {n},Imported by bench/routes.py,{n}.50\n"
+        for n in range(IMPORT_ROWS)
+    )
+
+    def import_products(client, i):
+        return client.post(
+            "/products/import?format=csv",
+            data=upload,
+            headers={**JSON, "Content-Type": "text/csv"},
+        )
+
+    def prepare_deletion(count):
+        def setup(i):
+            doomed[i] = new_customers(conn, s, count, i)
+
+        return setup
+
+    def delete_customer(client, i):
+        return client.post(f"/customers/{doomed.pop(i)[0]}/delete")
+
+    def delete_customers(client, i):
+        return client.post(
+            "/customers/delete", json={"cust_nos": doomed.pop(i)}, headers=JSON
+        )
+
+    accounts = {}
+    if s["account"] is not None:
+        account = s["account"]
+
+        def new_account(i):
+            conn.execute(
+                "INSERT INTO account (account_number, branch_name, balance) "
+                "SELECT %s, branch_name, 0 FROM account LIMIT 1;",
+                (key(i)[-12:],),
+            )
+
+        accounts = {
+            "accounts": get("/accounts"),
+            # the balance it already has.
+            "accounts.update": lambda client, i: client.post(
+                f"/accounts/{account.account_number}/update",
+                data={"balance": str(account.balance)},
+            ),
+            "accounts.delete": (
+                new_account,
+                lambda client, i: client.post(f"/accounts/{key(i)[-12:]}/delete"),
+            ),
+        }
+
+    return {
+        "products": get("/products"),
+        "products.json": get("/products", JSON),
+        "shop": get(f"{shop}/shop"),
+        "products.search": get("/products/search?q=product", JSON),
+        "products.search.prefix": get("/products/search?q=prod&mode=prefix", JSON),
+        "customers": get("/customers"),
+        "customers.json": get("/customers", JSON),
+        "suppliers": get("/suppliers"),
+        "suppliers.json": get("/suppliers", JSON),
+        "customers.lookup": get(f"/customers/lookup?q={s['cust_name'][:6]}"),
+        "order_customer": lambda client, i: client.post(
+            "/order_customer", data={"name": s["cust_name"]}
+        ),
+        "order": new_order,
+        "add_to_cart": lambda client, i: client.post(f"{shop}/{s['skus'][0]}"),
+        "cart": get(f"{shop}/cart"),
+        "cart.post": lambda client, i: client.post(f"{shop}/cart", json=lines),
+        "checkout": get(f"{shop}/checkout"),
+        "order+payed": pay_new_order,
+        "customers.register": register_customer,
+        "customers.delete": (prepare_deletion(1), delete_customer),
+        "customers.delete.json": (prepare_deletion(BULK_DELETE), delete_customers),
+        # each product and supplier of the run goes through all of these.
+        "products.register": register_product,
+        "products.update": update_product,
+        "suppliers.register": register_supplier,
+        "suppliers.delete": lambda client, i: client.post(f"/suppliers/{key(i)}/delete"),
+        "products.delete": lambda client, i: client.post(f"/products/{key(i)}/delete"),
+        "products.import": import_products,
+        **accounts,
+        "analytics": get("/analytics/sales?by=city,year"),
+        "reports.top_customers": get("/reports/top-customers"),
+        "reports.unpaid_orders": get("/reports/unpaid-orders?year=2022"),
+        "export": get("/export/products.csv"),
+        "cache.stats": get("/cache/stats"),
+        "statements.stats": get("/statements/stats"),
+        "metrics": get("/metrics"),
+        "ping": get("/ping"),
+    }
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def measure(client, route, iterations):
+    """Latency percentiles (ms), throughput and status of one route."""
+
+    setup, call = route if isinstance(route, tuple) else (None, route)
+    if setup is not None:
+        setup(-1)
+    response = call(client, -1)  # warm up: caches, prepared statements
+    response.get_data()
+    response.close()  # gives back the admission slot of a streamed response
+    seconds = []
+    for i in range(iterations):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        response = call(client, i)
+        response.get_data()  # streamed responses are timed to the last byte
+        response.close()
+        seconds.append(time.perf_counter() - start)
+    seconds.sort()
+    return {
+        "p50_ms": round(percentile(seconds, 0.50) * 1e3, 3),
+        "p99_ms": round(percentile(seconds, 0.99) * 1e3, 3),
+        "rps": round(iterations / sum(seconds), 1),
+        "status": response.status_code,
+    }
+
+
+def main(iterations=200, output="bench_output.json", baseline=None):
+    iterations = int(iterations)
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        s = sample(conn)
+        if s["account"] is None:
+            print("no account table: the /accounts routes are skipped.\n")
+
+        client = app.test_client()
+        results = {}
+        print(f"{'route':<22} {'p50':>10} {'p99':>10} {'req/s':>9} status")
+        try:
+            for name, route in routes(s, conn).items():
+                results[name] = result = measure(client, route, iterations)
+                print(
+                    f"{name:<22} {result['p50_ms']:>8.2f}ms {result['p99_ms']:>8.2f}ms"
+                    f" {result['rps']:>9.1f} {result['status']}"
+                )
+        finally:
+            cleanup(conn, s)
+
+    run = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "iterations": iterations,
+        "counts": s["counts"],
+        "routes": results,
+    }
+    Path(output).write_text(json.dumps(run, indent=2) + "\n")
+
+    if baseline is not None:
+        before = json.loads(Path(baseline).read_text())
+        print(f"\np50 against {baseline} ({before['counts']})")
+        for name, result in results.items():
+            if name in before["routes"]:
+                ratio = result["p50_ms"] / max(before["routes"][name]["p50_ms"], 1e-6)
+                print(f"{name:<22} {ratio:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:4])
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+"""Fire many parallel set_customer requests and count id collisions.
+
+usage: bench/set_customer_concurrency.py [requests] [threads] [customer name]
+
+The default customer is one of bench/generate.py. Every request must come
+back as a redirect to a distinct new order; any error or repeated
+order_no is reported and makes the script exit with 1.
+
+More threads than admission slots plus APP_ADMISSION_QUEUE get requests
+shed with 503: those are counted apart and sent again after their
+Retry-After, at most MAX_ATTEMPTS times, as a client would. A request
+still shed then is a failure.
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import app  # noqa: E402
+
+
+MAX_ATTEMPTS = 5
+
+
+def new_order(cust_name):
+    """(order_no or None, number of 503s before the answer)."""
+
+    client = app.test_client()
+    for shed in range(MAX_ATTEMPTS):
+        response = client.post("/order_customer", data={"name": cust_name})
+        if response.status_code != 503:
+            break
+        time.sleep(float(response.headers.get("Retry-After", 1)))
+    else:
+        return None, MAX_ATTEMPTS
+    if response.status_code != 302:
+        return None, shed
+    # /<cust_no>/<order_no>/shop
+    return int(response.headers["Location"].split("/")[-2]), shed
+
+
+def main(requests=500, threads=32, cust_name="Customer 1"):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(new_order, [cust_name] * requests))
+    elapsed = time.perf_counter() - start
+
+    order_nos = [order_no for order_no, _ in results]
+    shed = sum(count for _, count in results)
+    failed = order_nos.count(None)
+    created = [order_no for order_no in order_nos if order_no is not None]
+    collisions = len(created) - len(set(created))
+    print(
+        f"{requests} requests on {threads} threads in {elapsed:.2f}s "
+        f"({requests / elapsed:.0f} req/s): "
+        f"{failed} failed, {collisions} collisions, {shed} shed and retried"
+    )
+    return failed == 0 and collisions == 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    ok = main(*(int(arg) for arg in args[:2]), *args[2:3])
+    sys.exit(0 if ok else 1)
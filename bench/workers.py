@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+"""Throughput of serve.py with 1, 2, 4, ... up to N worker processes.
+
+usage: bench/workers.py [max_workers] [clients] [seconds] [path]
+
+For each worker count starts serve.py on a free local port, waits for it
+to answer /ping, then has `clients` client processes (32 by default) GET
+`path` (/products) back to back for `seconds` (10) and prints requests per
+second, p50/p99 latency and how many requests were refused with 503.
+max_workers defaults to the CPU count. The clients run in their own
+processes so they are not what saturates first, but they share the
+machine with the server: on a small one, fewer clients than cores are left
+for it.
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVE = [sys.executable, str(ROOT / "serve.py")]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(base, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"{base}/ping", timeout=1) as response:
+                response.read()
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def client(url, seconds):
+    """Latencies of the requests one client got an answer to in `seconds`,
+    and how many it was refused (503 from admission control)."""
+
+    latencies = []
+    refused = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                response.read()
+        except urllib.error.HTTPError as error:
+            if error.code != 503:
+                raise
+            refused += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    return latencies, refused
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(workers, clients, seconds, path):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [*SERVE, str(workers), f"127.0.0.1:{port}"], cwd=ROOT, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(base)
+        with ProcessPoolExecutor(clients) as executor:
+            runs = list(executor.map(client, [base + path] * clients, [seconds] * clients))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    latencies = sorted(latency for run, _ in runs for latency in run)
+    return {
+        "rps": len(latencies) / seconds,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+        "refused": sum(refused for _, refused in runs),
+    }
+
+
+def main(max_workers=os.cpu_count() or 1, clients=32, seconds=10, path="/products"):
+    max_workers, clients, seconds = int(max_workers), int(clients), float(seconds)
+    counts = []
+    workers = 1
+    while workers < max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(max_workers)
+
+    print(
+        f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}"
+        f" {'speedup':>8} {'503s':>6}"
+    )
+    first = None
+    for workers in counts:
+        result = run(workers, clients, seconds, path)
+        first = first or result["rps"]
+        print(
+            f"{workers:>7} {result['rps']:>9.1f} {result['p50_ms']:>8.1f}"
+            f" {result['p99_ms']:>8.1f} {result['rps'] / first:>7.2f}x"
+            f" {result['refused']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:5])
@@ -0,0 +1,129 @@
+"""In-process cache of product catalog pages, shared by all requests.
+
+Entries are tagged with the `table_version` counter of the product table,
+which a trigger bumps on every write; the same class keeps the serialized
+JSON listings of app.listing_bodies. Writes made through this worker
+invalidate the cache straight away; writes made by other workers (or
+outside the app) are noticed the next time the version is checked, at most
+`max_staleness` seconds later.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def page_size(page):
+    """Rough number of bytes a cached page keeps alive."""
+    rows, next_after = page
+    size = sys.getsizeof(rows) + sys.getsizeof(next_after)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+def body_size(entry):
+    """Bytes kept alive by a serialized listing and its next key."""
+    body, next_after = entry
+    return sys.getsizeof(body) + sys.getsizeof(next_after)
+
+
+class CatalogCache:
+    """LRU of catalog pages bounded by an approximate memory budget."""
+
+    def __init__(self, version_source, max_bytes, max_staleness, sizeof=page_size):
+        self.version_source = version_source
+        self.max_bytes = max_bytes
+        self.max_staleness = max_staleness
+        self.sizeof = sizeof
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._checked_at = 0.0
+        # bumped on every invalidation, so that a page read from the
+        # database before a write cannot be stored after it.
+        self._generation = 0
+
+    def _clear(self):
+        self._pages.clear()
+        self._bytes = 0
+        self._generation += 1
+
+    def _sync(self):
+        """Drop every page if the table changed since the last check."""
+        now = time.monotonic()
+        if now - self._checked_at < self.max_staleness:
+            return
+        version = self.version_source()
+        with self._lock:
+            self._checked_at = now
+            if self._version is not None and version != self._version:
+                self.invalidations += 1
+                self._clear()
+            self._version = version
+
+    def version(self):
+        """The table version the cached entries belong to."""
+        self._sync()
+        with self._lock:
+            return self._version
+
+    def get(self, key):
+        """Return (page, generation); page is None on a miss."""
+        self._sync()
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None, self._generation
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page[1], self._generation
+
+    def put(self, key, page, generation):
+        """Store a page read while the cache was at `generation`."""
+        size = self.sizeof(page)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0]
+            self._pages[key] = (size, page)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._pages.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self):
+        """Forget every page; called after a local write to the catalog."""
+        with self._lock:
+            self.invalidations += 1
+            self._clear()
+            # the trigger moved the version too; re-read it on the next get
+            # without counting that as a second invalidation.
+            self._version = None
+            self._checked_at = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "entries": len(self._pages),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "version": self._version,
+            }
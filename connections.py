@@ -0,0 +1,146 @@
+"""How app.py gets its database connections, chosen by APP_POOL.
+
+- "pool" (the default): a ConnectionPool that starts connecting at import.
+- "lazy": the same pool, opened by the first request that needs a
+  connection, so importing the app costs no connection at all.
+- "direct": one connection opened on first use and kept for the life of
+  the process. This is what the CGI script uses: it serves a single request
+  and exits, so a pool's background workers and spare connections are pure
+  startup cost.
+
+The size of the pools comes from APP_POOL_MIN_SIZE and APP_POOL_MAX_SIZE,
+which serve.py sets in each worker process from its share of the server's
+connection budget.
+
+The three share the part of the ConnectionPool interface the app uses:
+getconn(), putconn(), connection() and get_stats().
+
+Read-only routes may read from a replica instead, through a second source
+made the same way; ReplicaLag tells when it has fallen too far behind.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg
+from psycopg_pool import ConnectionPool
+
+import statements
+
+
+MODES = ("pool", "lazy", "direct")
+# ConnectionPool's own default: four connections, opened up front.
+POOL_MIN_SIZE = 4
+
+
+class LazyPool(ConnectionPool):
+    """A ConnectionPool that opens itself on the first getconn()."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, open=False, **kwargs)
+        self._open_lock = threading.Lock()
+
+    def getconn(self, timeout=None):
+        if self.closed:
+            with self._open_lock:
+                if self.closed:
+                    self.open(wait=False)
+        return super().getconn(timeout)
+
+
+class DirectConnection:
+    """A single connection behind the ConnectionPool interface.
+
+    Meant for one request per process: there is no queue, so two callers
+    holding the connection at the same time share its transaction.
+    """
+
+    def __init__(self, conninfo, kwargs=None):
+        self.conninfo = conninfo
+        self.kwargs = kwargs or {}
+        self.conn = None
+        self.connections_num = 0
+        self.requests_num = 0
+
+    def getconn(self, timeout=None):
+        self.requests_num += 1
+        if self.conn is None or self.conn.closed:
+            self.connections_num += 1
+            self.conn = psycopg.connect(self.conninfo, **self.kwargs)
+        return self.conn
+
+    def putconn(self, conn):
+        if not conn.closed and conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+            conn.rollback()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """As ConnectionPool.connection(): commit on success, else roll back."""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+            if not conn.closed:
+                conn.commit()
+        finally:
+            self.putconn(conn)
+
+    def get_stats(self):
+        open_ = int(self.conn is not None and not self.conn.closed)
+        return {
+            "pool_min": 0,
+            "pool_max": 1,
+            "pool_size": open_,
+            "requests_num": self.requests_num,
+            "connections_num": self.connections_num,
+        }
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def make_pool(conninfo, kwargs=None, mode=None):
+    """The connection source for `mode`, APP_POOL when not given."""
+
+    mode = mode or os.environ.get("APP_POOL", "pool")
+    if mode == "direct":
+        return DirectConnection(conninfo, kwargs)
+    min_size = int(os.environ.get("APP_POOL_MIN_SIZE", POOL_MIN_SIZE))
+    max_size = max(min_size, int(os.environ.get("APP_POOL_MAX_SIZE", min_size)))
+    sizes = {"min_size": min_size, "max_size": max_size}
+    if mode == "lazy":
+        return LazyPool(conninfo=conninfo, kwargs=kwargs, **sizes)
+    if mode == "pool":
+        return ConnectionPool(conninfo=conninfo, kwargs=kwargs, **sizes)
+    raise ValueError(f"Unknown APP_POOL {mode!r}, expected one of {MODES}.")
+
+
+class ReplicaLag:
+    """Replication delay of the server behind `pool`, in seconds.
+
+    Measured at most every `interval` seconds and shared by all requests;
+    a replica that cannot be reached counts as infinitely late.
+    """
+
+    def __init__(self, pool, interval):
+        self.pool = pool
+        self.interval = interval
+        self.lag = 0.0
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def seconds(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.checked_at is not None and now - self.checked_at < self.interval:
+                return self.lag
+            self.checked_at = now
+        try:
+            with self.pool.connection(timeout=self.interval) as conn:
+                with conn.cursor() as cur:
+                    lag = statements.execute(cur, statements.REPLICA_LAG).fetchone()[0]
+            self.lag = float(lag)
+        except psycopg.OperationalError:
+            self.lag = float("inf")
+        return self.lag
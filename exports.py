@@ -0,0 +1,148 @@
+"""CSV and JSONL exports streamed from COPY ... TO STDOUT.
+
+Each export is a base query plus the columns a client may select and,
+for order-based data, the date column a date range applies to. Rows go
+from the COPY stream to the HTTP response in CHUNK_SIZE pieces, so an
+export of any size runs in constant memory.
+"""
+from datetime import date
+
+from psycopg import sql
+
+
+CHUNK_SIZE = 64 * 1024
+
+EXPORTS = {
+    "products": {
+        "query": "SELECT SKU AS sku, name, description, price, ean FROM product",
+        "columns": ("sku", "name", "description", "price", "ean"),
+        "order_by": "sku",
+        "date": None,
+    },
+    "customers": {
+        "query": "SELECT cust_no, name, email, phone, address FROM customer",
+        "columns": ("cust_no", "name", "email", "phone", "address"),
+        "order_by": "cust_no",
+        "date": None,
+    },
+    "orders": {
+        "query": "SELECT order_no, cust_no, date FROM orders",
+        "columns": ("order_no", "cust_no", "date"),
+        "order_by": "order_no",
+        "date": "date",
+    },
+    # the product_sales view of the E3 report, with the order date added
+    # so that the date range can be applied before the join, and the city
+    # as sales_daily has it: address_city() also takes an address with no
+    # comma, where SUBSTRING up to the comma raised.
+    "sales": {
+        "query": """
+            SELECT
+                c.sku,
+                o.order_no,
+                c.qty,
+                p.price * c.qty AS total_price,
+                EXTRACT(YEAR FROM o.date) AS year,
+                EXTRACT(MONTH FROM o.date) AS month,
+                EXTRACT(DAY FROM o.date) AS day_of_month,
+                EXTRACT(DOW FROM o.date) AS day_of_week,
+                address_city(cust.address) AS city,
+                o.date
+            FROM contains c
+                JOIN orders o ON c.order_no = o.order_no
+                JOIN product p ON c.sku = p.sku
+                JOIN customer cust ON o.cust_no = cust.cust_no
+            """,
+        "columns": (
+            "sku", "order_no", "qty", "total_price", "year", "month",
+            "day_of_month", "day_of_week", "city", "date",
+        ),
+        "order_by": "order_no",
+        "date": "date",
+    },
+}
+
+FORMATS = ("csv", "jsonl")
+
+
+class ExportError(ValueError):
+    """The export was asked for with arguments it does not support."""
+
+
+def build_copy(name, fmt, columns=None, date_from=None, date_to=None):
+    """Compose the COPY statement for an export.
+
+    `columns` is a list of column names, `date_from` and `date_to` are ISO
+    dates (inclusive); everything is checked against EXPORTS before it
+    reaches the SQL text.
+    """
+
+    if fmt not in FORMATS:
+        raise ExportError("Format must be csv or jsonl.")
+    query = build_select(name, columns, date_from, date_to)
+
+    if fmt == "csv":
+        return sql.SQL("COPY ({}) TO STDOUT (FORMAT csv, HEADER)").format(query)
+    # one JSON object per line: row_to_json never emits raw newlines, and
+    # with control characters as quote and delimiter the csv format leaves
+    # every value untouched.
+    return sql.SQL(
+        "COPY (SELECT row_to_json(export) FROM ({}) AS export) "
+        "TO STDOUT (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+    ).format(query)
+
+
+def build_select(name, columns=None, date_from=None, date_to=None):
+    """The query an export copies, with the arguments of build_copy."""
+
+    export = EXPORTS.get(name)
+    if export is None:
+        raise ExportError(f"Unknown export {name!r}.")
+
+    columns = columns or export["columns"]
+    unknown = [column for column in columns if column not in export["columns"]]
+    if unknown:
+        raise ExportError(f"Unknown columns: {', '.join(unknown)}.")
+
+    conditions = []
+    for bound, operator in ((date_from, ">="), (date_to, "<=")):
+        if not bound:
+            continue
+        if export["date"] is None:
+            raise ExportError(f"The {name} export has no date to filter on.")
+        try:
+            bound = date.fromisoformat(bound)
+        except ValueError:
+            raise ExportError(f"{bound!r} is not an ISO date.") from None
+        conditions.append(
+            sql.SQL("{} {} {}").format(
+                sql.Identifier(export["date"]), sql.SQL(operator), sql.Literal(bound)
+            )
+        )
+
+    return sql.SQL("SELECT {columns} FROM ({base}) AS export {where} ORDER BY {order}").format(
+        columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+        base=sql.SQL(export["query"]),
+        where=sql.SQL("WHERE ") + sql.SQL(" AND ").join(conditions) if conditions else sql.SQL(""),
+        order=sql.Identifier(export["order_by"]),
+    )
+
+
+def copy_chunks(pool, statement):
+    """Yield the output of a COPY TO STDOUT in CHUNK_SIZE pieces.
+
+    The pooled connection is taken when the first chunk is asked for and
+    given back as soon as the copy ends or the client goes away.
+    """
+
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            with cur.copy(statement) as copy:
+                buffer = bytearray()
+                for data in copy:
+                    buffer += data
+                    if len(buffer) >= CHUNK_SIZE:
+                        yield bytes(buffer)
+                        buffer.clear()
+                if buffer:
+                    yield bytes(buffer)
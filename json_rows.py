@@ -0,0 +1,53 @@
+"""Serialization of listing rows for the JSON responses.
+
+Listings are fetched as plain tuples instead of namedtuples, with NUMERIC
+columns loaded as the text Postgres sent rather than as Decimal, since the
+JSON carries them as strings anyway. The encoder is built once, writes
+compact separators and keeps the output of Flask's encoder otherwise:
+one array per row, numbers as strings, dates as HTTP dates.
+
+With the "columns" layout a page is an object holding one array per
+column instead, so the column names are not repeated on every row.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+from psycopg.rows import tuple_row
+from psycopg.types.string import TextLoader
+from werkzeug.http import http_date
+
+
+LAYOUTS = ("rows", "columns")
+
+
+def default(value):
+    """Values the json module cannot encode by itself, as Flask does."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return http_date(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=default)
+dumps = encoder.encode
+
+
+def prepare(cur):
+    """Fetch tuples, and NUMERIC values as text, on `cur`."""
+    cur.row_factory = tuple_row
+    cur.adapters.register_loader("numeric", TextLoader)
+    return cur
+
+
+def column_names(cur):
+    return [column.name for column in cur.description]
+
+
+def page_json(names, rows, layout="rows"):
+    """A list of rows in the given layout, serialized."""
+    if layout == "columns":
+        columns = zip(*rows) if rows else ([] for _ in names)
+        return dumps(dict(zip(names, map(list, columns))))
+    return dumps(rows)
@@ -0,0 +1,212 @@
+"""In-process metrics, exposed in the Prometheus text format on /metrics.
+
+Histograms and counters keep one small list of numbers per label set and
+take a lock only to update it, so observing costs a few microseconds.
+Query timings are collected by TimedCursor, which the connection pool
+installs as the cursor factory of every connection it opens.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+import psycopg
+
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    """Cumulative histogram of observations, one per label set."""
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # one count per bucket plus +Inf, then the sum.
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def totals(self):
+        """Count and sum of the observations, per label set."""
+        with self._lock:
+            return {
+                labels: (sum(values[:-1]), values[-1])
+                for labels, values in self._series.items()
+            }
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), values):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{format_labels(self.labels, labels, [('le', bound)])} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one per label set."""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def totals(self):
+        """Value of the counter, per label set."""
+        with self._lock:
+            return dict(self._series)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            series = dict(self._series)
+        for labels, value in sorted(series.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+def gauge(name, documentation, value, kind="gauge"):
+    """Lines for a single unlabelled value read at scrape time."""
+    return [
+        f"# HELP {name} {documentation}",
+        f"# TYPE {name} {kind}",
+        f"{name} {value}",
+    ]
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, by route.",
+    ("route", "method", "status"),
+)
+REQUESTS_SHED = Counter(
+    "http_requests_shed_total",
+    "Requests answered 503 by admission control, by route and reason.",
+    ("route", "reason"),
+)
+QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing a statement, by statement.",
+    ("statement",),
+)
+QUERY_ROWS = Counter(
+    "db_query_rows_total",
+    "Rows returned or affected, by statement.",
+    ("statement",),
+)
+
+WHITESPACE = re.compile(r"\s+")
+STATEMENT_LABEL_LENGTH = 80
+# statement text -> name, filled in by statements.py.
+STATEMENT_NAMES = {}
+
+
+def statement_label(query, context):
+    """A short, stable label for a statement: its name in statements.py,
+    or else its first characters."""
+    if isinstance(query, str) and query in STATEMENT_NAMES:
+        return STATEMENT_NAMES[query]
+    if not isinstance(query, (str, bytes)):
+        query = query.as_string(context)
+    if isinstance(query, bytes):
+        query = query.decode()
+    return WHITESPACE.sub(" ", query).strip()[:STATEMENT_LABEL_LENGTH]
+
+
+class TimedCursor(psycopg.Cursor):
+    """Cursor recording the duration and row count of each execute().
+
+    In pipeline mode execute() only queues the statement: what is recorded
+    is the time to queue it, and no row count.
+    """
+
+    def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            record_query(query, self, time.perf_counter() - start)
+
+
+class AsyncTimedCursor(psycopg.AsyncCursor):
+    """TimedCursor for an AsyncConnection."""
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            record_query(query, self, time.perf_counter() - start)
+
+
+def record_query(query, cur, seconds):
+    label = (statement_label(query, cur),)
+    QUERY_SECONDS.observe(seconds, label)
+    if cur.rowcount > 0:
+        QUERY_ROWS.inc(cur.rowcount, label)
+
+
+def pool_lines(pool, prefix="db"):
+    """Gauges and counters from ConnectionPool.get_stats()."""
+    stats = pool.get_stats()
+    lines = []
+    for key, kind, documentation in (
+        ("pool_min", "gauge", "Minimum number of connections in the pool."),
+        ("pool_max", "gauge", "Maximum number of connections in the pool."),
+        ("pool_size", "gauge", "Connections currently managed by the pool."),
+        ("pool_available", "gauge", "Connections idle in the pool."),
+        ("requests_waiting", "gauge", "Clients waiting for a connection."),
+        ("requests_num", "counter", "Connections requested from the pool."),
+        ("requests_queued", "counter", "Requests that had to wait for a connection."),
+        ("requests_wait_ms", "counter", "Milliseconds spent waiting for a connection."),
+        ("requests_errors", "counter", "Requests that timed out waiting for a connection."),
+        ("connections_num", "counter", "Connection attempts to the server."),
+        ("connections_errors", "counter", "Failed connection attempts."),
+        ("connections_lost", "counter", "Connections found broken by the pool."),
+    ):
+        lines += gauge(f"{prefix}_{key}", documentation, stats.get(key, 0), kind)
+    return lines
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""Apply the SQL files in migrations/ that the database has not seen yet.
+
+The base schema is the one loaded by E3-report.ipynb; each migration is
+applied once, in file name order, inside its own transaction.
+"""
+import sys
+from pathlib import Path
+
+import psycopg
+
+from web import DATABASE_URL
+
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
+def migrate(conninfo=DATABASE_URL):
+    """Apply every pending migration, returning the versions applied."""
+
+    applied_now = []
+    with psycopg.connect(conninfo) as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations(
+            version VARCHAR(200) PRIMARY KEY,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+            );
+            """
+        )
+        conn.commit()
+        applied = {
+            row[0] for row in conn.execute("SELECT version FROM schema_migrations;")
+        }
+
+        for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            if path.stem in applied:
+                continue
+            # without parameters psycopg sends the whole file in one go.
+            conn.execute(path.read_text())
+            conn.execute(
+                "INSERT INTO schema_migrations (version) VALUES (%(version)s);",
+                {"version": path.stem},
+            )
+            conn.commit()
+            applied_now.append(path.stem)
+    return applied_now
+
+
+if __name__ == "__main__":
+    for version in migrate(*sys.argv[1:]):
+        print(f"applied {version}")
@@ -0,0 +1,2 @@
+-- keyset pagination of the catalog seeks on (name, SKU), the listing order.
+CREATE INDEX IF NOT EXISTS product_name_sku_idx ON product (name, SKU);
@@ -0,0 +1,23 @@
+-- a change counter per table, bumped by every write statement, so that
+-- workers can tell when their cached copy of a table has gone stale.
+CREATE TABLE IF NOT EXISTS table_version(
+name VARCHAR(63) PRIMARY KEY,
+version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO table_version (name) VALUES ('product') ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    UPDATE table_version
+    SET version = version + 1
+    WHERE name = TG_TABLE_NAME;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_product_version ON product;
+CREATE TRIGGER bump_product_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON product
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version_func();
@@ -0,0 +1,19 @@
+-- customer and order numbers come from sequences instead of MAX() + 1,
+-- so that concurrent inserts never collide and need no extra round trip.
+CREATE SEQUENCE IF NOT EXISTS customer_cust_no_seq OWNED BY customer.cust_no;
+SELECT setval(
+    'customer_cust_no_seq',
+    COALESCE((SELECT MAX(cust_no) FROM customer), 0) + 1,
+    false
+);
+ALTER TABLE customer
+ALTER COLUMN cust_no SET DEFAULT nextval('customer_cust_no_seq');
+
+CREATE SEQUENCE IF NOT EXISTS orders_order_no_seq OWNED BY orders.order_no;
+SELECT setval(
+    'orders_order_no_seq',
+    COALESCE((SELECT MAX(order_no) FROM orders), 0) + 1,
+    false
+);
+ALTER TABLE orders
+ALTER COLUMN order_no SET DEFAULT nextval('orders_order_no_seq');
@@ -0,0 +1,112 @@
+-- pre-aggregated product_sales: quantity and value sold per product, city
+-- and day. Triggers keep it in step with contains, product prices and
+-- customer addresses, so analytics never re-join the order tables.
+CREATE TABLE IF NOT EXISTS sales_daily(
+sku VARCHAR(25) NOT NULL,
+city VARCHAR(255) NOT NULL,
+date DATE NOT NULL,
+qty BIGINT NOT NULL,
+total_price NUMERIC(16, 2) NOT NULL,
+PRIMARY KEY (sku, city, date)
+);
+
+-- same as the product_sales view, without failing on addresses with no comma.
+CREATE OR REPLACE FUNCTION address_city(address VARCHAR) RETURNS VARCHAR AS
+$$
+    SELECT COALESCE(split_part(address, ',', 1), '');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION sales_daily_add(
+    line_order_no INTEGER, line_sku VARCHAR, line_qty BIGINT
+) RETURNS VOID AS
+$$
+BEGIN
+    INSERT INTO sales_daily (sku, city, date, qty, total_price)
+    SELECT line_sku, address_city(cust.address), o.date, line_qty, p.price * line_qty
+    FROM orders o
+        JOIN customer cust ON o.cust_no = cust.cust_no
+        JOIN product p ON p.sku = line_sku
+    WHERE o.order_no = line_order_no
+    ON CONFLICT (sku, city, date) DO UPDATE
+    SET qty = sales_daily.qty + EXCLUDED.qty,
+        total_price = sales_daily.total_price + EXCLUDED.total_price;
+
+    DELETE FROM sales_daily
+    WHERE sku = line_sku AND qty = 0;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sales_daily_contains_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.qty IS NOT NULL THEN
+        PERFORM sales_daily_add(OLD.order_no, OLD.sku, -OLD.qty);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.qty IS NOT NULL THEN
+        PERFORM sales_daily_add(NEW.order_no, NEW.sku, NEW.qty);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sales_daily_contains ON contains;
+CREATE TRIGGER sales_daily_contains
+AFTER INSERT OR UPDATE OR DELETE ON contains
+FOR EACH ROW EXECUTE FUNCTION sales_daily_contains_func();
+
+-- the value of past sales follows the current price, as in the view.
+CREATE OR REPLACE FUNCTION sales_daily_price_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    UPDATE sales_daily
+    SET total_price = qty * NEW.price
+    WHERE sku = NEW.sku;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sales_daily_price ON product;
+CREATE TRIGGER sales_daily_price
+AFTER UPDATE OF price ON product
+FOR EACH ROW WHEN (OLD.price IS DISTINCT FROM NEW.price)
+EXECUTE FUNCTION sales_daily_price_func();
+
+-- a customer who moves takes their past sales to the new city.
+CREATE OR REPLACE FUNCTION sales_daily_address_func() RETURNS TRIGGER AS
+$$
+DECLARE
+    line RECORD;
+BEGIN
+    FOR line IN
+        SELECT c.order_no, c.sku, c.qty, o.date
+        FROM contains c
+            JOIN orders o ON c.order_no = o.order_no
+        WHERE o.cust_no = NEW.cust_no AND c.qty IS NOT NULL
+    LOOP
+        UPDATE sales_daily
+        SET qty = qty - line.qty,
+            total_price = total_price - (SELECT price FROM product WHERE sku = line.sku) * line.qty
+        WHERE sku = line.sku AND city = address_city(OLD.address) AND date = line.date;
+        PERFORM sales_daily_add(line.order_no, line.sku, line.qty);
+    END LOOP;
+    DELETE FROM sales_daily
+    WHERE city = address_city(OLD.address) AND qty = 0;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sales_daily_address ON customer;
+CREATE TRIGGER sales_daily_address
+AFTER UPDATE OF address ON customer
+FOR EACH ROW WHEN (address_city(OLD.address) IS DISTINCT FROM address_city(NEW.address))
+EXECUTE FUNCTION sales_daily_address_func();
+
+TRUNCATE sales_daily;
+INSERT INTO sales_daily (sku, city, date, qty, total_price)
+SELECT c.sku, address_city(cust.address), o.date, SUM(c.qty), SUM(p.price * c.qty)
+FROM contains c
+    JOIN orders o ON c.order_no = o.order_no
+    JOIN product p ON c.sku = p.sku
+    JOIN customer cust ON o.cust_no = cust.cust_no
+WHERE c.qty IS NOT NULL
+GROUP BY c.sku, address_city(cust.address), o.date;
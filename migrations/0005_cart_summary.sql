@@ -0,0 +1,80 @@
+-- per-order cart totals: number of lines, items and value at current prices.
+-- Triggers keep it in step with contains and product prices, so checkout
+-- reads the total of a cart by key instead of summing its lines.
+CREATE TABLE IF NOT EXISTS cart_summary(
+order_no INTEGER PRIMARY KEY,
+lines INTEGER NOT NULL,
+items BIGINT NOT NULL,
+total NUMERIC(16, 2) NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION cart_summary_add(
+    line_order_no INTEGER, line_sku VARCHAR, line_count INTEGER, line_qty BIGINT
+) RETURNS VOID AS
+$$
+BEGIN
+    INSERT INTO cart_summary (order_no, lines, items, total)
+    SELECT line_order_no, line_count, line_qty, p.price * line_qty
+    FROM product p
+    WHERE p.sku = line_sku
+    ON CONFLICT (order_no) DO UPDATE
+    SET lines = cart_summary.lines + EXCLUDED.lines,
+        items = cart_summary.items + EXCLUDED.items,
+        total = cart_summary.total + EXCLUDED.total;
+
+    IF line_count < 0 THEN
+        DELETE FROM cart_summary
+        WHERE order_no = line_order_no AND lines = 0;
+    END IF;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cart_summary_contains_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    -- add_to_cart bumps the quantity of an existing line: one delta.
+    IF TG_OP = 'UPDATE' AND OLD.order_no = NEW.order_no AND OLD.sku = NEW.sku THEN
+        PERFORM cart_summary_add(
+            NEW.order_no, NEW.sku, 0, COALESCE(NEW.qty, 0) - COALESCE(OLD.qty, 0)
+        );
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM cart_summary_add(OLD.order_no, OLD.sku, -1, -COALESCE(OLD.qty, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM cart_summary_add(NEW.order_no, NEW.sku, 1, COALESCE(NEW.qty, 0));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cart_summary_contains ON contains;
+CREATE TRIGGER cart_summary_contains
+AFTER INSERT OR UPDATE OR DELETE ON contains
+FOR EACH ROW EXECUTE FUNCTION cart_summary_contains_func();
+
+-- carts are valued at the current price, as checkout always did.
+CREATE OR REPLACE FUNCTION cart_summary_price_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    UPDATE cart_summary s
+    SET total = s.total + (NEW.price - OLD.price) * c.qty
+    FROM contains c
+    WHERE c.sku = NEW.sku AND c.order_no = s.order_no AND c.qty IS NOT NULL;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cart_summary_price ON product;
+CREATE TRIGGER cart_summary_price
+AFTER UPDATE OF price ON product
+FOR EACH ROW WHEN (OLD.price IS DISTINCT FROM NEW.price)
+EXECUTE FUNCTION cart_summary_price_func();
+
+TRUNCATE cart_summary;
+INSERT INTO cart_summary (order_no, lines, items, total)
+SELECT c.order_no, COUNT(*), COALESCE(SUM(c.qty), 0), COALESCE(SUM(p.price * c.qty), 0)
+FROM contains c
+    JOIN product p ON c.sku = p.sku
+GROUP BY c.order_no;
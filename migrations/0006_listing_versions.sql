@@ -0,0 +1,29 @@
+-- change counters for every table with a JSON listing, and the time of the
+-- last change, so the listings can answer conditional requests (ETag and
+-- Last-Modified) without reading their rows.
+ALTER TABLE table_version
+ADD COLUMN IF NOT EXISTS changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now();
+
+INSERT INTO table_version (name)
+VALUES ('customer'), ('supplier')
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    UPDATE table_version
+    SET version = version + 1, changed_at = now()
+    WHERE name = TG_TABLE_NAME;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_customer_version ON customer;
+CREATE TRIGGER bump_customer_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON customer
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version_func();
+
+DROP TRIGGER IF EXISTS bump_supplier_version ON supplier;
+CREATE TRIGGER bump_supplier_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON supplier
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version_func();
@@ -0,0 +1,19 @@
+-- product search: typeahead on name prefixes and ranked full-text search
+-- over name, SKU, EAN and description.
+
+-- lower(name) in the "C" collation orders byte-wise, so a LIKE 'abc%' is a
+-- range scan of this index, in the (lower(name), SKU) order the results
+-- are paginated by.
+CREATE INDEX IF NOT EXISTS product_name_prefix_idx
+ON product ((lower(name) COLLATE "C"), (SKU COLLATE "C"));
+
+-- a generated column, so every insert and update (product_register,
+-- product_update, imports) keeps it current without any trigger.
+ALTER TABLE product
+ADD COLUMN IF NOT EXISTS search tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', SKU || ' ' || COALESCE(ean::text, '')), 'A')
+    || setweight(to_tsvector('english', name), 'A')
+    || setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS product_search_idx ON product USING GIN (search);
@@ -0,0 +1,11 @@
+-- customer lookup for order creation: by name (exact or prefix, case
+-- insensitive), email and phone. The "C" collation orders byte-wise, so
+-- a LIKE 'abc%' is a range scan of these indexes.
+CREATE INDEX IF NOT EXISTS customer_name_lookup_idx
+ON customer ((lower(name) COLLATE "C"), cust_no);
+
+CREATE INDEX IF NOT EXISTS customer_email_lookup_idx
+ON customer ((lower(email) COLLATE "C"));
+
+CREATE INDEX IF NOT EXISTS customer_phone_lookup_idx
+ON customer ((phone COLLATE "C"));
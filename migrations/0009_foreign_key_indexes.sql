@@ -0,0 +1,20 @@
+-- indexes on the referencing side of the foreign keys the app filters or
+-- joins on. contains.order_no and pay.order_no lead their primary keys
+-- and need none.
+
+-- customer deletion (CUSTOMERS_DELETE) and the sales_daily address trigger.
+CREATE INDEX IF NOT EXISTS orders_cust_no_idx ON orders (cust_no);
+
+-- CUSTOMERS_DELETE deletes the payments made by the customers too.
+CREATE INDEX IF NOT EXISTS pay_cust_no_idx ON pay (cust_no);
+
+-- the primary key is (ssn, order_no); deletions go by order.
+CREATE INDEX IF NOT EXISTS process_order_no_idx ON process (order_no);
+
+-- the primary key is (address, TIN); supplier_delete goes by TIN.
+CREATE INDEX IF NOT EXISTS delivery_tin_idx ON delivery (TIN);
+
+-- product deletion checks both references, and the price triggers of
+-- sales_daily and cart_summary look lines up by SKU.
+CREATE INDEX IF NOT EXISTS contains_sku_idx ON contains (SKU);
+CREATE INDEX IF NOT EXISTS supplier_sku_idx ON supplier (SKU);
@@ -0,0 +1,173 @@
+-- summaries behind /reports: paid order value per customer and unpaid
+-- orders per month (E3-report.ipynb, questions 2.1 and 2.3). Triggers on
+-- pay, orders and cart_summary keep them in step with add_to_cart,
+-- confirm_payment and new orders; CUSTOMERS_DELETE adjusts them itself.
+
+-- payments by customer (pay.cust_no, who paid), valued at current prices
+-- like cart_summary, from which the value of each order is taken.
+CREATE TABLE IF NOT EXISTS customer_spending(
+cust_no INTEGER PRIMARY KEY,
+paid_orders INTEGER NOT NULL,
+paid_total NUMERIC(16, 2) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS customer_spending_paid_total_idx
+ON customer_spending (paid_total DESC, cust_no);
+
+-- orders with no payment, by the first day of the month they were made.
+CREATE TABLE IF NOT EXISTS unpaid_monthly(
+month DATE PRIMARY KEY,
+orders BIGINT NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION customer_spending_add(
+    payer INTEGER, order_count INTEGER, value NUMERIC
+) RETURNS VOID AS
+$$
+BEGIN
+    -- only a new payment creates a row: the payer of a removed one may
+    -- have been deleted with its row.
+    IF order_count > 0 THEN
+        INSERT INTO customer_spending (cust_no, paid_orders, paid_total)
+        VALUES (payer, order_count, value)
+        ON CONFLICT (cust_no) DO UPDATE
+        SET paid_orders = customer_spending.paid_orders + EXCLUDED.paid_orders,
+            paid_total = customer_spending.paid_total + EXCLUDED.paid_total;
+        RETURN;
+    END IF;
+
+    UPDATE customer_spending
+    SET paid_orders = paid_orders + order_count,
+        paid_total = paid_total + value
+    WHERE cust_no = payer;
+
+    IF order_count < 0 THEN
+        DELETE FROM customer_spending
+        WHERE cust_no = payer AND paid_orders = 0;
+    END IF;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION unpaid_monthly_add(
+    order_month DATE, order_count BIGINT
+) RETURNS VOID AS
+$$
+BEGIN
+    INSERT INTO unpaid_monthly (month, orders)
+    VALUES (date_trunc('month', order_month)::date, order_count)
+    ON CONFLICT (month) DO UPDATE
+    SET orders = unpaid_monthly.orders + EXCLUDED.orders;
+
+    IF order_count < 0 THEN
+        DELETE FROM unpaid_monthly
+        WHERE month = date_trunc('month', order_month)::date AND orders = 0;
+    END IF;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION report_summaries_pay_func() RETURNS TRIGGER AS
+$$
+DECLARE
+    order_date DATE;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        -- no order: it went in the same CUSTOMERS_DELETE, which has
+        -- accounted for its payment already.
+        SELECT date INTO order_date FROM orders WHERE order_no = OLD.order_no;
+        IF FOUND THEN
+            PERFORM customer_spending_add(
+                OLD.cust_no, -1,
+                -COALESCE((SELECT total FROM cart_summary WHERE order_no = OLD.order_no), 0)
+            );
+            PERFORM unpaid_monthly_add(order_date, 1);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT date INTO order_date FROM orders WHERE order_no = NEW.order_no;
+        PERFORM customer_spending_add(
+            NEW.cust_no, 1,
+            COALESCE((SELECT total FROM cart_summary WHERE order_no = NEW.order_no), 0)
+        );
+        PERFORM unpaid_monthly_add(order_date, -1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS report_summaries_pay ON pay;
+CREATE TRIGGER report_summaries_pay
+AFTER INSERT OR UPDATE OR DELETE ON pay
+FOR EACH ROW EXECUTE FUNCTION report_summaries_pay_func();
+
+-- a new order is unpaid. Orders are only deleted with their customer, by
+-- CUSTOMERS_DELETE; a trigger could not tell paid ones from unpaid ones
+-- then, their payments going in the same statement.
+CREATE OR REPLACE FUNCTION unpaid_monthly_orders_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM unpaid_monthly_add(NEW.date, 1);
+    ELSIF NOT EXISTS (SELECT 1 FROM pay WHERE order_no = NEW.order_no) THEN
+        PERFORM unpaid_monthly_add(OLD.date, -1);
+        PERFORM unpaid_monthly_add(NEW.date, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS unpaid_monthly_orders ON orders;
+CREATE TRIGGER unpaid_monthly_orders
+AFTER INSERT ON orders
+FOR EACH ROW EXECUTE FUNCTION unpaid_monthly_orders_func();
+
+DROP TRIGGER IF EXISTS unpaid_monthly_order_date ON orders;
+CREATE TRIGGER unpaid_monthly_order_date
+AFTER UPDATE OF date ON orders
+FOR EACH ROW WHEN (OLD.date IS DISTINCT FROM NEW.date)
+EXECUTE FUNCTION unpaid_monthly_orders_func();
+
+-- lines added to a paid order, or a new price, change what its payer
+-- spent; cart_summary has the new value of the order already.
+CREATE OR REPLACE FUNCTION customer_spending_cart_func() RETURNS TRIGGER AS
+$$
+DECLARE
+    line_order_no INTEGER;
+    delta NUMERIC;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        line_order_no := OLD.order_no;
+        delta := -OLD.total;
+    ELSIF TG_OP = 'INSERT' THEN
+        line_order_no := NEW.order_no;
+        delta := NEW.total;
+    ELSE
+        line_order_no := NEW.order_no;
+        delta := NEW.total - OLD.total;
+    END IF;
+
+    UPDATE customer_spending s
+    SET paid_total = s.paid_total + delta
+    FROM pay
+    WHERE pay.order_no = line_order_no AND s.cust_no = pay.cust_no;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS customer_spending_cart ON cart_summary;
+CREATE TRIGGER customer_spending_cart
+AFTER INSERT OR UPDATE OF total OR DELETE ON cart_summary
+FOR EACH ROW EXECUTE FUNCTION customer_spending_cart_func();
+
+TRUNCATE customer_spending;
+INSERT INTO customer_spending (cust_no, paid_orders, paid_total)
+SELECT pay.cust_no, COUNT(*), COALESCE(SUM(s.total), 0)
+FROM pay
+    LEFT JOIN cart_summary s ON s.order_no = pay.order_no
+GROUP BY pay.cust_no;
+
+TRUNCATE unpaid_monthly;
+INSERT INTO unpaid_monthly (month, orders)
+SELECT date_trunc('month', o.date)::date, COUNT(*)
+FROM orders o
+WHERE NOT EXISTS (SELECT 1 FROM pay WHERE pay.order_no = o.order_no)
+GROUP BY date_trunc('month', o.date)::date;
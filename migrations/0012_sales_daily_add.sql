@@ -0,0 +1,29 @@
+-- sales_daily_add deleted the emptied rows of the product after every
+-- upsert, reading each of its (city, date) rows on every line added to a
+-- cart. Only a decrease can empty a row, and only the one just updated,
+-- as in cart_summary_add.
+CREATE OR REPLACE FUNCTION sales_daily_add(
+    line_order_no INTEGER, line_sku VARCHAR, line_qty BIGINT
+) RETURNS VOID AS
+$$
+DECLARE
+    sale_city VARCHAR;
+    sale_date DATE;
+BEGIN
+    INSERT INTO sales_daily (sku, city, date, qty, total_price)
+    SELECT line_sku, address_city(cust.address), o.date, line_qty, p.price * line_qty
+    FROM orders o
+        JOIN customer cust ON o.cust_no = cust.cust_no
+        JOIN product p ON p.sku = line_sku
+    WHERE o.order_no = line_order_no
+    ON CONFLICT (sku, city, date) DO UPDATE
+    SET qty = sales_daily.qty + EXCLUDED.qty,
+        total_price = sales_daily.total_price + EXCLUDED.total_price
+    RETURNING city, date INTO sale_city, sale_date;
+
+    IF line_qty < 0 THEN
+        DELETE FROM sales_daily
+        WHERE sku = line_sku AND city = sale_city AND date = sale_date AND qty = 0;
+    END IF;
+END
+$$ LANGUAGE plpgsql;
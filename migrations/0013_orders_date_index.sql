@@ -0,0 +1,3 @@
+-- the orders and sales exports take a date range (?from=&to=), which read
+-- the whole of orders, and through it contains, to keep a week of it.
+CREATE INDEX IF NOT EXISTS orders_date_idx ON orders (date);
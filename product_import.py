@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+"""Bulk import of products from CSV or JSONL, through COPY.
+
+usage: product_import.py FILE [csv|jsonl]
+
+Rows are streamed into a temporary staging table with COPY, validated
+there, and the valid ones upserted into product in one statement. The
+upload is never held in memory as a whole, and at most MAX_REPORTED_ERRORS
+errors are kept for the report. /products/import in app.py runs the same
+code on uploaded files.
+"""
+import csv
+import io
+import json
+import sys
+import time
+from collections import namedtuple
+
+
+COLUMNS = ("sku", "name", "description", "price", "ean")
+FORMATS = ("csv", "jsonl")
+MAX_REPORTED_ERRORS = 100
+
+ImportResult = namedtuple(
+    "ImportResult", "rows imported failed errors seconds rows_per_second"
+)
+
+
+def read_csv(stream):
+    """Yield one dict per CSV record; the header names the columns."""
+    yield from csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+
+
+def read_jsonl(stream):
+    """Yield one dict per JSON line, skipping blank lines.
+
+    A line that is not a JSON object yields None so that it is reported
+    against its line number instead of aborting the import.
+    """
+    for line in io.TextIOWrapper(stream, encoding="utf-8"):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield record if isinstance(record, dict) else None
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+def guess_format(filename, default="csv"):
+    """Pick the reader from a file name's extension."""
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    return default
+
+
+def staged_row(line, record):
+    if record is None:
+        return (line, None, None, None, None, None, "Line is not a JSON object.")
+    values = []
+    for column in COLUMNS:
+        value = record.get(column)
+        values.append(None if value is None or value == "" else str(value))
+    return (line, *values, None)
+
+
+def import_products(conn, records):
+    """Upsert the products in `records` in the transaction of `conn`; the
+    caller commits it.
+
+    `records` is an iterable of dicts keyed by COLUMNS (None for a record
+    that could not be parsed). Returns an ImportResult.
+    """
+
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMP TABLE product_import(
+            line INTEGER PRIMARY KEY,
+            sku TEXT,
+            name TEXT,
+            description TEXT,
+            price TEXT,
+            ean TEXT,
+            error TEXT
+            ) ON COMMIT DROP;
+            """
+        )
+        with cur.copy(
+            """
+            COPY product_import (line, sku, name, description, price, ean, error)
+            FROM STDIN;
+            """
+        ) as copy:
+            rows = 0
+            for rows, record in enumerate(records, 1):
+                copy.write_row(staged_row(rows, record))
+
+        # the first failing check wins; the price and EAN formats are checked
+        # before anything casts them.
+        cur.execute(
+            r"""
+            UPDATE product_import i
+            SET error = v.error
+            FROM (
+                SELECT line, CASE
+                    WHEN sku IS NULL THEN 'SKU is required.'
+                    WHEN length(sku) > 25 THEN 'SKU is longer than 25 characters.'
+                    WHEN name IS NULL THEN 'Name is required.'
+                    WHEN length(name) > 200 THEN 'Name is longer than 200 characters.'
+                    WHEN price IS NULL THEN 'Price is required.'
+                    WHEN price !~ '^\d{1,8}(\.\d{1,2})?$' THEN 'Price is required to be numeric.'
+                    WHEN ean !~ '^\d{1,13}$' THEN 'EAN must have up to 13 digits.'
+                    WHEN COUNT(*) OVER (PARTITION BY sku) > 1 THEN 'SKU is repeated in the upload.'
+                    WHEN ean IS NOT NULL AND COUNT(*) OVER (PARTITION BY ean) > 1
+                        THEN 'EAN is repeated in the upload.'
+                    WHEN EXISTS (
+                        SELECT 1
+                        FROM product p
+                        WHERE p.ean = i.ean::numeric AND p.SKU <> i.sku
+                    ) THEN 'EAN is already used by another product.'
+                END AS error
+                FROM product_import i
+                WHERE error IS NULL
+            ) v
+            WHERE i.line = v.line AND v.error IS NOT NULL;
+            """
+        )
+        imported = cur.execute(
+            """
+            INSERT INTO product (SKU, name, description, price, ean)
+            SELECT sku, name, description, price::numeric, ean::numeric
+            FROM product_import
+            WHERE error IS NULL
+            ON CONFLICT (SKU) DO UPDATE
+            SET name = EXCLUDED.name,
+                description = EXCLUDED.description,
+                price = EXCLUDED.price,
+                ean = EXCLUDED.ean;
+            """
+        ).rowcount
+        errors = cur.execute(
+            """
+            SELECT line, sku, error
+            FROM product_import
+            WHERE error IS NOT NULL
+            ORDER BY line
+            LIMIT %(limit)s;
+            """,
+            {"limit": MAX_REPORTED_ERRORS},
+        ).fetchall()
+        # the staging table would otherwise last until the caller commits.
+        cur.execute("DROP TABLE product_import;")
+
+    seconds = time.perf_counter() - start
+    return ImportResult(
+        rows=rows,
+        imported=imported,
+        failed=rows - imported,
+        errors=[{"line": line, "sku": sku, "error": error} for line, sku, error in errors],
+        seconds=round(seconds, 3),
+        rows_per_second=round(rows / seconds) if seconds else rows,
+    )
+
+
+def main(path, fmt=None):
+    import psycopg
+
+    from web import DATABASE_URL
+
+    fmt = fmt or guess_format(path)
+    with open(path, "rb") as stream, psycopg.connect(DATABASE_URL) as conn:
+        result = import_products(conn, READERS[fmt](stream))
+        conn.commit()
+    for error in result.errors:
+        print(f"line {error['line']} ({error['sku']}): {error['error']}", file=sys.stderr)
+    print(
+        f"{result.imported} of {result.rows} rows imported in {result.seconds}s "
+        f"({result.rows_per_second} rows/s), {result.failed} rejected"
+    )
+    return result.failed == 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or sys.argv[2:] and sys.argv[2] not in FORMATS:
+        sys.exit(__doc__.split("\n\n")[1])
+    sys.exit(0 if main(*sys.argv[1:]) else 1)
@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+"""Pre-forking HTTP server for app.py.
+
+usage: serve.py [workers] [host:port]
+
+The master process opens the listening socket and forks `workers` worker
+processes (APP_WORKERS, or one per CPU) that accept on it; each serves its
+requests on threads. The master never imports the app: every worker
+imports it after the fork, so each one opens its own connection pool and
+no process shares a database socket with another.
+
+The Postgres connection budget, APP_DB_CONNECTIONS, is split evenly: each
+worker's pool gets at most its share (APP_POOL_MAX_SIZE) and admission
+control sizes its slots from that.
+
+Signals to the master:
+
+- SIGHUP: graceful reload. A new generation of workers is started, with
+  the code as it is now on disk, then the old one is drained.
+- SIGTERM or SIGINT: graceful shutdown. Workers stop accepting, finish the
+  requests in progress (for at most GRACEFUL_TIMEOUT seconds, after which
+  they are killed), close their pools and exit.
+
+A worker that dies is replaced.
+"""
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler
+from wsgiref.simple_server import WSGIServer
+
+
+BIND = os.environ.get("APP_BIND", "127.0.0.1:8000")
+WORKERS = int(os.environ.get("APP_WORKERS", os.cpu_count() or 1))
+# connections to Postgres for the whole server, across all workers; keep
+# it below the server's max_connections (100 by default).
+DB_CONNECTIONS = int(os.environ.get("APP_DB_CONNECTIONS", 64))
+# seconds a draining worker gets to finish its requests.
+GRACEFUL_TIMEOUT = float(os.environ.get("APP_GRACEFUL_TIMEOUT", 30.0))
+BACKLOG = 1024
+
+
+def pool_sizes(workers, budget=DB_CONNECTIONS):
+    """APP_POOL_MIN_SIZE and APP_POOL_MAX_SIZE for each of `workers`."""
+
+    max_size = max(1, budget // workers)
+    return {"APP_POOL_MIN_SIZE": str(min(2, max_size)), "APP_POOL_MAX_SIZE": str(max_size)}
+
+
+class RequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        # the access log of the dev server would cost more than the request.
+        pass
+
+
+class WorkerServer(socketserver.ThreadingMixIn, WSGIServer):
+    """WSGIServer on a listening socket inherited from the master.
+
+    Request threads are not daemons, so server_close() waits for them:
+    that is the drain.
+    """
+
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, sock, app):
+        super().__init__(sock.getsockname()[:2], RequestHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.server_name = socket.getfqdn(self.server_address[0])
+        self.server_port = self.server_address[1]
+        self.setup_environ()
+        self.set_app(app)
+
+    def get_request(self):
+        # the listening socket is non-blocking, so that a worker beaten to
+        # a connection by another does not block in accept(); the
+        # connection it gets must block as usual.
+        conn, address = self.socket.accept()
+        conn.setblocking(True)
+        return conn, address
+
+
+def run_worker(sock, sizes):
+    for name, value in sizes.items():
+        os.environ.setdefault(name, value)
+    # the pool opens with the first request, in this process.
+    os.environ.setdefault("APP_POOL", "lazy")
+    import app
+
+    server = WorkerServer(sock, app.app)
+
+    def drain(signum, frame):
+        # shutdown() waits for serve_forever() to return: not from its thread.
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        app.pool.close()
+        if app.read_pool is not app.pool:
+            app.read_pool.close()
+
+
+class Master:
+    def __init__(self, sock, workers):
+        self.sock = sock
+        self.workers = workers
+        self.sizes = pool_sizes(workers)
+        self.current = set()
+        # pid -> time it was told to stop.
+        self.draining = {}
+        self.stopping = False
+        self.reloading = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+                    signal.signal(signum, signal.SIG_DFL)
+                run_worker(self.sock, self.sizes)
+            except BaseException:
+                sys.excepthook(*sys.exc_info())
+                status = 1
+            finally:
+                os._exit(status)
+        self.current.add(pid)
+
+    def stop(self, pids):
+        for pid in pids:
+            self.draining[pid] = time.monotonic()
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.current:
+                self.current.discard(pid)
+                print(f"worker {pid} died with status {status}", file=sys.stderr)
+            self.draining.pop(pid, None)
+
+    def kill_late(self):
+        now = time.monotonic()
+        for pid, since in self.draining.items():
+            if now - since > GRACEFUL_TIMEOUT:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self.on_reload)
+        signal.signal(signal.SIGTERM, self.on_stop)
+        signal.signal(signal.SIGINT, self.on_stop)
+        while not self.stopping or self.current or self.draining:
+            if self.reloading:
+                self.reloading = False
+                old, self.current = self.current, set()
+                for _ in range(self.workers):
+                    self.spawn()
+                self.stop(old)
+            if self.stopping and self.current:
+                self.stop(self.current)
+                self.current = set()
+            while not self.stopping and len(self.current) < self.workers:
+                self.spawn()
+            self.reap()
+            self.kill_late()
+            time.sleep(0.1)
+
+    def on_reload(self, signum, frame):
+        self.reloading = True
+
+    def on_stop(self, signum, frame):
+        self.stopping = True
+
+
+def main(workers=WORKERS, bind=BIND):
+    host, _, port = bind.rpartition(":")
+    sock = socket.create_server((host, int(port)), backlog=BACKLOG)
+    sock.setblocking(False)
+    print(f"serving on {bind} with {workers} workers", file=sys.stderr)
+    Master(sock, int(workers)).run()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
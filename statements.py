@@ -0,0 +1,442 @@
+"""Every fixed SQL statement of the application, declared once by name.
+
+execute() runs them as server-side prepared statements: the first call on
+a connection parses and plans the statement, later calls on it only send
+the parameters. psycopg keeps track of what each connection has prepared
+(up to Connection.prepared_max statements), and pooled connections live
+for the whole process, so the planning is paid once per connection.
+
+Statements built at run time (analytics, exports) are not listed here;
+psycopg still prepares them once they repeat (prepare_threshold).
+"""
+import metrics
+
+
+# statement text -> name, used to label metrics.
+NAMES = {}
+
+
+def statement(name, sql):
+    """Register `sql` under `name` and return it."""
+    if name in NAMES.values():
+        raise ValueError(f"Statement {name!r} is declared twice.")
+    NAMES[sql] = name
+    metrics.STATEMENT_NAMES[sql] = name
+    return sql
+
+
+def execute(cur, query, params=None):
+    """Run a registered statement on `cur` as a prepared statement."""
+    return cur.execute(query, params or {}, prepare=True)
+
+
+async def execute_async(cur, query, params=None):
+    """execute() for an AsyncCursor."""
+    return await cur.execute(query, params or {}, prepare=True)
+
+
+def stats():
+    """Calls, seconds and rows of every registered statement so far."""
+    calls = metrics.QUERY_SECONDS.totals()
+    rows = metrics.QUERY_ROWS.totals()
+    return {
+        name: {
+            "calls": calls.get((name,), (0, 0.0))[0],
+            "seconds": round(calls.get((name,), (0, 0.0))[1], 6),
+            "rows": rows.get((name,), 0),
+        }
+        for name in NAMES.values()
+    }
+
+
+""" CHANGE VERSIONS """
+
+# bumped by triggers, see migrations/0002 and 0006.
+TABLE_VERSION = statement("table_version", """
+    SELECT version, changed_at
+    FROM table_version
+    WHERE name = %(name)s;
+    """)
+
+
+# seconds the server is behind its primary; 0 on a primary, and on a
+# replica that has replayed everything it received.
+REPLICA_LAG = statement("replica_lag", """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END;
+    """)
+
+
+""" ACCOUNTS """
+
+ACCOUNT_PAGE = statement("account_page", """
+    SELECT account_number, branch_name, balance
+    FROM account
+    WHERE %(after)s::text IS NULL OR account_number > %(after)s
+    ORDER BY account_number ASC
+    LIMIT %(limit)s;
+    """)
+
+ACCOUNT_BY_NUMBER = statement("account_by_number", """
+    SELECT account_number, branch_name, balance
+    FROM account
+    WHERE account_number = %(account_number)s;
+    """)
+
+ACCOUNT_UPDATE = statement("account_update", """
+    UPDATE account
+    SET balance = %(balance)s
+    WHERE account_number = %(account_number)s;
+    """)
+
+ACCOUNT_DELETE = statement("account_delete", """
+    DELETE FROM account
+    WHERE account_number = %(account_number)s;
+    """)
+
+
+""" PRODUCTS """
+
+# products are listed by name; SKU breaks ties so the keyset order is total.
+# %(after)s is the [name, SKU] of the last row seen, as a JSON array (see
+# web.PRODUCT_KEY): looking it up by SKU would end the listing early once
+# that product is deleted.
+PRODUCT_PAGE = statement("product_page", """
+    SELECT name, SKU, description, price
+    FROM product
+    WHERE %(after)s::jsonb IS NULL
+        OR (name, SKU) > (%(after)s::jsonb ->> 0, %(after)s::jsonb ->> 1)
+    ORDER BY name ASC, SKU ASC
+    LIMIT %(limit)s;
+    """)
+
+# typeahead: names starting with %(prefix)s (lowercase, LIKE-escaped, ending
+# in %), a range scan of product_name_prefix_idx, see migrations/0007.
+# %(after)s is a [name, SKU] array, as for PRODUCT_PAGE.
+PRODUCT_PREFIX_PAGE = statement("product_prefix_page", """
+    SELECT name, SKU, description, price
+    FROM product
+    WHERE lower(name) COLLATE "C" LIKE %(prefix)s
+        AND (%(after)s::jsonb IS NULL
+            OR (lower(name) COLLATE "C", SKU COLLATE "C")
+                > (lower(%(after)s::jsonb ->> 0) COLLATE "C",
+                    (%(after)s::jsonb ->> 1) COLLATE "C"))
+    ORDER BY lower(name) COLLATE "C", SKU COLLATE "C"
+    LIMIT %(limit)s;
+    """)
+
+# full-text search, best match first; the rank of the `after` product is
+# computed again to seek past it.
+PRODUCT_SEARCH_PAGE = statement("product_search_page", """
+    WITH query AS (
+        SELECT websearch_to_tsquery('english', %(q)s)
+            || websearch_to_tsquery('simple', %(q)s) AS q
+    ), hits AS (
+        SELECT p.name, p.SKU, p.description, p.price, ts_rank(p.search, query.q) AS rank
+        FROM product p, query
+        WHERE p.search @@ query.q
+    )
+    SELECT name, SKU, description, price, rank
+    FROM hits
+    WHERE %(after)s::text IS NULL
+        OR rank < (SELECT rank FROM hits WHERE SKU = %(after)s)
+        OR (rank = (SELECT rank FROM hits WHERE SKU = %(after)s) AND SKU > %(after)s)
+    ORDER BY rank DESC, SKU ASC
+    LIMIT %(limit)s;
+    """)
+
+PRODUCT_BY_SKU = statement("product_by_sku", """
+    SELECT SKU, price, description
+    FROM product
+    WHERE SKU = %(product_sku)s;
+    """)
+
+PRODUCT_INSERT = statement("product_insert", """
+    INSERT INTO product (SKU, name, description, price, ean)
+    VALUES (%(sku)s, %(name)s, %(description)s, %(price)s, %(ean)s);
+    """)
+
+PRODUCT_UPDATE = statement("product_update", """
+    UPDATE product
+    SET price = %(price)s, description = %(description)s
+    WHERE SKU = %(product_sku)s;
+    """)
+
+PRODUCT_DELETE = statement("product_delete", """
+    DELETE FROM product
+    WHERE SKU = %(product_sku)s;
+    """)
+
+
+""" CUSTOMERS """
+
+CUSTOMER_PAGE = statement("customer_page", """
+    SELECT cust_no, name, email, phone, address
+    FROM customer
+    WHERE %(after)s::integer IS NULL OR cust_no > %(after)s::integer
+    ORDER BY cust_no ASC
+    LIMIT %(limit)s;
+    """)
+
+# autocomplete: customers whose name or email starts with %(prefix)s
+# (lowercase, LIKE-escaped, ending in %), or whose phone starts with
+# %(phone_prefix)s. Each branch is a range scan of its index, see
+# migrations/0008.
+CUSTOMER_LOOKUP = statement("customer_lookup", """
+    SELECT cust_no, name, email, phone
+    FROM (
+        (SELECT cust_no, name, email, phone
+        FROM customer
+        WHERE lower(name) COLLATE "C" LIKE %(prefix)s
+        ORDER BY lower(name) COLLATE "C", cust_no
+        LIMIT %(limit)s)
+        UNION
+        (SELECT cust_no, name, email, phone
+        FROM customer
+        WHERE lower(email) COLLATE "C" LIKE %(prefix)s
+        ORDER BY lower(email) COLLATE "C"
+        LIMIT %(limit)s)
+        UNION
+        (SELECT cust_no, name, email, phone
+        FROM customer
+        WHERE phone COLLATE "C" LIKE %(phone_prefix)s
+        ORDER BY phone COLLATE "C"
+        LIMIT %(limit)s)
+    ) AS candidates
+    ORDER BY lower(name), cust_no
+    LIMIT %(limit)s;
+    """)
+
+# cust_no comes from customer_cust_no_seq, see migrations/.
+CUSTOMER_INSERT = statement("customer_insert", """
+    INSERT INTO customer (name, email, phone, address)
+    VALUES (%(name)s, %(email)s, %(phone)s, %(address)s)
+    RETURNING cust_no;
+    """)
+
+CUSTOMERS_DELETE = statement("customers_delete", """
+    WITH doomed_orders AS (
+        SELECT order_no
+        FROM orders
+        WHERE cust_no = ANY(%(cust_nos)s::integer[])
+    ), deleted_contains AS (
+        DELETE FROM contains
+        WHERE order_no IN (SELECT order_no FROM doomed_orders)
+    ), deleted_pay AS (
+        -- one index per side: pay's primary key for the orders, and
+        -- pay_cust_no_idx for the payments the customers made; an OR of
+        -- the two would scan pay.
+        DELETE FROM pay
+        WHERE order_no IN (
+            SELECT order_no FROM doomed_orders
+            UNION
+            SELECT order_no FROM pay WHERE cust_no = ANY(%(cust_nos)s::integer[])
+        )
+    ), deleted_process AS (
+        DELETE FROM process
+        WHERE order_no IN (SELECT order_no FROM doomed_orders)
+    ), deleted_orders AS (
+        DELETE FROM orders
+        WHERE order_no IN (SELECT order_no FROM doomed_orders)
+    ), deleted_sales AS (
+        -- the sales_daily trigger on contains fires at the end of the
+        -- statement, when the orders it would look up are gone.
+        UPDATE sales_daily s
+        SET qty = s.qty - d.qty, total_price = s.total_price - d.total_price
+        FROM (
+            SELECT c.sku, address_city(cust.address) AS city, o.date,
+                SUM(c.qty) AS qty, SUM(p.price * c.qty) AS total_price
+            FROM contains c
+                JOIN orders o ON c.order_no = o.order_no
+                JOIN product p ON c.sku = p.sku
+                JOIN customer cust ON o.cust_no = cust.cust_no
+            WHERE o.cust_no = ANY(%(cust_nos)s::integer[])
+            GROUP BY c.sku, address_city(cust.address), o.date
+        ) d
+        WHERE s.sku = d.sku AND s.city = d.city AND s.date = d.date
+    ), deleted_spending AS (
+        DELETE FROM customer_spending
+        WHERE cust_no = ANY(%(cust_nos)s::integer[])
+    ), refunded_spending AS (
+        -- the triggers of migrations/0010 skip payments whose order goes
+        -- too; these are the ones made by the customers who stay.
+        UPDATE customer_spending s
+        SET paid_orders = s.paid_orders - d.orders, paid_total = s.paid_total - d.total
+        FROM (
+            SELECT pay.cust_no, COUNT(*) AS orders, COALESCE(SUM(cs.total), 0) AS total
+            FROM pay
+                LEFT JOIN cart_summary cs ON cs.order_no = pay.order_no
+            WHERE pay.order_no IN (SELECT order_no FROM doomed_orders)
+                AND pay.cust_no <> ALL(%(cust_nos)s::integer[])
+            GROUP BY pay.cust_no
+        ) d
+        WHERE s.cust_no = d.cust_no
+    ), deleted_unpaid AS (
+        UPDATE unpaid_monthly u
+        SET orders = u.orders - d.orders
+        FROM (
+            SELECT date_trunc('month', o.date)::date AS month, COUNT(*) AS orders
+            FROM orders o
+            WHERE o.cust_no = ANY(%(cust_nos)s::integer[])
+                AND NOT EXISTS (SELECT 1 FROM pay WHERE pay.order_no = o.order_no)
+            GROUP BY date_trunc('month', o.date)::date
+        ) d
+        WHERE u.month = d.month
+    )
+    DELETE FROM customer
+    WHERE cust_no = ANY(%(cust_nos)s::integer[]);
+    """)
+
+
+""" SUPPLIERS """
+
+SUPPLIER_PAGE = statement("supplier_page", """
+    SELECT TIN, name, address, SKU, date
+    FROM supplier
+    WHERE %(after)s::text IS NULL OR TIN > %(after)s
+    ORDER BY TIN ASC
+    LIMIT %(limit)s;
+    """)
+
+SUPPLIER_INSERT = statement("supplier_insert", """
+    INSERT INTO supplier (TIN, name, address, SKU, date)
+    VALUES (%(tin)s, %(name)s, %(address)s, %(sku)s, CURRENT_DATE);
+    """)
+
+SUPPLIER_DELETE = statement("supplier_delete", """
+    DELETE FROM supplier
+    WHERE tin = %(tin)s;
+    """)
+
+DELIVERY_DELETE = statement("delivery_delete", """
+    DELETE FROM delivery
+    WHERE tin = %(tin)s;
+    """)
+
+
+""" ORDERS """
+
+# the customers called %(cust_name)s (any case), with a new order for the
+# customer when there is exactly one; order_no is NULL on every row else.
+# order_no comes from orders_order_no_seq: one statement, and concurrent
+# orders can never pick the same number.
+ORDER_FOR_CUSTOMER_NAME = statement("order_for_customer_name", """
+    WITH matches AS (
+        SELECT cust_no, name, email, phone
+        FROM customer
+        WHERE lower(name) COLLATE "C" = lower(%(cust_name)s)
+        ORDER BY cust_no
+        LIMIT %(limit)s
+    ), new_order AS (
+        INSERT INTO orders (cust_no, date)
+        SELECT cust_no, CURRENT_DATE
+        FROM matches
+        WHERE (SELECT count(*) FROM matches) = 1
+        RETURNING order_no, cust_no
+    )
+    SELECT m.cust_no, m.name, m.email, m.phone, o.order_no
+    FROM matches m
+        LEFT JOIN new_order o ON o.cust_no = m.cust_no
+    ORDER BY m.cust_no;
+    """)
+
+ORDER_FOR_CUSTOMER = statement("order_for_customer", """
+    INSERT INTO orders (cust_no, date)
+    SELECT cust_no, CURRENT_DATE
+    FROM customer
+    WHERE cust_no = %(cust_no)s
+    RETURNING order_no, cust_no;
+    """)
+
+# the order and all its lines in a single statement; skus and qtys are
+# parallel arrays, a SKU given twice gets the sum of its quantities.
+ORDER_CREATE = statement("order_create", """
+    WITH new_order AS (
+        INSERT INTO orders (cust_no, date)
+        VALUES (%(cust_no)s, CURRENT_DATE)
+        RETURNING order_no
+    )
+    INSERT INTO contains (order_no, SKU, qty)
+    SELECT order_no, line.sku, SUM(line.qty)
+    FROM new_order,
+        unnest(%(skus)s::varchar[], %(qtys)s::integer[]) AS line(sku, qty)
+    GROUP BY order_no, line.sku
+    RETURNING order_no;
+    """)
+
+CART_ADD = statement("cart_add", """
+    INSERT INTO contains (order_no, SKU, qty)
+    VALUES (%(order_no)s, %(product_sku)s, 1)
+    ON CONFLICT (order_no, SKU) DO UPDATE
+    SET qty = contains.qty + 1;
+    """)
+
+# adds every line at once; same arrays as ORDER_CREATE.
+CART_ADD_MANY = statement("cart_add_many", """
+    INSERT INTO contains (order_no, SKU, qty)
+    SELECT %(order_no)s, line.sku, SUM(line.qty)
+    FROM unnest(%(skus)s::varchar[], %(qtys)s::integer[]) AS line(sku, qty)
+    GROUP BY line.sku
+    ON CONFLICT (order_no, SKU) DO UPDATE
+    SET qty = contains.qty + EXCLUDED.qty;
+    """)
+
+# contains is keyed by (order_no, SKU): one row per product, no grouping.
+CHECKOUT_LINES = statement("checkout_lines", """
+    SELECT p.name, p.description, p.price, c.qty, p.price * c.qty AS subtotal
+    FROM contains c
+        JOIN product p ON c.sku = p.sku
+    WHERE c.order_no = %(order_no)s
+    ORDER BY p.name;
+    """)
+
+# maintained by triggers, see migrations/0005_cart_summary.sql.
+CART_SUMMARY = statement("cart_summary", """
+    SELECT lines, items, total
+    FROM cart_summary
+    WHERE order_no = %(order_no)s;
+    """)
+
+PAYMENT_INSERT = statement("payment_insert", """
+    INSERT INTO pay (order_no, cust_no)
+    VALUES (%(order_no)s, %(cust_no)s);
+    """)
+
+
+""" REPORTS """
+
+# maintained by triggers and CUSTOMERS_DELETE, see migrations/0010; rows
+# left at zero by a deletion are skipped. rank() gives customers with the
+# same total the same rank, as the >= ALL of the original query did. The
+# names are looked up one by one: a join would hash the whole of customer
+# for %(limit)s rows.
+REPORT_TOP_CUSTOMERS = statement("report_top_customers", """
+    SELECT rank() OVER (ORDER BY s.paid_total DESC) AS rank,
+        s.cust_no,
+        (SELECT c.name FROM customer c WHERE c.cust_no = s.cust_no) AS name,
+        s.paid_orders, s.paid_total
+    FROM (
+        SELECT cust_no, paid_orders, paid_total
+        FROM customer_spending
+        WHERE paid_orders > 0
+        ORDER BY paid_total DESC, cust_no
+        LIMIT %(limit)s
+    ) s
+    ORDER BY s.paid_total DESC, s.cust_no;
+    """)
+
+# every month with unpaid orders, or those of %(year)s.
+REPORT_UNPAID_ORDERS = statement("report_unpaid_orders", """
+    SELECT EXTRACT(YEAR FROM month)::integer AS year,
+        EXTRACT(MONTH FROM month)::integer AS month,
+        orders
+    FROM unpaid_monthly
+    WHERE orders > 0
+        AND (%(year)s::integer IS NULL
+            OR month >= make_date(%(year)s::integer, 1, 1)
+            AND month < make_date(%(year)s::integer + 1, 1, 1))
+    ORDER BY unpaid_monthly.month;
+    """)
@@ -0,0 +1,164 @@
+"""What app.py (Flask) and asgi.py (Quart) share besides the SQL of
+statements.py: settings, page sizes and limits, and the checks of the
+input of a request.
+
+Importing it opens no connection and imports no web framework, so either
+front-end can use it without building the other's pools.
+"""
+import json
+
+import statements
+
+
+# postgres://{user}:{password}@{hostname}:{port}/{database-name}
+DATABASE_URL = "postgres://db:db@postgres/db"
+
+# flash() keeps its messages in the session, which needs a key to sign it.
+SECRET_KEY = "dev"
+
+# keyset pagination: ?after=<key>&limit=N, ?all=1 streams every row instead.
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# rows fetched per round trip by the server-side cursor in "all rows" mode.
+STREAM_CHUNK = 1000
+
+# keyset columns compared as integers; any other `after` is text.
+INTEGER_KEYS = {"cust_no"}
+# keysets of several columns, e.g. products by (name, sku): `after` is a
+# JSON array of the last row's values, so the statement seeks past them
+# without reading that row again, which may be gone by then.
+PRODUCT_KEY = ("name", "sku")
+
+
+def keyset_args(args, key=None):
+    """The keyset pagination arguments of a query string (a MultiDict).
+
+    An `after` that is not a number, for an integer `key`, or not an array
+    of one string per column, for a tuple `key`, is ignored: the listing
+    starts from the first page instead of failing in the cast.
+    """
+    after = args.get("after") or None
+    if after is not None and key in INTEGER_KEYS:
+        after = int(after) if after.isdigit() else None
+    elif after is not None and isinstance(key, tuple):
+        try:
+            values = json.loads(after)
+        except ValueError:
+            values = None
+        if not (
+            isinstance(values, list)
+            and len(values) == len(key)
+            and all(isinstance(value, str) for value in values)
+        ):
+            after = None
+    limit = args.get("limit", PAGE_SIZE, type=int)
+    return after, max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_after(key, value):
+    """The `after` of the page following a row; `value(column)` reads one
+    of its columns."""
+    if isinstance(key, tuple):
+        return json.dumps([value(column) for column in key])
+    return value(key)
+
+
+def validated(response, etag, last_modified):
+    """Set the validators; clients must revalidate before reusing the body."""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.vary.add("Accept")
+    return response
+
+
+# ?mode=prefix matches the start of product names (typeahead), ?mode=text
+# ranks full-text matches on name, SKU, EAN and description: the statement,
+# its parameter and its keyset.
+SEARCH_MODES = {
+    "text": (statements.PRODUCT_SEARCH_PAGE, "q", "sku"),
+    "prefix": (statements.PRODUCT_PREFIX_PAGE, "prefix", PRODUCT_KEY),
+}
+
+
+def like_prefix(text):
+    """A LIKE pattern matching strings that start with `text`, lowercased."""
+    escaped = text.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+# most candidates the customer lookup returns.
+LOOKUP_LIMIT = 20
+
+
+# most customers a bulk deletion may carry.
+MAX_DELETED_CUSTOMERS = 1000
+# customer numbers are Postgres integers.
+MAX_CUST_NO = 2**31 - 1
+
+
+def customer_numbers(values):
+    """Check a list of customer numbers and return them as ints.
+
+    Each is an int (not a bool) or a string of digits, as a form sends
+    them, between 1 and MAX_CUST_NO. Raises ValueError with a message for
+    the user.
+    """
+
+    if not isinstance(values, list):
+        raise ValueError("cust_nos must be a list of customer numbers.")
+    if len(values) > MAX_DELETED_CUSTOMERS:
+        raise ValueError(f"At most {MAX_DELETED_CUSTOMERS} customers at once.")
+
+    cust_nos = []
+    for value in values:
+        if isinstance(value, str) and value.isascii() and value.isdigit():
+            value = int(value)
+        if type(value) is not int or not 1 <= value <= MAX_CUST_NO:
+            raise ValueError("Customer numbers must be positive integers.")
+        cust_nos.append(value)
+    return cust_nos
+
+
+# most lines a new order or a cart update may carry.
+MAX_CART_LINES = 1000
+
+
+def cart_lines(items):
+    """Check a list of {"sku": ..., "qty": ...} and return it as the parallel
+    sku and qty arrays the set-based cart statements unnest.
+
+    Raises ValueError with a message for the user.
+    """
+
+    if not isinstance(items, list) or not items:
+        raise ValueError("At least one product is required.")
+    if len(items) > MAX_CART_LINES:
+        raise ValueError(f"At most {MAX_CART_LINES} products at once.")
+
+    skus, qtys = [], []
+    for item in items:
+        if not isinstance(item, dict) or not item.get("sku"):
+            raise ValueError("Product is required.")
+        qty = str(item.get("qty", 1))
+        if not qty.isdigit() or not 1 <= int(qty) <= 2**31 - 1:
+            raise ValueError("Quantity is required to be a positive number.")
+        skus.append(str(item["sku"]))
+        qtys.append(int(qty))
+    return skus, qtys
+
+
+def form_lines(form):
+    """The sku_1/qty_1, sku_2/qty_2, ... lines of an order form."""
+
+    items = []
+    n = 1
+    while f"sku_{n}" in form:
+        if form[f"sku_{n}"]:
+            items.append({"sku": form[f"sku_{n}"], "qty": form.get(f"qty_{n}", "1")})
+        n += 1
+    return items
+
+
+# customers on /reports/top-customers.
+REPORT_TOP_CUSTOMERS = 10
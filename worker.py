@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""Persistent worker for the CGI deployment.
+
+usage: worker.py [socket]
+
+Keeps the Flask app and its connection pool alive across requests and
+serves them on a local Unix socket (APP_WORKER_SOCKET, or app.sock next to
+this file). app.cgi then only has to start Python, forward the request and
+copy the answer back; it runs the app itself when no worker listens.
+
+The protocol is CGI over a socket: the client sends its CGI environment as
+one line of JSON followed by the request body, the worker runs the app
+through wsgiref's CGI handler and writes the CGI response back, then
+closes the connection.
+
+This module only imports the standard library at the top, so app.cgi can
+import forward() without loading the app.
+"""
+import json
+import os
+import shutil
+import socket
+import socketserver
+import sys
+from pathlib import Path
+from wsgiref.handlers import BaseCGIHandler
+
+
+SOCKET = os.environ.get(
+    "APP_WORKER_SOCKET", str(Path(__file__).resolve().with_name("app.sock"))
+)
+COPY_CHUNK = 64 * 1024
+
+
+def forward(environ, stdin, stdout, path=SOCKET):
+    """Have the worker on `path` answer the CGI request in `environ`.
+
+    Raises FileNotFoundError or ConnectionRefusedError, before reading the
+    body or writing anything, when no worker listens on `path`; the caller
+    can then serve the request itself.
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        with sock.makefile("wb") as request:
+            request.write(json.dumps(dict(environ)).encode() + b"\n")
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            while length > 0:
+                data = stdin.read(min(length, COPY_CHUNK))
+                if not data:
+                    break
+                request.write(data)
+                length -= len(data)
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as response:
+            shutil.copyfileobj(response, stdout, COPY_CHUNK)
+    stdout.flush()
+
+
+class CGIRequestHandler(BaseCGIHandler):
+    # the environment is the one the CGI script received, not the worker's.
+    os_environ = {}
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        environ = json.loads(self.rfile.readline())
+        CGIRequestHandler(
+            self.rfile,
+            self.wfile,
+            sys.stderr,
+            environ,
+            multithread=True,
+            multiprocess=False,
+        ).run(self.server.app)
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, app):
+        self.app = app
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, WorkerHandler)
+
+
+def main(path=SOCKET):
+    # the pool opens with the first request, so the socket is up at once.
+    os.environ.setdefault("APP_POOL", "lazy")
+    from app import app
+
+    with WorkerServer(path, app) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])